@@ -0,0 +1,265 @@
+# The menu email template, shared by scripts/ses/update_template.py (which uploads it
+# to SES) and main.py's local renderer, so both always send the same email.
+
+import html
+import re
+
+TEMPLATE_NAME = 'ColumbiaDiningMenuUpdate'
+
+SUBJECT_PART = "{{subject}}"
+
+TEXT_PART = (
+    "{{subject}} , {{date}}\n\n"
+    "{{date}}\n\n"
+    "{{#each locations}}\n"
+    "* {{name}} - {{open_times}}\n\n"
+    "{{#each meals}}\n"
+    "== {{meal_type}} ==\n\n"
+    "{{#each stations}}\n"
+    "[{{station_name}}]\n"
+    "{{#each items}}\n"
+    "- {{name}}{{#if dietary}} ({{dietary}}){{/if}}{{#if allergens}} "
+    "Contains: {{allergens}}{{/if}}\n\n"
+    "{{/each}}\n{{/each}}\n{{/each}}\n{{/each}}\n\n"
+    "Closed today:\n\n"
+    "{{#each closed_locations}}* {{this}}\n{{/each}}\n\n"
+    "This menu update is based on your dietary preferences and restrictions.\n"
+    "To update your preferences, please visit your dining dashboard.\n"
+)
+
+HTML_PART = """
+            <div style="font-family: Arial, sans-serif; color: #1e3a8a; max-width: 1200px; margin: 0 auto; padding: 20px; background-color: #f8f9fa;">
+                
+                <h1 style="color: #1e3a8a; font-size: 24px; border-bottom: 2px solid #1e3a8a; padding-bottom: 10px; margin-bottom: 30px;">Columbia Dining Menus - {{date}}</h1>
+                
+                <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 20px; margin-bottom: 40px;">
+                    <div style="background: #eff6ff; border-radius: 8px; padding: 20px;">
+                        <h2 style="color: #1e3a8a; font-size: 20px; margin: 0 0 15px 0; padding-bottom: 8px; border-bottom: 2px solid #bfdbfe;">Open Today</h2>
+                        {{#each locations}}
+                        <div style="background: white; padding: 10px; margin: 8px 0; border-radius: 4px;">
+                            <span style="font-weight: bold; color: #1e3a8a;">{{name}}</span>
+                            <span style="color: #2563eb; margin-left: 10px;">{{open_times}}</span>
+                        </div>
+                        {{/each}}
+                    </div>
+                    
+                    <div style="background: #eff6ff; border-radius: 8px; padding: 20px;">
+                        <h2 style="color: #1e3a8a; font-size: 20px; margin: 0 0 15px 0; padding-bottom: 8px; border-bottom: 2px solid #bfdbfe;">Closed Today</h2>
+                        {{#each closed_locations}}
+                        <div style="background: white; padding: 10px; margin: 8px 0; border-radius: 4px;">
+                            <span style="font-weight: bold; color: #1e3a8a;">{{this}}</span>
+                        </div>
+                        {{/each}}
+                    </div>
+                </div>
+                
+                {{#each locations}}
+                <div style="background: white; border-radius: 8px; padding: 20px; margin-bottom: 30px; box-shadow: 0 2px 4px rgba(30, 58, 138, 0.1);">
+                    <h2 style="font-size: 20px; margin: 0 0 5px 0; color: #1e3a8a;">{{name}}</h2>
+                    
+                    <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 20px; margin-top: 15px;">
+                        {{#each meals}}
+                        <div style="background: #f8fafc; padding: 15px; border-radius: 4px;">
+                            <h3 style="font-size: 18px; color: #1e3a8a; margin: 0 0 15px 0; padding-bottom: 8px; border-bottom: 1px solid #bfdbfe;">{{meal_type}}</h3>
+                            
+                            {{#each stations}}
+                            <div style="margin-bottom: 15px;">
+                                <h4 style="font-size: 16px; color: #3b82f6; margin: 15px 0 8px 0;">{{station_name}}</h4>
+                                
+                                {{#each items}}
+                                <div style="font-size: 14px; margin: 8px 0; padding-left: 15px; border-left: 2px solid #bfdbfe;">
+                                    <strong>{{name}}</strong>
+                                    {{#if dietary}}
+                                    <span style="color: #2563eb; font-style: italic;"> ({{dietary}})</span>
+                                    {{/if}}
+                                    {{#if allergens}}
+                                    <span style="color: #1e3a8a; font-size: 12px; display: block; margin-top: 3px;">Contains: {{allergens}}</span>
+                                    {{/if}}
+                                </div>
+                                {{/each}}
+                            </div>
+                            {{/each}}
+                        </div>
+                        {{/each}}
+                    </div>
+                </div>
+                {{/each}}
+                
+                <p style="margin-top: 30px; color: #64748b; text-align: center; border-top: 1px solid #bfdbfe; padding-top: 20px;">
+                    This menu update is based on your dietary preferences and restrictions. To update it, just go back to <a href="https://www.cudiningnotifications.com" style="color: #1e3a8a; text-decoration: none;">cudiningnotifications.com</a> and resubmit the thingy.
+                </p>
+            </div>
+        """
+
+TEMPLATE = {
+    "TemplateName": TEMPLATE_NAME,
+    "SubjectPart": SUBJECT_PART,
+    "TextPart": TEXT_PART,
+    "HtmlPart": HTML_PART,
+}
+
+
+# A small Handlebars subset, enough to render the template above locally the way SES
+# does: {{name}}, {{this}}, {{../name}}, dotted paths, {{{raw}}}, {{#each}}, {{#if}},
+# {{#unless}} and {{else}}, with HTML escaping and standalone-tag whitespace rules.
+
+_TAG = re.compile(r'\{\{(\{)?~?\s*([#/^]?)\s*([^}]*?)\s*~?\}?\}\}')
+_ESCAPES = str.maketrans({'`': '&#x60;', '=': '&#x3D;'})
+
+
+class TemplateError(ValueError):
+    pass
+
+
+def _escape(value) -> str:
+    if value is None or value is False:
+        return ''
+    if value is True:
+        return 'true'
+    return html.escape(str(value), quote=True).translate(_ESCAPES)
+
+
+def _raw(value) -> str:
+    if value is None or value is False:
+        return ''
+    return 'true' if value is True else str(value)
+
+
+def _truthy(value) -> bool:
+    return not (value is None or value is False or value == '' or value == 0 or value == [] or value == {})
+
+
+def _lookup(path: str):
+    """Compile a path like 'name', 'this', 'this.name' or '../name' into a function of the context stack."""
+    depth = 0
+    while path.startswith('../'):
+        depth += 1
+        path = path[3:]
+    if path in ('this', '.'):
+        parts = []
+    else:
+        parts = [part for part in path.split('.') if part != 'this']
+
+    def lookup(stack):
+        value = stack[max(len(stack) - 1 - depth, 0)]
+        for part in parts:
+            if isinstance(value, dict):
+                value = value.get(part)
+            elif isinstance(value, (list, tuple)) and part.isdigit() and int(part) < len(value):
+                value = value[int(part)]
+            else:
+                return None
+        return value
+    return lookup
+
+
+def _tokenize(source: str):
+    """Split the source into text and tag tokens, dropping the lines of standalone block tags."""
+    tokens = []
+    position = 0
+    for match in _TAG.finditer(source):
+        tokens.append(('text', source[position:match.start()]))
+        raw, kind, body = match.groups()
+        if kind == '' and body == 'else':
+            kind = 'else'
+        tokens.append(('tag', (kind, body, bool(raw))))
+        position = match.end()
+    tokens.append(('text', source[position:]))
+
+    # A block tag alone on its line takes the line's indentation and newline with it.
+    # Decide on the original text first, since neighbouring tags share a text token.
+    standalone = []
+    for i in range(1, len(tokens) - 1, 2):
+        if tokens[i][1][0] not in ('#', '/', '^', 'else'):
+            continue
+        before, after = tokens[i - 1][1], tokens[i + 1][1]
+        line_start = before.rfind('\n') + 1
+        line_end = after.find('\n')
+        at_start = before[line_start:].strip(' \t') == '' and (line_start > 0 or i == 1)
+        at_end = after[:line_end if line_end >= 0 else len(after)].strip(' \t\r') == '' and (
+            line_end >= 0 or i == len(tokens) - 2)
+        if at_start and at_end:
+            standalone.append(i)
+    for i in standalone:
+        before, after = tokens[i - 1][1], tokens[i + 1][1]
+        tokens[i - 1] = ('text', before[:before.rfind('\n') + 1])
+        line_end = after.find('\n')
+        tokens[i + 1] = ('text', after[line_end + 1:] if line_end >= 0 else '')
+    return tokens
+
+
+def compile_template(source: str):
+    """Compile a template into a render(context) -> str function."""
+    tokens = _tokenize(source)
+    root = []
+    # Each open block: (name, path, children, else_children, in_else)
+    stack = [['', None, root, None, False]]
+
+    for token_type, value in tokens:
+        block = stack[-1]
+        target = block[3] if block[4] else block[2]
+        if token_type == 'text':
+            if value:
+                target.append(('text', value))
+            continue
+        kind, body, raw = value
+        if kind in ('#', '^'):
+            name, _, path = body.partition(' ')
+            name = 'unless' if kind == '^' else name
+            if name not in ('each', 'if', 'unless', 'with'):
+                raise TemplateError(f"Unsupported block helper {{{{#{name}}}}}")
+            stack.append([name, (path or body).strip(), [], [], False])
+        elif kind == 'else':
+            if len(stack) == 1:
+                raise TemplateError("{{else}} outside a block")
+            block[4] = True
+        elif kind == '/':
+            if len(stack) == 1 or body != block[0]:
+                raise TemplateError(f"Unexpected {{{{/{body}}}}}")
+            stack.pop()
+            name, path, children, else_children, _ = block
+            parent = stack[-1]
+            (parent[3] if parent[4] else parent[2]).append((name, _lookup(path), children, else_children))
+        elif body.startswith('!'):
+            continue
+        else:
+            target.append(('raw' if raw else 'var', _lookup(body)))
+    if len(stack) > 1:
+        raise TemplateError(f"Unclosed {{{{#{stack[-1][0]}}}}}")
+
+    def render_nodes(nodes, context_stack, out):
+        for node in nodes:
+            kind = node[0]
+            if kind == 'text':
+                out.append(node[1])
+            elif kind == 'var':
+                out.append(_escape(node[1](context_stack)))
+            elif kind == 'raw':
+                out.append(_raw(node[1](context_stack)))
+            else:
+                _, lookup, children, else_children = node
+                value = lookup(context_stack)
+                if kind == 'each':
+                    items = value.values() if isinstance(value, dict) else (value or [])
+                    if not items:
+                        render_nodes(else_children, context_stack, out)
+                    for item in items:
+                        context_stack.append(item)
+                        render_nodes(children, context_stack, out)
+                        context_stack.pop()
+                elif kind == 'with':
+                    if _truthy(value):
+                        context_stack.append(value)
+                        render_nodes(children, context_stack, out)
+                        context_stack.pop()
+                    else:
+                        render_nodes(else_children, context_stack, out)
+                else:
+                    show = _truthy(value) if kind == 'if' else not _truthy(value)
+                    render_nodes(children if show else else_children, context_stack, out)
+
+    def render(context) -> str:
+        out = []
+        render_nodes(root, [context], out)
+        return ''.join(out)
+    return render
@@ -1,37 +1,306 @@
 
+import asyncio
+import base64
 import json
-import boto3
-from datetime import datetime
-from typing import Dict, List
-from seleniumbase import Driver
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException
-from dataclasses import dataclass
-from tempfile import mkdtemp
+import gzip
+import hashlib
+import os
+import http.client
+from datetime import datetime, timedelta, timezone
+from html.parser import HTMLParser
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urljoin, urlsplit
+from dataclasses import dataclass, field, fields
 import time
 import logging
 import random
 import socket
+import sys
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from zoneinfo import ZoneInfo
 
+# Structured logging: one JSON object per line on stdout. LOG_LEVEL=DEBUG turns on
+# verbose diagnostics (page dumps, template data) that are skipped otherwise.
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO').upper()
+METRICS_NAMESPACE = os.environ.get('METRICS_NAMESPACE', 'CUDiningNotifications')
 
-# Initialize AWS stuff
-dynamodb = boto3.resource('dynamodb', region_name='us-east-1')
-ses = boto3.client('ses', region_name='us-east-1')
-users_table = dynamodb.Table('users')
+
+class JsonLogFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        entry.update(getattr(record, 'fields', {}))
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+logger = logging.getLogger('cu_dining')
+if not logger.handlers:
+    _log_handler = logging.StreamHandler(sys.stdout)
+    _log_handler.setFormatter(JsonLogFormatter())
+    logger.addHandler(_log_handler)
+    # Lambda puts its own handler on the root logger; don't log everything twice
+    logger.propagate = False
+logger.setLevel(LOG_LEVEL)
+
+
+class Tracer:
+    """
+    Timed spans logged as structured JSON, aggregated per span name and flushed
+    as CloudWatch Embedded Metric Format records (plain stdout lines, so they
+    can be checked locally too).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.durations: Dict[str, List[float]] = {}
+            self.errors: Dict[str, int] = {}
+            self.counters: Dict[str, float] = {}
+
+    @contextmanager
+    def span(self, name: str, **fields):
+        """Time a block. The yielded dict can be filled with extra fields for the span's log line."""
+        start = time.perf_counter()
+        status = 'ok'
+        try:
+            yield fields
+        except Exception:
+            status = 'error'
+            raise
+        finally:
+            duration_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self.durations.setdefault(name, []).append(duration_ms)
+                if status == 'error':
+                    self.errors[name] = self.errors.get(name, 0) + 1
+            logger.info(name, extra={'fields': {
+                'span': name, 'duration_ms': round(duration_ms, 2), 'status': status, **fields,
+            }})
+
+    def count(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def flush_metrics(self):
+        """Write one EMF record per span name plus one for the counters, then reset."""
+        with self._lock:
+            durations, errors, counters = self.durations, self.errors, self.counters
+        timestamp = int(time.time() * 1000)
+        for name, values in durations.items():
+            self._emit(timestamp, [['Stage']], {'Stage': name}, {
+                'Count': (len(values), 'Count'),
+                'Errors': (errors.get(name, 0), 'Count'),
+                'TotalDuration': (round(sum(values), 2), 'Milliseconds'),
+                'MaxDuration': (round(max(values), 2), 'Milliseconds'),
+            })
+        if counters:
+            self._emit(timestamp, [[]], {}, {name: (value, 'Count') for name, value in counters.items()})
+        self.reset()
+
+    @staticmethod
+    def _emit(timestamp: int, dimensions, dimension_values: Dict, metrics: Dict):
+        record = {
+            '_aws': {
+                'Timestamp': timestamp,
+                'CloudWatchMetrics': [{
+                    'Namespace': METRICS_NAMESPACE,
+                    'Dimensions': dimensions,
+                    'Metrics': [{'Name': name, 'Unit': unit} for name, (_, unit) in metrics.items()],
+                }],
+            },
+            **dimension_values,
+            **{name: value for name, (value, _) in metrics.items()},
+        }
+        sys.stdout.write(json.dumps(record) + '\n')
+        sys.stdout.flush()
+
+
+tracer = Tracer()
+
+# Importing this module must stay cheap and side-effect free: boto3 and the
+# Selenium stack are imported on the code paths that use them, and AWS clients
+# and browser sessions are cached at container scope for warm invocations.
+_aws_clients = {}
+_aws_lock = threading.Lock()
+
+
+def aws_client(service: str):
+    """
+    Container-scoped boto3 client for a service (a resource for 'dynamodb').
+    <SERVICE>_ENDPOINT_URL, e.g. DYNAMODB_ENDPOINT_URL, points it at a local stand-in.
+    """
+    with _aws_lock:
+        if service not in _aws_clients:
+            import boto3
+            kwargs = {'region_name': 'us-east-1', 'endpoint_url': os.environ.get(f'{service.upper()}_ENDPOINT_URL')}
+            if service == 'dynamodb':
+                _aws_clients[service] = boto3.resource(service, **kwargs)
+            else:
+                _aws_clients[service] = boto3.client(service, **kwargs)
+        return _aws_clients[service]
+
+
+def get_ses():
+    return aws_client('ses')
+
+
+def get_users_table():
+    if 'users_table' not in _aws_clients:
+        _aws_clients['users_table'] = aws_client('dynamodb').Table('users')
+    return _aws_clients['users_table']
+
+# Scrape engine: 'http' reads the pages straight over HTTP and only starts the
+# browser for whatever it couldn't find, 'selenium' always uses the browser.
+# 'http' has only been checked against the hand-written pages in scripts/fixtures,
+# not saved copies of the live site, so the browser stays the default for now.
+SCRAPE_ENGINE = os.environ.get('SCRAPE_ENGINE', 'selenium')
+# How the browser path reads the DOM: 'script' pulls everything in one
+# execute_script call, 'source' parses a single page_source snapshot in Python
+EXTRACT_MODE = os.environ.get('EXTRACT_MODE', 'script')
+# Point this at a local fixture server (scripts/fixtures/serve_fixtures.py) for offline runs
+DINING_BASE_URL = os.environ.get('DINING_BASE_URL', 'https://dining.columbia.edu/')
+
+
+def _default_scrape_concurrency() -> int:
+    # Headless Chrome wants roughly 700 MB, so size the pool off the Lambda's memory
+    memory_mb = int(os.environ.get('AWS_LAMBDA_FUNCTION_MEMORY_SIZE', '1024'))
+    return max(1, min(4, memory_mb // 768))
+
+
+# Max number of browser sessions scraping location menus at the same time
+SCRAPE_CONCURRENCY = int(os.environ.get('SCRAPE_CONCURRENCY', '0')) or _default_scrape_concurrency()
+# Browser profile: 'lean' blocks the BROWSER_BLOCK resource groups through DevTools, uses
+# BROWSER_PAGE_LOAD_STRATEGY (every wait is an explicit readiness check, so 'eager' is
+# safe) and keeps Chrome's disk cache in BROWSER_CACHE_DIR, which outlives the driver
+# while the container is warm. 'full' is plain headless Chrome.
+BROWSER_PROFILE = os.environ.get('BROWSER_PROFILE', 'lean')
+BROWSER_PAGE_LOAD_STRATEGY = os.environ.get('BROWSER_PAGE_LOAD_STRATEGY', 'eager')
+BROWSER_CACHE_DIR = os.environ.get('BROWSER_CACHE_DIR', '/tmp/chrome-cache')
+BROWSER_BLOCK = tuple(
+    group for group in os.environ.get('BROWSER_BLOCK', 'images,fonts,media,stylesheets,trackers').split(',') if group
+)
+# The JSON a location page's Angular app fetches (read via Chrome's performance log and
+# Network.getResponseBody) covers every meal, so it's always used to spot an unchanged
+# menu before clicking any tab. CAPTURE_NETWORK also reads a changed menu from it instead
+# of clicking through every meal tab. CAPTURE_DIR saves the raw responses there as
+# fixtures for the offline decoder.
+CAPTURE_NETWORK = os.environ.get('CAPTURE_NETWORK', '0') == '1'
+CAPTURE_DIR = os.environ.get('CAPTURE_DIR', '')
+# Keep browser sessions alive between warm invocations (on by default inside Lambda)
+REUSE_DRIVERS = os.environ.get('REUSE_DRIVERS', '1' if 'AWS_LAMBDA_FUNCTION_NAME' in os.environ else '0') == '1'
+# Parallel scan segments (one thread each) used to read the users table
+USER_SCAN_SEGMENTS = int(os.environ.get('USER_SCAN_SEGMENTS', '1'))
+# Campus time zone: menus, opening hours, snapshots and delivery runs all go by the
+# date on campus, not the host's clock (UTC on Lambda)
+DINING_TIMEZONE = os.environ.get('DINING_TIMEZONE', 'America/New_York')
+
+
+def campus_today():
+    return datetime.now(ZoneInfo(DINING_TIMEZONE)).date()
+
+
+# Where scrape snapshots are kept between invocations: a local directory or
+# s3://bucket/prefix. Empty disables snapshots. S3_ENDPOINT_URL allows a local S3 stand-in.
+SNAPSHOT_STORE = os.environ.get('SNAPSHOT_STORE', '')
+# A snapshot older than this is scraped again instead of reused
+SNAPSHOT_MAX_AGE_SECONDS = int(os.environ.get('SNAPSHOT_MAX_AGE_SECONDS', str(12 * 60 * 60)))
+# Prefetch mode scrapes the next PREFETCH_DAYS days in one browser session, asking the
+# site for each day with ?MENU_DATE_PARAM=YYYY-MM-DD. A prefetched snapshot is used on
+# its day as long as it is younger than PREFETCH_MAX_AGE_SECONDS.
+MENU_DATE_PARAM = os.environ.get('MENU_DATE_PARAM', 'date')
+PREFETCH_DAYS = int(os.environ.get('PREFETCH_DAYS', '7'))
+PREFETCH_MAX_AGE_SECONDS = int(os.environ.get('PREFETCH_MAX_AGE_SECONDS', str(8 * 24 * 60 * 60)))
+# Threads sending bulk email batches; SES takes at most 50 destinations per call
+SEND_THREADS = int(os.environ.get('SEND_THREADS', '8'))
+BULK_BATCH_SIZE = 50
+# 'ses' sends SES-rendered templated bulk email; 'local' renders the same template
+# (email_template.py, deployed next to this file) in-process and sends raw email
+RENDER_MODE = os.environ.get('RENDER_MODE', 'ses')
+# Fraction of the account's SES MaxSendRate to pace at, and attempts per batch on throttling
+SEND_RATE_HEADROOM = float(os.environ.get('SEND_RATE_HEADROOM', '0.9'))
+SEND_MAX_ATTEMPTS = int(os.environ.get('SEND_MAX_ATTEMPTS', '5'))
+# Bound on users queued between the scan and format stages of the delivery pipeline
+PIPELINE_QUEUE_SIZE = int(os.environ.get('PIPELINE_QUEUE_SIZE', '1000'))
+# Stop reading new users this long before the Lambda times out, then drain what's queued
+SHUTDOWN_MARGIN_SECONDS = int(os.environ.get('SHUTDOWN_MARGIN_SECONDS', '60'))
+# Where delivery progress is checkpointed so a crashed or timed out run can be resumed:
+# a local directory or dynamodb://table (hash key run_id, range key email). Empty disables it.
+CHECKPOINT_STORE = os.environ.get('CHECKPOINT_STORE', '')
+# Checkpoint writes are batched: flush after this many recipients or this many seconds
+CHECKPOINT_FLUSH_SIZE = int(os.environ.get('CHECKPOINT_FLUSH_SIZE', '500'))
+CHECKPOINT_FLUSH_SECONDS = float(os.environ.get('CHECKPOINT_FLUSH_SECONDS', '5'))
+# Resume today's run: skip checkpointed recipients and reuse today's snapshot however old
+# (an event's 'resume' key overrides this)
+RESUME_DELIVERY = os.environ.get('RESUME_DELIVERY', '0') == '1'
+# Fan-out: with more than one shard the handler scrapes and publishes the snapshot, then
+# invokes WORKER_FUNCTION_NAME (this function by default) once per shard to do the sending.
+# Needs SNAPSHOT_STORE so workers can read the coordinator's menus.
+FANOUT_SHARDS = int(os.environ.get('FANOUT_SHARDS', '1'))
+WORKER_FUNCTION_NAME = os.environ.get('WORKER_FUNCTION_NAME', os.environ.get('AWS_LAMBDA_FUNCTION_NAME', ''))
+SENDER = 'roy@cudiningnotifications.com'  # Make sure this email is verified in SES
+TEMPLATE_NAME = 'ColumbiaDiningMenuUpdate'
+# Only the attributes format_menu_for_user() and the send loop actually read
+USER_ATTRIBUTES = ('email', 'is_vegetarian', 'is_vegan', 'is_halal', 'unavailable_foods')
+# Scan this GSI on the users table (hash key preference_signature, projecting the
+# USER_ATTRIBUTES; see scripts/dynamodb/bulk_users.py create-index) so users arrive
+# grouped by identical preferences. The index is sparse, so users without a stored
+# signature are then read from the table itself.
+USER_SCAN_INDEX = os.environ.get('USER_SCAN_INDEX', '')
 
 #classes
-@dataclass
+def _slotted(cls):
+    """Rebuild a dataclass with __slots__, like dataclass(slots=True) on Python 3.10+ (Lambda runs 3.9)."""
+    names = tuple(f.name for f in fields(cls))
+    namespace = {key: value for key, value in cls.__dict__.items()
+                 if key not in names + ('__dict__', '__weakref__')}
+    namespace['__slots__'] = names
+    if cls.__dataclass_params__.frozen:
+        # Without a __dict__, pickle and copy restore state through setattr, which
+        # a frozen class refuses; dataclass(slots=True) adds these for the same reason
+        namespace['__getstate__'] = _slotted_getstate
+        namespace['__setstate__'] = _slotted_setstate
+    return type(cls)(cls.__name__, cls.__bases__, namespace)
+
+
+def _slotted_getstate(self):
+    return [getattr(self, f.name) for f in fields(self)]
+
+
+def _slotted_setstate(self, state):
+    for f, value in zip(fields(self), state):
+        object.__setattr__(self, f.name, value)
+
+
+# Slotted so the thousands of items scraped per day don't each carry a __dict__;
+# allergen, station and meal strings are interned in _parse_menu_item/_apply_raw_meals
+@_slotted
+@dataclass(frozen=True)
 class MenuItem:
     title: str
-    allergens: List[str]
+    allergens: Tuple[str, ...]
     is_vegetarian: bool = False
     is_vegan: bool = False
     is_halal: bool = False
+    # Lowercased allergens for filtering, derived from allergens
+    allergens_lower: Tuple[str, ...] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, 'allergens_lower', tuple(sys.intern(allergen.lower()) for allergen in self.allergens))
 
+
+@_slotted
 @dataclass
 class DiningLocation:
     name: str
@@ -39,525 +308,2515 @@ class DiningLocation:
     menus: Dict[str, Dict[str, Dict[str, MenuItem]]]
     open_today: bool = False
     open_times: str = ""
+    # 'dining' or 'retail' once seen on the homepage
+    kind: str = ""
+
+
+# URL patterns (Network.setBlockedURLs syntax) for each BROWSER_BLOCK group
+BLOCKED_URL_PATTERNS = {
+    'images': ('*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico'),
+    'fonts': ('*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot'),
+    'media': ('*.mp4', '*.webm', '*.mp3', '*.m4a'),
+    'stylesheets': ('*.css',),
+    'trackers': ('*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*facebook.net*',
+                 '*hotjar.com*', '*siteimprove*', '*nr-data.net*', '*newrelic.com*', '*addthis.com*',
+                 '*youtube.com*', '*twitter.com*'),
+}
+
+
+def blocked_url_patterns(groups=BROWSER_BLOCK) -> List[str]:
+    patterns = []
+    for group in groups:
+        for pattern in BLOCKED_URL_PATTERNS.get(group, ()):
+            patterns.append(pattern)
+            if pattern.startswith('*.'):
+                patterns.append(pattern + '?*')  # cache-busted asset URLs
+    return patterns
 
 
 def initialize_driver():
-    print('Initializing driver')
+    logger.info('Initializing driver')
+    from seleniumbase import Driver
     try:
-        # SeleniumBase Driver with specific capabilities
-        driver = Driver(
-            headless=True,
+        with tracer.span('driver_init', profile=BROWSER_PROFILE):
+            # SeleniumBase Driver with specific capabilities
+            # Turns on goog:loggingPrefs performance logging for captured_json_responses()
+            options = {'headless': True, 'log_cdp_events': True}
+            if BROWSER_PROFILE == 'lean':
+                options['page_load_strategy'] = BROWSER_PAGE_LOAD_STRATEGY
+                if BROWSER_CACHE_DIR:
+                    os.makedirs(BROWSER_CACHE_DIR, exist_ok=True)
+                    options['chromium_arg'] = f'--disk-cache-dir={BROWSER_CACHE_DIR},--disk-cache-size=104857600'
+            driver = Driver(**options)
+            
+            # Set timeouts through selenium's standard interface
+            driver.set_script_timeout(30)
+            driver.set_page_load_timeout(30)
+            
+            # Explicit waits only; an implicit wait would stall every readiness poll
+            driver.implicitly_wait(0)
 
-        )
-        
-        # Set timeouts through selenium's standard interface
-        driver.set_script_timeout(30)
-        driver.set_page_load_timeout(30)
-        
-        # Additional SeleniumBase-specific settings
-        driver.implicitly_wait(10)
+            if BROWSER_PROFILE == 'lean':
+                _block_resources(driver)
         
         return driver
     except Exception as e:
-        print(f"Error initializing driver: {e}")
+        logger.error(f"Error initializing driver: {e}")
         raise
 
 
+def _block_resources(driver):
+    """Stop the browser fetching assets the scraper never reads; a failure just loads everything."""
+    patterns = blocked_url_patterns()
+    if not patterns:
+        return
+    try:
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': patterns})
+        logger.debug(f"Blocking {len(patterns)} URL patterns ({', '.join(BROWSER_BLOCK)})")
+    except Exception as e:
+        logger.warning(f"Couldn't enable resource blocking: {e}")
+
+
+class DriverPool:
+    """Bounded set of browser sessions handed out to scrape workers one at a time."""
+
+    def __init__(self, size: int):
+        self.size = max(1, size)
+        self._idle = []
+        self._started = 0
+        self._available = threading.Condition()
+
+    def _start_driver(self):
+        try:
+            return initialize_driver()
+        except Exception:
+            with self._available:
+                self._started -= 1
+                self._available.notify()
+            raise
+
+    @staticmethod
+    def is_healthy(driver) -> bool:
+        """Cheap round trip to make sure the session is still alive."""
+        try:
+            driver.execute_script("return 1;")
+            return True
+        except Exception:
+            return False
+
+    def _acquire(self):
+        with self._available:
+            while not self._idle and self._started >= self.size:
+                self._available.wait()
+            if self._idle:
+                driver = self._idle.pop()
+            else:
+                self._started += 1
+                driver = None
+
+        # Start new sessions outside the lock so workers can boot Chrome in parallel
+        if driver is None:
+            return self._start_driver()
+        if self.is_healthy(driver):
+            return driver
+        logger.warning("Replacing unhealthy driver session")
+        self._discard(driver)
+        with self._available:
+            self._started += 1
+        return self._start_driver()
+
+    def _release(self, driver):
+        with self._available:
+            self._idle.append(driver)
+            self._available.notify()
+
+    def _discard(self, driver):
+        try:
+            driver.quit()
+        except Exception as e:
+            logger.error(f"Error quitting driver: {e}")
+        with self._available:
+            self._started -= 1
+            self._available.notify()
+
+    @contextmanager
+    def session(self):
+        """Borrow a driver; it goes back to the pool afterwards, or is dropped if it died."""
+        driver = self._acquire()
+        try:
+            yield driver
+        except Exception:
+            if self.is_healthy(driver):
+                self._release(driver)
+            else:
+                self._discard(driver)
+            raise
+        else:
+            self._release(driver)
+
+    def quit(self):
+        with self._available:
+            drivers, self._idle = self._idle, []
+        for driver in drivers:
+            self._discard(driver)
+
+
+_driver_pool: Optional[DriverPool] = None
+
+
+def get_driver_pool() -> DriverPool:
+    """Container-scoped driver pool; sessions left in it are health checked before reuse."""
+    global _driver_pool
+    if _driver_pool is None or _driver_pool.size != SCRAPE_CONCURRENCY:
+        if _driver_pool is not None:
+            _driver_pool.quit()
+        _driver_pool = DriverPool(SCRAPE_CONCURRENCY)
+    return _driver_pool
+
+
+class HttpSession:
+    """Small keep-alive HTTP client that reuses one connection per host."""
+    MAX_REDIRECTS = 5
+
+    def __init__(self, timeout: int = 10):
+        self.timeout = timeout
+        self.headers = {
+            'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) cu-dining-notifications',
+            'Accept': 'text/html,application/json;q=0.9,*/*;q=0.8',
+            'Accept-Encoding': 'gzip',
+            'Connection': 'keep-alive',
+        }
+        self._connections = {}
+
+    def _connection(self, scheme: str, netloc: str):
+        key = (scheme, netloc)
+        if key not in self._connections:
+            conn_class = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+            self._connections[key] = conn_class(netloc, timeout=self.timeout)
+        return self._connections[key]
+
+    def _drop_connection(self, scheme: str, netloc: str):
+        conn = self._connections.pop((scheme, netloc), None)
+        if conn:
+            conn.close()
+
+    def get(self, url: str) -> str:
+        """GET a url and return the decoded body, following redirects."""
+        for _ in range(self.MAX_REDIRECTS):
+            parts = urlsplit(url)
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+
+            # A pooled connection may have been closed by the server; retry once on a fresh one
+            for attempt in range(2):
+                conn = self._connection(parts.scheme, parts.netloc)
+                try:
+                    conn.request('GET', path, headers=self.headers)
+                    response = conn.getresponse()
+                    body = response.read()
+                    break
+                except (http.client.HTTPException, ConnectionError):
+                    self._drop_connection(parts.scheme, parts.netloc)
+                    if attempt:
+                        raise
+
+            if response.status in (301, 302, 303, 307, 308):
+                url = urljoin(url, response.getheader('Location', ''))
+                continue
+            if response.status != 200:
+                raise RuntimeError(f"GET {url} returned {response.status}")
+
+            if response.getheader('Content-Encoding', '') == 'gzip':
+                body = gzip.decompress(body)
+            charset = response.headers.get_content_charset() or 'utf-8'
+            return body.decode(charset, errors='replace')
+
+        raise RuntimeError(f"Too many redirects for {url}")
+
+    def close(self):
+        for conn in self._connections.values():
+            conn.close()
+        self._connections = {}
+
+
+class HtmlNode:
+    """Minimal element tree so saved/fetched pages can be queried like the live DOM."""
+    __slots__ = ('tag', 'attrs', 'children', 'parent')
+
+    def __init__(self, tag: str, attrs: Dict[str, str], parent=None):
+        self.tag = tag
+        self.attrs = attrs
+        self.children = []
+        self.parent = parent
+
+    @property
+    def classes(self) -> List[str]:
+        return self.attrs.get('class', '').split()
+
+    def iter(self):
+        """Yield every descendant element, depth first."""
+        for child in self.children:
+            if isinstance(child, HtmlNode):
+                yield child
+                yield from child.iter()
+
+    def find_all(self, class_name: str = None, tag: str = None) -> List['HtmlNode']:
+        return [
+            node for node in self.iter()
+            if (class_name is None or class_name in node.classes)
+            and (tag is None or node.tag == tag)
+        ]
+
+    def find(self, class_name: str = None, tag: str = None) -> Optional['HtmlNode']:
+        for node in self.iter():
+            if (class_name is None or class_name in node.classes) and (tag is None or node.tag == tag):
+                return node
+        return None
+
+    def raw_text(self) -> str:
+        if self.tag == 'br':
+            return '\n'
+        return ''.join(
+            child.raw_text() if isinstance(child, HtmlNode) else child
+            for child in self.children
+        )
+
+    @property
+    def text(self) -> str:
+        """Whitespace-normalised text content, close to what WebElement.text gives."""
+        lines = (' '.join(line.split()) for line in self.raw_text().split('\n'))
+        return '\n'.join(line for line in lines if line)
+
+
+class _HtmlTreeBuilder(HTMLParser):
+    VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input',
+                 'link', 'meta', 'param', 'source', 'track', 'wbr'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = HtmlNode('document', {})
+        self.current = self.root
+
+    def handle_starttag(self, tag, attrs):
+        node = HtmlNode(tag, {k: v or '' for k, v in attrs}, self.current)
+        self.current.children.append(node)
+        if tag not in self.VOID_TAGS:
+            self.current = node
+
+    def handle_startendtag(self, tag, attrs):
+        self.current.children.append(HtmlNode(tag, {k: v or '' for k, v in attrs}, self.current))
+
+    def handle_endtag(self, tag):
+        # Close up to the matching open tag; stray end tags are ignored
+        node = self.current
+        while node is not self.root and node.tag != tag:
+            node = node.parent
+        if node is not self.root:
+            self.current = node.parent
+
+    def handle_data(self, data):
+        self.current.children.append(data)
+
+
+def parse_html(markup: str) -> HtmlNode:
+    builder = _HtmlTreeBuilder()
+    builder.feed(markup)
+    builder.close()
+    return builder.root
+
+
+def parse_homepage_locations(root: HtmlNode) -> List[Dict]:
+    """Read name, url and open times for every location block on the homepage."""
+    entries = []
+    for kind in ('dining-location', 'retail-location'):
+        for loc in root.find_all(kind):
+            name_element = loc.find('name')
+            link = name_element.find(tag='a') if name_element else None
+            if not link:
+                continue
+            open_time_element = loc.find('open-time')
+            entries.append({
+                'name': link.text,
+                'url': link.attrs.get('href', ''),
+                'open_times': open_time_element.text if open_time_element else '',
+                'kind': 'dining' if kind == 'dining-location' else 'retail',
+            })
+    return entries
+
+
+# Keys the menu JSON decoder accepts for each level of the payload
+_NAME_KEYS = ('name', 'title', 'label')
+_MEAL_KEYS = ('meal', 'meal_type', 'meal_period') + _NAME_KEYS
+_STATION_KEYS = ('station', 'station_name', 'station_title') + _NAME_KEYS
+_STATION_LIST_KEYS = ('stations', 'station_list')
+_ITEM_LIST_KEYS = ('items', 'meal_items', 'menu_items', 'dishes')
+_PREFS_KEYS = ('dietary', 'prefs', 'meal_prefs', 'preferences')
+_ALLERGEN_KEYS = ('allergens', 'contains')
+
+
+def _first_value(data: Dict, keys):
+    for key in keys:
+        if data.get(key):
+            return data[key]
+    return None
+
+
+def _as_text(value) -> str:
+    if isinstance(value, list):
+        return ', '.join(_as_text(v) for v in value if v)
+    if isinstance(value, dict):
+        return _as_text(_first_value(value, _NAME_KEYS) or '')
+    return str(value or '').strip()
+
+
+def decode_menu_payload(payload, meal_types) -> Dict[str, List[Dict]]:
+    """
+    Walk a decoded JSON payload and pull out meal -> stations -> items for the
+    given meal types. Returns {meal_type: [{'station', 'items': [raw item]}]}
+    where a raw item is {'title', 'prefs', 'allergens'} as plain text.
+    """
+    meals = {}
+
+    def decode_stations(station_list):
+        stations = []
+        for station in station_list:
+            if not isinstance(station, dict):
+                continue
+            items = _first_value(station, _ITEM_LIST_KEYS) or []
+            raw_items = []
+            for item in items:
+                if not isinstance(item, dict) or not _first_value(item, _NAME_KEYS):
+                    continue
+                allergens = _as_text(_first_value(item, _ALLERGEN_KEYS))
+                if allergens and not allergens.startswith('Contains: '):
+                    allergens = 'Contains: ' + allergens
+                raw_items.append({
+                    'title': _as_text(_first_value(item, _NAME_KEYS)),
+                    'prefs': _as_text(_first_value(item, _PREFS_KEYS)),
+                    'allergens': allergens,
+                })
+            stations.append({'station': _as_text(_first_value(station, _STATION_KEYS)), 'items': raw_items})
+        return stations
+
+    def walk(node):
+        if isinstance(node, dict):
+            meal_name = _as_text(_first_value(node, _MEAL_KEYS))
+            station_list = _first_value(node, _STATION_LIST_KEYS)
+            if meal_name in meal_types and isinstance(station_list, list):
+                meals.setdefault(meal_name, []).extend(decode_stations(station_list))
+                return
+            for value in node.values():
+                walk(value)
+        elif isinstance(node, list):
+            for value in node:
+                walk(value)
+
+    walk(payload)
+    return meals
+
+
+def captured_json_responses(driver) -> List[Dict]:
+    """
+    Bodies of the XHR/fetch responses the page made since the performance log was
+    last read, as [{'url', 'body'}]. Reading the log also clears it.
+    """
+    requests = {}
+    for entry in driver.get_log('performance'):
+        try:
+            message = json.loads(entry['message'])['message']
+        except (KeyError, ValueError):
+            continue
+        if message.get('method') != 'Network.responseReceived':
+            continue
+        params = message.get('params', {})
+        response = params.get('response', {})
+        if params.get('type') in ('XHR', 'Fetch') or 'json' in response.get('mimeType', ''):
+            requests[params['requestId']] = response.get('url', '')
+
+    captures = []
+    for request_id, url in requests.items():
+        try:
+            result = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+        except Exception as e:
+            # Still loading, or already evicted from the browser's buffer
+            logger.debug(f"No body for {url}: {e}")
+            continue
+        body = result.get('body', '')
+        if result.get('base64Encoded'):
+            body = base64.b64decode(body).decode('utf-8', 'replace')
+        captures.append({'url': url, 'body': body})
+    return captures
+
+
+def decode_captured_menus(captures: List[Dict], meal_types) -> Dict[str, List[Dict]]:
+    """Decode every meal found in captured response bodies; non-JSON bodies are ignored."""
+    meals = {}
+    for capture in captures:
+        try:
+            payload = json.loads(capture['body'])
+        except ValueError:
+            continue
+        for meal_type, stations in decode_menu_payload(payload, meal_types).items():
+            meals.setdefault(meal_type, []).extend(stations)
+    return meals
+
+
+def save_captures(directory: str, location: 'DiningLocation', captures: List[Dict]) -> str:
+    """Store a location's captured responses as a fixture for scripts/fixtures/decode_captures.py."""
+    os.makedirs(directory, exist_ok=True)
+    slug = urlsplit(location.url).path.rstrip('/').rsplit('/', 1)[-1] or 'location'
+    path = os.path.join(directory, f"{slug}.json")
+    with open(path, 'w') as f:
+        json.dump({
+            'location': location.name,
+            'url': location.url,
+            'meal_types': list(location.menus),
+            'captured_at': datetime.now(timezone.utc).isoformat(),
+            'responses': captures,
+        }, f, indent=1)
+    return path
+
+
+def parse_location_page(root: HtmlNode, meal_types) -> Dict[str, List[Dict]]:
+    """
+    Extract menus from a location page without a browser. Embedded JSON is
+    preferred since it has every meal; otherwise fall back to the meal tab
+    rendered in the markup, but only when no other wanted tab exists (empty
+    result, so the caller uses the browser, otherwise).
+    """
+    meals = {}
+    for script in root.find_all(tag='script'):
+        content = script.raw_text().strip()
+        if not content.startswith(('{', '[')):
+            continue
+        try:
+            payload = json.loads(content)
+        except ValueError:
+            continue
+        for meal_type, stations in decode_menu_payload(payload, meal_types).items():
+            meals.setdefault(meal_type, []).extend(stations)
+    if meals:
+        return meals
+
+    menu_tabs = root.find('cu-dining-menu-tabs')
+    if not menu_tabs:
+        return meals
+    active_meal = None
+    tabs = []
+    for button in menu_tabs.find_all(tag='button'):
+        tabs.append(button.text)
+        if active_meal is None and ('active' in button.classes or button.attrs.get('aria-selected') == 'true'):
+            active_meal = button.text
+    if active_meal not in meal_types:
+        return meals
+    # The markup only holds the active tab, so it's only the whole menu when that's the only tab we want
+    missing = [tab for tab in tabs if tab in meal_types and tab != active_meal]
+    if missing:
+        logger.debug(f"Only {active_meal} is rendered, {', '.join(missing)} need the browser")
+        return meals
+
+    stations = parse_rendered_stations(root)
+    if stations:
+        meals[active_meal] = stations
+    return meals
+
+
+def parse_rendered_stations(root: HtmlNode) -> List[Dict]:
+    """Read the stations and items of the meal tab currently rendered in the page."""
+    stations = []
+    for node in root.iter():
+        # Same shape as the Selenium XPath: a div with a direct .meal-items child div
+        if node.tag != 'div' or not any(
+            isinstance(child, HtmlNode) and child.tag == 'div' and 'meal-items' in child.classes
+            for child in node.children
+        ):
+            continue
+        title = node.find('station-title')
+        raw_items = []
+        for meal_item in node.find_all('meal-item'):
+            item_title = meal_item.find('meal-title')
+            prefs = meal_item.find('meal-prefs')
+            prefs_strong = prefs.find(tag='strong') if prefs else None
+            allergens = meal_item.find(tag='em')
+            raw_items.append({
+                'title': item_title.text if item_title else '',
+                'prefs': prefs_strong.text if prefs_strong else '',
+                'allergens': allergens.text if allergens else '',
+            })
+        stations.append({'station': title.text if title else '', 'items': raw_items})
+    return stations
+
+
+# One execute_script call returning the same structures as the HTML parsers above,
+# instead of a WebDriver round trip per element
+# Reads every entry whether or not the list is expanded: innerText is empty for
+# collapsed (display: none) entries, so text is rebuilt from the DOM with <br> as a
+# line break and whitespace normalised the same way as HtmlNode.text
+EXTRACT_LOCATIONS_JS = """
+var text = function (el) {
+    if (!el) { return ''; }
+    var raw = '';
+    (function walk(node) {
+        node.childNodes.forEach(function (child) {
+            if (child.nodeType === 3) { raw += child.nodeValue; }
+            else if (child.nodeName === 'BR') { raw += '\\n'; }
+            else { walk(child); }
+        });
+    })(el);
+    return raw.split('\\n').map(function (line) {
+        return line.replace(/\\s+/g, ' ').trim();
+    }).filter(Boolean).join('\\n');
+};
+var entries = [];
+[['.dining-location', 'dining'], ['.retail-location', 'retail']].forEach(function (kind) {
+    document.querySelectorAll(kind[0]).forEach(function (loc) {
+        var link = loc.querySelector('.name a');
+        if (!link) { return; }
+        entries.push({
+            name: text(link),
+            url: link.href || '',
+            open_times: text(loc.querySelector('.open-time')),
+            kind: kind[1]
+        });
+    });
+});
+return entries;
+"""
+
+EXTRACT_STATIONS_JS = """
+var text = function (el) { return el ? (el.innerText || '').trim() : ''; };
+var seen = new Set();
+var stations = [];
+document.querySelectorAll('div > div.meal-items').forEach(function (list) {
+    var station = list.parentElement;
+    if (seen.has(station)) { return; }
+    seen.add(station);
+    var items = [];
+    station.querySelectorAll('.meal-item').forEach(function (item) {
+        items.push({
+            title: text(item.querySelector('.meal-title')),
+            prefs: text(item.querySelector('div.meal-prefs strong')),
+            allergens: text(item.querySelector('em'))
+        });
+    });
+    stations.push({station: text(station.querySelector('.station-title')), items: items});
+});
+return stations;
+"""
+
+
+def page_fingerprint(data) -> str:
+    """Short stable hash of extracted page data, used to tell whether a page changed."""
+    return hashlib.sha256(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+
+def preference_signature(user: Dict) -> str:
+    """
+    Canonical key for everything format_menu_for_user() looks at, from the user's
+    raw fields, e.g. 'veg=1|vegan=0|halal=0|avoid=["peanut","shellfish"]'. Foods are
+    lowercased, stripped, de-duplicated and sorted so list order doesn't matter.
+    Always computed, never read back: the stored preference_signature attribute
+    (scripts/dynamodb/bulk_users.py) only orders the USER_SCAN_INDEX scan.
+    """
+    foods = sorted({str(food).strip().lower() for food in user.get('unavailable_foods') or []} - {''})
+    return (
+        f"veg={int(bool(user.get('is_vegetarian')))}"
+        f"|vegan={int(bool(user.get('is_vegan')))}"
+        f"|halal={int(bool(user.get('is_halal')))}"
+        f"|avoid={json.dumps(foods, separators=(',', ':'))}"
+    )
+
+
+def parse_preference_signature(signature: str) -> Dict:
+    """Turn a preference signature back into normalised preferences."""
+    # The food list is last and JSON encoded, so it may contain '|' itself
+    fields = dict(part.split('=', 1) for part in signature.split('|', 3))
+    return {
+        'is_vegetarian': fields['veg'] == '1',
+        'is_vegan': fields['vegan'] == '1',
+        'is_halal': fields['halal'] == '1',
+        'unavailable_foods': json.loads(fields['avoid']),
+    }
+
+
+class MenuIndex:
+    """
+    Flat table of every open item with int bitsets (bit i = row i) for the
+    dietary flags and for each lowercased allergen, so a user's visible items
+    are a few AND / AND NOT operations instead of nested loops.
+    """
+
+    def __init__(self, locations: Dict[str, DiningLocation]):
+        # (location_name, meal_type, station_name, formatted item) in output order
+        self.rows = []
+        self.open_times: Dict[str, str] = {}
+        self.vegetarian = 0
+        self.vegan = 0
+        self.halal = 0
+        self.allergens: Dict[str, int] = {}
+
+        for location_name, location in locations.items():
+            if not location.open_today:
+                continue
+            self.open_times[location_name] = location.open_times
+            for meal_type, stations in location.menus.items():
+                for station_name, items in stations.items():
+                    for item_name, item in items.items():
+                        bit = 1 << len(self.rows)
+                        self.rows.append((location_name, meal_type, station_name, self._format_item(item_name, item)))
+                        if item.is_vegetarian:
+                            self.vegetarian |= bit
+                        if item.is_vegan:
+                            self.vegan |= bit
+                        if item.is_halal:
+                            self.halal |= bit
+                        for allergen in item.allergens_lower:
+                            self.allergens[allergen] = self.allergens.get(allergen, 0) | bit
+        self.all = (1 << len(self.rows)) - 1
+
+    @staticmethod
+    def _format_item(item_name: str, item: MenuItem) -> Dict:
+        # Format dietary information
+        dietary = []
+        if item.is_vegan:
+            dietary.append("Vegan")
+        elif item.is_vegetarian:
+            dietary.append("Vegetarian")
+        if item.is_halal:
+            dietary.append("Halal")
+        return {
+            "name": item_name,
+            "dietary": ", ".join(dietary) if dietary else None,
+            "allergens": ", ".join(item.allergens) if item.allergens else None
+        }
+
+    def visible(self, preferences: Dict) -> int:
+        """Bitset of rows matching normalised preferences."""
+        mask = self.all
+        if preferences['is_vegetarian']:
+            mask &= self.vegetarian
+        if preferences['is_vegan']:
+            mask &= self.vegan
+        if preferences['is_halal']:
+            mask &= self.halal
+        for food in preferences['unavailable_foods']:
+            mask &= ~self.allergens.get(food, 0)
+        return mask
+
+    def format(self, preferences: Dict) -> List[Dict]:
+        """Nested location -> meal -> station -> items output for the rows matching preferences."""
+        return self.format_rows(self.visible(preferences))
+
+    def format_rows(self, mask: int) -> List[Dict]:
+        """Nested location -> meal -> station -> items output for the rows in a bitset."""
+        formatted_locations = []
+        location_data = meal_data = station_data = None
+        while mask:
+            low = mask & -mask
+            mask ^= low
+            location_name, meal_type, station_name, item = self.rows[low.bit_length() - 1]
+
+            # Rows are in output order, so a new container starts whenever a name changes
+            if location_data is None or location_data["name"] != location_name:
+                location_data = {"name": location_name, "open_times": self.open_times[location_name], "meals": []}
+                formatted_locations.append(location_data)
+                meal_data = None
+            if meal_data is None or meal_data["meal_type"] != meal_type:
+                meal_data = {"meal_type": meal_type, "stations": []}
+                location_data["meals"].append(meal_data)
+                station_data = None
+            if station_data is None or station_data["station_name"] != station_name:
+                station_data = {"station_name": station_name, "items": []}
+                meal_data["stations"].append(station_data)
+            station_data["items"].append(item)
+
+        return formatted_locations
+
+
+MEAL_TAB_NAMES_JS = """
+return Array.prototype.map.call(
+    document.querySelectorAll('.cu-dining-menu-tabs button'),
+    function (button) { return (button.innerText || '').trim(); }
+);
+"""
+
+# Marks the rendered item list stale before clicking so we can tell when it's replaced
+CLICK_MEAL_TAB_JS = """
+var button = arguments[0];
+var wasActive = button.classList.contains('active');
+var list = document.querySelector('.meal-items');
+if (list && !wasActive) { list.setAttribute('data-scrape-stale', '1'); }
+button.scrollIntoView(true);
+button.click();
+return wasActive;
+"""
+
+MEAL_TAB_SWAPPED_JS = """
+var list = document.querySelector('.meal-items');
+return !list || !list.hasAttribute('data-scrape-stale');
+"""
+
+# Navigation Timing for the current page: load times and bytes actually transferred
+# (resources served from the disk cache report a transferSize of 0)
+PAGE_LOAD_STATS_JS = """
+var nav = performance.getEntriesByType('navigation')[0] || {};
+var resources = performance.getEntriesByType('resource');
+var bytes = 0, cached = 0;
+resources.forEach(function (r) {
+    bytes += r.transferSize || 0;
+    if (!r.transferSize && r.decodedBodySize) { cached += 1; }
+});
+return {
+    dom_ready_ms: Math.round(nav.domContentLoadedEventEnd || 0),
+    load_ms: Math.round(nav.loadEventEnd || 0),
+    document_bytes: nav.transferSize || 0,
+    resource_bytes: bytes,
+    resources: resources.length,
+    cached_resources: cached
+};
+"""
+
+
+# Locations we know about: page path and the menu tabs to scrape (() tracks open/closed
+# status only). The homepage is the source of truth for which locations exist and
+# where they live; this overlays the menu tabs and covers runs before it's been read.
+KNOWN_LOCATIONS: Dict[str, Tuple[str, Tuple[str, ...]]] = {
+    'John Jay Dining Hall': ('content/john-jay-dining-hall', ('Breakfast', 'Brunch', 'Lunch', 'Dinner', 'Lunch & Dinner')),
+    "JJ's Place": ('content/jjs-place-0', ('Daily', 'Late Night', 'Breakfast', 'Lunch & Dinner')),
+    'Ferris Booth Commons': ('content/ferris-booth-commons-0', ('Breakfast', 'Lunch', 'Dinner', 'Lunch & Dinner')),
+    'Faculty House': ('content/faculty-house-0', ('Lunch',)),
+    'The Fac Shack': ('content/fac-shack', ('Dinner',)),
+    'Blue Java Café - Butler Library': ('content/blue-java-cafe-butler-library', ()),
+    "Chef Mike's Sub Shop": ('content/chef-mikes-sub-shop', ()),
+    "Chef Don's Pizza Pi": ('content/chef-dons-pizza-pi', ()),
+    'Grace Dodge Dining Hall': ('content/grace-dodge-dining-hall', ()),
+    'Robert F. Smith Dining Hall': ('content/robert-f-smith-dining-hall', ()),
+    'Blue Java Café - Mudd Hall': ('content/blue-java-cafe-mudd-hall', ()),
+    'Blue Java Café - Uris': ('content/blue-java-cafe-uris', ()),
+    'Blue Java at Everett Library Café': ('content/blue-java-everett-library-cafe', ()),
+    'Lenfest Café': ('content/lenfest-cafe', ()),
+}
+# Menu tabs tried for a dining hall that appears on the homepage but isn't listed above
+DEFAULT_MENU_TABS = ('Breakfast', 'Brunch', 'Lunch', 'Dinner', 'Lunch & Dinner', 'Late Night', 'Daily')
+# Discovered locations ({name: {'url', 'kind'}}), kept while the container is warm and
+# in the snapshot store under REGISTRY_KEY between runs
+_location_registry: Dict[str, Dict] = {}
+REGISTRY_KEY = 'locations.json'
+
 
 class ColumbiaDiningScraper:
-    BASE_URL = 'https://dining.columbia.edu/'
+    BASE_URL = DINING_BASE_URL
     TIMEOUT = 10
 
     def __init__(self):
-        self.driver = initialize_driver()
+        # Browser sessions are only started when the Selenium path actually needs them
+        self.pool = None
+        # Incremental scrape state, see scrape_locations()
+        self.previous = None
+        self.fingerprints = {'homepage': None, 'locations': {}, 'captures': {}}
+        self.scrape_seconds: Dict[str, float] = {}
+        self.reused_locations: List[str] = []
+        # Reused before any extraction work (browser pages whose captured JSON was unchanged)
+        self.clicks_skipped: List[str] = []
+        # Every explicit browser wait: {'label', 'seconds', 'ready'}
+        self.wait_times = []
+        # Every browser page load: {'url', 'get_ms', 'dom_ready_ms', 'load_ms', bytes...}
+        self.page_loads = []
+        self.http = None
         self.subjects=['Wake up fucker!!!!', 'rise and shine bitchboy', 'Good morning big back', "Hola papi <3333", "Ohaiyo onii-chan", "pls text back the kids miss you", "Get out of bed; they're not texting you back", "Another morning spent single! Here's the menus", "You're never getting married. Here's the menus", "om nom nom nom", "hello my sweet darling... wake up", "menus are out!","joonha if you're reading this, please text me back"]
         self.closed_locations = []
-        # Dictionary of all possible locations, including those without menus
-        self.locations: Dict[str, DiningLocation] = {
-            'John Jay Dining Hall': DiningLocation(
-                name='John Jay Dining Hall',
-                url='https://dining.columbia.edu/content/john-jay-dining-hall',
-                menus={
-                    'Breakfast': {},
-                    'Brunch':{},
-                    'Lunch': {},
-                    'Dinner': {},
-                    'Lunch & Dinner': {}
-                }
-            ),
-            "JJ's Place": DiningLocation(
-                name="JJ's Place",
-                url='https://dining.columbia.edu/content/jjs-place-0',
-                menus={
-                    'Daily': {},
-                    'Late Night': {},
-                    'Breakfast': {},
-                    'Lunch & Dinner': {}
-                }
-            ),
-            'Ferris Booth Commons': DiningLocation(
-                name='Ferris Booth Commons',
-                url='https://dining.columbia.edu/content/ferris-booth-commons-0',
-                menus={
-                    'Breakfast': {},
-                    'Lunch': {},
-                    'Dinner': {},
-                    'Lunch & Dinner': {}
-                }
-            ),
-            'Faculty House': DiningLocation(
-                name='Faculty House',
-                url='https://dining.columbia.edu/content/faculty-house-0',
-                menus={
-                    'Lunch': {}
-                }
-            ),
-            'The Fac Shack': DiningLocation(
-                name='The Fac Shack',
-                url='https://dining.columbia.edu/content/fac-shack',
-                menus={
-                    'Dinner': {}
-                }
-            ),
-            'Blue Java Café - Butler Library': DiningLocation(
-                name='Blue Java Café - Butler Library',
-                url='https://dining.columbia.edu/content/blue-java-cafe-butler-library',
-                menus={}
-            ),
-            "Chef Mike's Sub Shop": DiningLocation(
-                name="Chef Mike's Sub Shop",
-                url='https://dining.columbia.edu/content/chef-mikes-sub-shop',
-                menus={}
-            ),
-            "Chef Don's Pizza Pi": DiningLocation(
-                name="Chef Don's Pizza Pi",
-                url='https://dining.columbia.edu/content/chef-dons-pizza-pi',
-                menus={}
-            ),
-            'Grace Dodge Dining Hall': DiningLocation(
-                name='Grace Dodge Dining Hall',
-                url='https://dining.columbia.edu/content/grace-dodge-dining-hall',
-                menus={}
-            ),
-            'Robert F. Smith Dining Hall': DiningLocation(
-                name='Robert F. Smith Dining Hall',
-                url='https://dining.columbia.edu/content/robert-f-smith-dining-hall',
-                menus={}
-            ),
-            'Blue Java Café - Mudd Hall': DiningLocation(
-                name='Blue Java Café - Mudd Hall',
-                url='https://dining.columbia.edu/content/blue-java-cafe-mudd-hall',
-                menus={}
-            ),
-            'Blue Java Café - Uris': DiningLocation(
-                name='Blue Java Café - Uris',
-                url='https://dining.columbia.edu/content/blue-java-cafe-uris',
-                menus={}
-            ),
-            'Blue Java at Everett Library Café': DiningLocation(
-                name='Blue Java at Everett Library Café',
-                url='https://dining.columbia.edu/content/blue-java-everett-library-cafe',
-                menus={}
-            ),
-            'Lenfest Café': DiningLocation(
-                name='Lenfest Café',
-                url='https://dining.columbia.edu/content/lenfest-cafe',
-                menus={}
-            )
-        }
+        # Formatted menus per preference signature, valid for one locations dict
+        self._format_cache: Dict[str, List[Dict]] = {}
+        self._format_cache_locations = None
+        self.menu_index = None
+        self.format_cache_hits = 0
+        self.format_cache_misses = 0
+        # Day being scraped (YYYY-MM-DD); None is whatever the site shows today
+        self.menu_date: Optional[str] = None
+        # Keep browser sessions open after a scrape, e.g. between prefetched days
+        self.keep_drivers = REUSE_DRIVERS
+        self.registry_changed = False
+        self._reset_locations()
 
+    def _reset_locations(self):
+        """Start from every known location, including those without menus; the homepage adds the rest."""
+        self.locations: Dict[str, DiningLocation] = {}
+        self.closed_locations = []
+        for name, (path, tabs) in KNOWN_LOCATIONS.items():
+            self.locations[name] = DiningLocation(name=name, url=urljoin(self.BASE_URL, path),
+                                                  menus={tab: {} for tab in tabs})
+        for name, entry in list(_location_registry.items()):
+            self.track_location(name, entry['url'], entry.get('kind', ''))
 
+    def _dated_url(self, url: str) -> str:
+        """`url` for the day being scraped."""
+        if not self.menu_date:
+            return url
+        separator = '&' if urlsplit(url).query else '?'
+        return f"{url}{separator}{urlencode({MENU_DATE_PARAM: self.menu_date})}"
 
-    def _wait_and_find_element(self, by: By, value: str, timeout: int = TIMEOUT):
-        """Wait for and return an element."""
+    def _wait_until(self, driver, condition, label: str, timeout: float = TIMEOUT):
+        """Wait for a readiness condition, recording how long it took. Returns None on timeout."""
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.support.ui import WebDriverWait
+        start = time.monotonic()
         try:
-            return WebDriverWait(self.driver, timeout).until(
-                EC.presence_of_element_located((by, value))
-            )
+            result = WebDriverWait(driver, timeout, poll_frequency=0.1).until(condition)
         except TimeoutException:
-            print(f"Timeout waiting for element: {value}")
-            return None
+            result = None
+        self.wait_times.append({
+            'label': label,
+            'seconds': round(time.monotonic() - start, 3),
+            'ready': result is not None,
+        })
+        return result
+
+    def apply_snapshot(self, snapshot: 'MenuSnapshot'):
+        """Use a stored scrape result instead of scraping."""
+        self.locations = snapshot.locations
+        self.closed_locations = list(snapshot.closed_locations)
 
-    def _click_view_more(self):
-        """Click the 'View More' button and wait for additional locations to load."""
+    def scrape_locations(self, previous: 'MenuSnapshot' = None):
+        """
+        Scrape all dining locations and their menus. Locations whose page
+        fingerprint matches the one in `previous` reuse its menus instead of
+        being extracted again.
+        """
+        self.previous = previous
+        self.fingerprints = {'homepage': None, 'locations': {}, 'captures': {}}
+        self.scrape_seconds = {}
+        self.reused_locations = []
+        self.clicks_skipped = []
         try:
-            print("Looking for 'View More' button...")
-            
-            # Wait for page to be fully loaded
-            time.sleep(2)
-            
-            # Try to find the button with different selectors
-            selectors = [
-                '.show-all-dinings',
-                'button.show-all-dinings',
-                '.show-all-locations',
-                'button.show-all-locations',
-                'button[onclick*="show-all"]'
-            ]
-            
-            view_more_button = None
-            for selector in selectors:
+            pending = None
+            if SCRAPE_ENGINE == 'http':
                 try:
-                    view_more_button = WebDriverWait(self.driver, 5).until(
-                        EC.element_to_be_clickable((By.CSS_SELECTOR, selector))
-                    )
-                    if view_more_button:
-                        print(f"Found button with selector: {selector}")
-                        break
-                except TimeoutException:
-                    continue
-            
-            if not view_more_button:
-                print("Could not find 'View More' button with any selector")
-                # Take screenshot for debugging
-                self.driver.save_screenshot('/tmp/before_click.png')
-                print("Saved screenshot to /tmp/before_click.png")
-                return False
-            
-            # Scroll the button into view
-            self.driver.execute_script("arguments[0].scrollIntoView(true);", view_more_button)
-            time.sleep(1)  # Wait after scroll
-            
-            #clicking view more button
-            self.driver.execute_script("arguments[0].click();", view_more_button)
-                
-            # Wait for new content to load
-            time.sleep(3)
-            
-            print("Successfully clicked 'View More' button")
-            return True
-            
-        except TimeoutException:
-            print("'View More' button not found or not clickable (timeout)")
-            return False
-        except Exception as e:
-            print(f"Error clicking 'View More' button: {e}")
-            return False
-    def scrape_locations(self):
-        """Scrape all dining locations and their menus."""
+                    pending = self._scrape_locations_http()
+                except Exception as e:
+                    logger.error(f"HTTP scrape failed, falling back to Selenium: {e}")
+                    pending = None
+                if pending == []:
+                    return
+            self._scrape_locations_selenium(pending)
+        finally:
+            self._print_incremental_summary()
+
+    def prefetch(self, store, days: int = PREFETCH_DAYS) -> List['MenuSnapshot']:
+        """
+        Scrape today and the following days in one browser session, storing a
+        snapshot per date so the daily run can send without opening a browser.
+        Stops at the first future day the site has no menus for yet, or whose
+        menus are identical to an earlier day's: that's what a site ignoring
+        MENU_DATE_PARAM looks like, and storing it would send today's menu for days.
+        """
+        today = campus_today()
+        snapshots = []
+        seen: Dict[str, str] = {}
+        self.load_registry(store)
+        self.keep_drivers = True
         try:
-            print("Starting to scrape locations")
-            self.driver.get(self.BASE_URL)
-            
-            # Add initial wait for page load
-            print("Waiting for page to load...")
-            time.sleep(3)  # Initial wait for page load
-            
-            try:
-                WebDriverWait(self.driver, 5).until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, '.dining-location, .retail-location'))
-                )
-                print("Initial content loaded")
-            except TimeoutException:
-                print("Timeout waiting for initial content")
-                raise
-            
-            # Click the "View More" button to show all locations
-            retry_count = 0
-            max_retries = 3
-            while retry_count < max_retries:
-                if self._click_view_more():
-                    print("Successfully expanded locations")
+            for offset in range(days):
+                date = (today + timedelta(days=offset)).isoformat()
+                self.menu_date = date if offset else None
+                self._reset_locations()
+                with tracer.span('prefetch_day', engine=SCRAPE_ENGINE, date=date) as span:
+                    self.scrape_locations(previous=load_snapshot(store, date))
+                    items = sum(
+                        len(items) for location in self.locations.values()
+                        for stations in location.menus.values() for items in stations.values()
+                    )
+                    span['items'] = items
+                if offset and not items:
+                    logger.info(f"No menus published for {date} yet, stopping prefetch")
                     break
-                print(f"Retry {retry_count + 1} of {max_retries} for expanding locations")
-                time.sleep(2)
-                retry_count += 1
-            
-            # Additional wait after expanding
-            time.sleep(3)
-            
-            # Find all dining and retail locations
-            dining_locations = self.driver.find_elements(
-                By.CSS_SELECTOR, 
-                '.dining-location'
-            )
-            retail_locations = self.driver.find_elements(
-                By.CSS_SELECTOR,
-                '.retail-location'
-            )
-            all_locations = dining_locations + retail_locations
-            print(f"Found {len(all_locations)} locations")
+                content_hash = snapshot_content_hash(self)
+                if offset and content_hash in seen:
+                    logger.warning(f"Menus for {date} are the same as {seen[content_hash]}'s; the site may be "
+                                   f"ignoring ?{MENU_DATE_PARAM}=, stopping prefetch")
+                    tracer.count('PrefetchDuplicateDays', 1)
+                    break
+                seen[content_hash] = date
+                snapshots.append(save_snapshot(store, self, date, prefetched=offset > 0))
+            self.save_registry(store)
+        finally:
+            self.menu_date = None
+            self.keep_drivers = REUSE_DRIVERS
+            if self.pool and not REUSE_DRIVERS:
+                self.pool.quit()
+        tracer.count('DaysPrefetched', len(snapshots))
+        return snapshots
 
-            # Reset closed locations list
-            self.closed_locations = []
+    def _reusable_menus(self, location: DiningLocation, fingerprint: str, kind: str = 'locations'):
+        """
+        Record a location's fingerprint and return the previous menus if it hasn't changed.
+        `kind` is 'locations' for the extracted {meal: stations} or 'captures' for the
+        page's captured menu JSON, which the browser path has before clicking any tab.
+        """
+        self.fingerprints[kind][location.name] = fingerprint
+        if not self.previous:
+            return None
+        previous_fingerprints = self.previous.fingerprints
+        if previous_fingerprints.get(kind, {}).get(location.name) != fingerprint:
+            return None
+        previous_location = self.previous.locations.get(location.name)
+        if not previous_location or not any(previous_location.menus.values()):
+            return None
+        logger.info(f"Menu for {location.name} unchanged since last snapshot, reusing it")
+        self.reused_locations.append(location.name)
+        if kind == 'captures':
+            self.clicks_skipped.append(location.name)
+            # Carry the extracted fingerprint forward for a later run on either engine
+            if location.name in previous_fingerprints.get('locations', {}):
+                self.fingerprints['locations'][location.name] = previous_fingerprints['locations'][location.name]
+        return previous_location.menus
 
-            # Process each location
-            for loc in all_locations:
-                try:
-                    # Find the location title using the link element
-                    title_element = loc.find_element(By.CSS_SELECTOR, '.name a')
-                    if not title_element:
-                        continue
-                    
-                    title = title_element.text.strip()
-                    
-                    if not title:  # Skip if title is empty
-                        continue
-                        
-                    print(f"Processing location: {title}")
-                
-                    
-                    # Check if location is in our tracking list
-                    if title in self.locations:
-                        # Check if the location is open by looking for open-time with content
-                        try:
-                            open_time_element = loc.find_element(By.CSS_SELECTOR, '.open-time')
-                            open_times = open_time_element.text.strip() if open_time_element else ""
-                            
-                            # A location is considered open for the day if it has open times
-                            is_open = bool(open_times)
-                            
-                            # Update location status
-                            self.locations[title].open_today = is_open
-                            self.locations[title].open_times = open_times
-                            
-                            if is_open:
-                                print(f"Location {title} is open: {open_times}")
-                            else:
-                                self.closed_locations.append(title)
-                                print(f"Location {title} is closed")
-                            
-                        except NoSuchElementException:
-                            # No open time element found - location is closed
-                            self.locations[title].open_today = False
-                            self.locations[title].open_times = ""
-                            self.closed_locations.append(title)
-                            print(f"Location {title} is closed (no open times found)")
-                    else:
-                        print(f"Warning: Found location '{title}' on website that isn't in our tracking list")
+    def extraction_seconds(self) -> Dict[str, float]:
+        """Full extraction time per location, carried over from the last snapshot for reused ones."""
+        seconds = dict(self.scrape_seconds)
+        for name in self.reused_locations:
+            seconds[name] = self.previous.scrape_seconds.get(name, seconds.get(name, 0))
+        return seconds
 
-                except NoSuchElementException as e:
-                    print(f"Error processing location: {e}")
+    def _print_incremental_summary(self):
+        if not self.previous:
+            return
+        homepage_changed = self.fingerprints['homepage'] != self.previous.fingerprints.get('homepage')
+        scraped = len(self.fingerprints['locations'])
+        # Only browser pages reused before clicking saved real time: an unchanged page
+        # over HTTP has already been fetched and parsed by the time it's fingerprinted.
+        # What those took to extract last time, less what loading and fingerprinting cost now
+        saved = sum(
+            self.previous.scrape_seconds.get(name, 0) - self.scrape_seconds.get(name, 0)
+            for name in self.clicks_skipped
+        )
+        logger.info(f"Homepage {'changed' if homepage_changed else 'unchanged'} since last snapshot")
+        logger.info(f"Reused {len(self.reused_locations)} of {scraped} location menus (unchanged); "
+                    f"{len(self.clicks_skipped)} skipped clicking through their tabs, saving ~{max(saved, 0):.1f}s")
+
+    def track_location(self, name: str, url: str, kind: str = '') -> DiningLocation:
+        """
+        Add or update a location from a homepage entry. Menu tabs come from
+        KNOWN_LOCATIONS, or DEFAULT_MENU_TABS for a dining hall we haven't seen before.
+        """
+        url = urljoin(self.BASE_URL, url) if url else ''
+        location = self.locations.get(name)
+        if location is None:
+            tabs = DEFAULT_MENU_TABS if kind == 'dining' else ()
+            location = self.locations[name] = DiningLocation(name=name, url=url, menus={tab: {} for tab in tabs})
+            logger.info(f"Tracking new {kind or 'unknown'} location '{name}'")
+        elif url:
+            location.url = url
+        location.kind = kind or location.kind
+        known = _location_registry.get(name)
+        if known != {'url': location.url, 'kind': location.kind}:
+            _location_registry[name] = {'url': location.url, 'kind': location.kind}
+            self.registry_changed = True
+        return location
+
+    def load_registry(self, store):
+        """Track the locations discovered by earlier runs."""
+        raw = store.read(REGISTRY_KEY)
+        if raw is None:
+            return
+        for name, entry in json.loads(raw).items():
+            self.track_location(name, entry['url'], entry.get('kind', ''))
+        self.registry_changed = False
+
+    def save_registry(self, store):
+        """Store the discovered locations if this run found anything new."""
+        if self.registry_changed:
+            store.write(REGISTRY_KEY, json.dumps(_location_registry, sort_keys=True, indent=1).encode())
+            self.registry_changed = False
+
+    def _apply_location_entries(self, entries: List[Dict]):
+        """Update open/closed status from homepage entries, tracking any new locations."""
+        # Reset closed locations list
+        self.closed_locations = []
+        self.fingerprints['homepage'] = page_fingerprint(
+            [[entry['name'], entry['url'], entry['open_times']] for entry in entries]
+        )
+
+        for entry in entries:
+            title = entry['name']
+            if not title:  # Skip if title is empty
+                continue
+
+            logger.debug(f"Processing location: {title}")
+
+            location = self.track_location(title, entry.get('url', ''), entry.get('kind', ''))
+            # A location is considered open for the day if it has open times
+            open_times = entry['open_times']
+            is_open = bool(open_times)
+
+            # Update location status
+            location.open_today = is_open
+            location.open_times = open_times
+
+            if is_open:
+                logger.info(f"Location {title} is open: {open_times}")
+            else:
+                self.closed_locations.append(title)
+                logger.info(f"Location {title} is closed")
+
+    def _scrape_locations_http(self) -> Optional[List[DiningLocation]]:
+        """
+        Scrape the homepage and location pages over plain HTTP. Returns the open
+        locations whose menus couldn't be found this way (empty when everything
+        was found), or None when the homepage had no locations or none of them open.
+        """
+        logger.info("Starting to scrape locations over HTTP")
+        self.http = HttpSession(timeout=self.TIMEOUT)
+        try:
+            with tracer.span('homepage_load', engine='http') as span:
+                entries = parse_homepage_locations(parse_html(self.http.get(self._dated_url(self.BASE_URL))))
+                span['locations'] = len(entries)
+            logger.info(f"Found {len(entries)} locations")
+            if not entries:
+                return None
+            self._apply_location_entries(entries)
+            if not any(location.open_today for location in self.locations.values()):
+                # Opening hours may only be filled in client side; an all-closed day
+                # costs one browser session to confirm, not a day without emails
+                logger.warning("No open locations over HTTP, will use Selenium")
+                return None
+
+            pending = []
+            for location in self.locations.values():
+                if not (location.open_today and location.menus):
                     continue
+                logger.debug(f"Fetching menu for {location.name}")
+                start = time.monotonic()
+                try:
+                    with tracer.span('location_scrape', engine='http', location=location.name):
+                        meals = parse_location_page(parse_html(self.http.get(self._dated_url(location.url))), location.menus)
                 except Exception as e:
-                    print(f"Unexpected error processing location: {e}")
-                    continue
+                    logger.error(f"Error fetching menu for {location.name}: {e}")
+                    meals = {}
+                if any(station['items'] for stations in meals.values() for station in stations):
+                    previous_menus = self._reusable_menus(location, page_fingerprint(meals))
+                    if previous_menus is not None:
+                        location.menus = previous_menus
+                    else:
+                        self._apply_raw_meals(location.menus, meals)
+                    self.scrape_seconds[location.name] = round(time.monotonic() - start, 3)
+                else:
+                    logger.warning(f"No menu data for {location.name} over HTTP, will use Selenium")
+                    pending.append(location)
+            return pending
+        finally:
+            self.http.close()
 
-            # Scrape menus for open locations that have menu configurations
-            for location in self.locations.values():
-                if location.open_today and location.menus:
-                    self._scrape_location_menu(location)
-            print("Current URL:", self.driver.current_url)
-            print("Page source:", self.driver.page_source[:1000])  # First 1000 chars
+    def _scrape_locations_selenium(self, only: Optional[List[DiningLocation]] = None):
+        """Scrape with the browser. When `only` is given, just scrape those locations' menus."""
+        self.pool = get_driver_pool()
+        try:
+            if only is None:
+                with self.pool.session() as driver:
+                    self._scrape_homepage(driver)
+                only = [
+                    location for location in self.locations.values()
+                    if location.open_today and location.menus
+                ]
+            self._scrape_menus_concurrently(only)
+        finally:
+            if not self.keep_drivers:
+                self.pool.quit()
+            self._print_wait_summary()
+            self._print_page_load_summary()
+
+    def _open_page(self, driver, url: str):
+        """driver.get() that starts a page_loads record, finished by _record_page_load()."""
+        # Drop earlier pages' entries so captures only come from this one
+        try:
+            driver.get_log('performance')
+        except Exception as e:
+            logger.debug(f"No performance log to clear: {e}")
+        url = self._dated_url(url)
+        start = time.monotonic()
+        driver.get(url)
+        driver.scrape_page_load = {'url': url, 'get_ms': round((time.monotonic() - start) * 1000)}
+
+    def _record_page_load(self, driver):
+        """Add the current page's load time and transfer sizes to page_loads."""
+        record = getattr(driver, 'scrape_page_load', None)
+        if record is None:
+            return
+        driver.scrape_page_load = None
+        try:
+            record.update(driver.execute_script(PAGE_LOAD_STATS_JS) or {})
+        except Exception as e:
+            logger.debug(f"Couldn't read page load stats for {record['url']}: {e}")
+        self.page_loads.append(record)
+        tracer.count('BrowserBytes', record.get('document_bytes', 0) + record.get('resource_bytes', 0))
+
+    def _print_page_load_summary(self):
+        if not self.page_loads:
+            return
+        transferred = sum(load.get('document_bytes', 0) + load.get('resource_bytes', 0) for load in self.page_loads)
+        get_ms = sum(load['get_ms'] for load in self.page_loads)
+        logger.info(f"Loaded {len(self.page_loads)} pages in {get_ms / 1000:.2f}s, "
+                    f"{transferred / 1024:.0f} KiB transferred ({BROWSER_PROFILE} profile)")
+        for load in self.page_loads:
+            logger.debug("Page load", extra={'fields': load})
+
+    def _print_wait_summary(self):
+        total = sum(wait['seconds'] for wait in self.wait_times)
+        timed_out = [wait['label'] for wait in self.wait_times if not wait['ready']]
+        logger.info(f"Waited {total:.2f}s across {len(self.wait_times)} browser waits")
+        for wait in sorted(self.wait_times, key=lambda w: w['seconds'], reverse=True)[:5]:
+            logger.debug(f"  {wait['label']}: {wait['seconds']:.2f}s{'' if wait['ready'] else ' (timed out)'}")
+        if timed_out:
+            logger.warning(f"Timed out waiting for: {', '.join(timed_out)}")
+
+    def _scrape_homepage(self, driver):
+        """Load the homepage and update every location's open status."""
+        from selenium.common.exceptions import TimeoutException
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        try:
+            logger.info("Starting to scrape locations")
+            with tracer.span('homepage_load', engine='selenium'):
+                self._open_page(driver, self.BASE_URL)
+                
+                if not self._wait_until(
+                    driver,
+                    EC.presence_of_element_located((By.CSS_SELECTOR, '.dining-location, .retail-location')),
+                    'homepage locations',
+                ):
+                    logger.warning("Timeout waiting for initial content")
+                    raise TimeoutException("No locations on the homepage")
+            logger.debug("Initial content loaded")
+
+            # Collapsed entries are in the DOM too, so no need to click "View More"
+            entries = self._extract_locations(driver)
+            logger.info(f"Found {len(entries)} locations")
+            self._apply_location_entries(entries)
+            self._record_page_load(driver)
+            self._log_page_diagnostics(driver)
         except Exception as e:
-            print(f"Error during scraping: {e}")
+            logger.error(f"Error during scraping: {e}")
             # Add more detailed error information
-            print("Current URL:", self.driver.current_url)
-            print("Page source:", self.driver.page_source[:1000])  # First 1000 chars
+            self._log_page_diagnostics(driver, logging.ERROR)
             raise
+
+    def _log_page_diagnostics(self, driver, level: int = logging.DEBUG):
+        """Log the current URL and the start of the page source; skipped entirely below `level`."""
+        # page_source serialises the whole DOM over WebDriver, so only fetch it when it will be logged
+        if not logger.isEnabledFor(level):
+            return
+        try:
+            logger.log(level, "Page diagnostics", extra={'fields': {
+                'url': driver.current_url,
+                'page_source': driver.page_source[:1000],  # First 1000 chars
+            }})
+        except Exception as e:
+            logger.error(f"Could not read page diagnostics: {e}")
+
+    def _scrape_menus_concurrently(self, locations: List[DiningLocation]):
+        """Scrape location menus on up to pool-size drivers at once and merge them in."""
+        if not locations:
+            return
+        workers = min(self.pool.size, len(locations))
+        logger.info(f"Scraping {len(locations)} menus with {workers} driver(s)")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(self._scrape_location_menu_pooled, location): location
+                for location in locations
+            }
+            for future in as_completed(futures):
+                location = futures[future]
+                try:
+                    location.menus = future.result()
+                except Exception as e:
+                    logger.error(f"Error scraping menu for {location.name}: {e}")
+
+    def _scrape_location_menu_pooled(self, location: DiningLocation):
+        with self.pool.session() as driver:
+            return self._scrape_location_menu(location, driver)
+
+    def _scrape_location_menu(self, location: DiningLocation, driver) -> Dict[str, Dict[str, Dict[str, MenuItem]]]:
+        """Scrape menu for a specific location and return the filled-in menus."""
+        logger.info(f"Scraping menu for {location.name}")
+        start = time.monotonic()
+        try:
+            with tracer.span('location_scrape', engine='selenium', location=location.name):
+                return self._scrape_location_page(location, driver)
         finally:
-            if self.driver:
-                self.driver.quit()
+            self.scrape_seconds[location.name] = round(time.monotonic() - start, 3)
+            self._record_page_load(driver)
 
-    def _scrape_location_menu(self, location: DiningLocation):
-        """Scrape menu for a specific location."""
-        print(f"Scraping menu for {location.name}")
-        self.driver.get(location.url)
+    def _scrape_location_page(self, location: DiningLocation, driver) -> Dict[str, Dict[str, Dict[str, MenuItem]]]:
+        from selenium.webdriver.common.by import By
+        from selenium.webdriver.support import expected_conditions as EC
+        menus = {meal_type: {} for meal_type in location.menus}
+        self._open_page(driver, location.url)
 
         try:
-            menu_tabs = self._wait_and_find_element(By.CSS_SELECTOR, '.cu-dining-menu-tabs')
-            if not menu_tabs:
-                return
+            # Ready once the tab bar has rendered its buttons; tabs that aren't there are skipped
+            # instead of waiting out a timeout for each one
+            available_tabs = self._wait_until(
+                driver,
+                lambda d: d.execute_script(MEAL_TAB_NAMES_JS) or False,
+                f"{location.name} menu tabs",
+            )
+            if not available_tabs:
+                logger.info(f"No menu tabs found for {location.name}")
+                return menus
 
-            for meal_type in location.menus.keys():
-                try:
-                    button = WebDriverWait(self.driver, 5).until(
+            # The app fetches its meals as JSON on load. When that covers every tab it's the
+            # fingerprint that can tell the menus haven't changed without clicking through
+            # them all; with CAPTURE_NETWORK it's also read instead of clicking.
+            captured = self._capture_menus(location, driver)
+            # A page that loads some meals only when their tab is opened can't vouch for those
+            complete = all(meal_type in captured for meal_type in menus if meal_type in available_tabs)
+            if captured and complete:
+                previous_menus = self._reusable_menus(location, page_fingerprint(captured), 'captures')
+                if previous_menus is not None:
+                    return previous_menus
+                if CAPTURE_NETWORK:
+                    self._apply_raw_meals(menus, captured)
+                    self.fingerprints['locations'][location.name] = page_fingerprint(captured)
+                    return menus
+
+            extracted = {}
+
+            for meal_type in menus.keys():
+                if meal_type not in available_tabs:
+                    logger.info(f"No {meal_type} menu found for {location.name}")
+                    continue
+                with tracer.span('meal_scrape', location=location.name, meal=meal_type):
+                    button = self._wait_until(
+                        driver,
                         EC.element_to_be_clickable(
                             (By.XPATH, f"//button[text()='{meal_type}' and contains(@class, 'ng-binding')]")
-                        )
+                        ),
+                        f"{location.name} {meal_type} tab",
+                        timeout=5,
                     )
-                    self.driver.execute_script("arguments[0].scrollIntoView(true);", button)
-                    self.driver.execute_script("arguments[0].click();", button)
-                    time.sleep(1)
-
-                    stations = self.driver.find_elements(By.XPATH, ".//div[div[contains(@class, 'meal-items')]]")
-                    for station in stations:
-                        station_name = station.find_element(By.CSS_SELECTOR, '.station-title').text
-                        if station_name not in location.menus[meal_type]:
-                            location.menus[meal_type][station_name] = {}
-
-                        meal_items = station.find_elements(By.CSS_SELECTOR, '.meal-item')
-                        for meal_item in meal_items:
-                            menu_item = self._parse_menu_item(meal_item)
-                            location.menus[meal_type][station_name][menu_item.title] = menu_item
-
-                except TimeoutException:
-                    print(f"No {meal_type} menu found for {location.name}")
-                    continue
+                    if not button:
+                        logger.info(f"No {meal_type} menu found for {location.name}")
+                        continue
 
+                    # Tag the rendered list, click, and wait for Angular to swap it out
+                    was_active = driver.execute_script(CLICK_MEAL_TAB_JS, button)
+                    if not was_active:
+                        self._wait_until(
+                            driver,
+                            lambda d: d.execute_script(MEAL_TAB_SWAPPED_JS),
+                            f"{location.name} {meal_type} items",
+                            timeout=5,
+                        )
+
+                    extracted[meal_type] = self._extract_stations(driver)
+                    self._apply_raw_meals(menus, {meal_type: extracted[meal_type]})
+
+            # Same {meal: stations} shape as the HTTP and capture paths, so a later
+            # run on either engine can reuse these menus
+            self.fingerprints['locations'][location.name] = page_fingerprint(extracted)
         except Exception as e:
-            print(f"Error scraping menu for {location.name}: {e}")
+            logger.error(f"Error scraping menu for {location.name}: {e}")
+        return menus
+
+    def _capture_menus(self, location: DiningLocation, driver) -> Dict[str, List[Dict]]:
+        """Decode the location's meals from the JSON its page fetched; {} if none was found."""
+        with tracer.span('network_capture', location=location.name) as span:
+            try:
+                captures = captured_json_responses(driver)
+            except Exception as e:
+                logger.warning(f"Couldn't read network responses for {location.name}: {e}")
+                return {}
+            if CAPTURE_DIR and captures:
+                logger.debug(f"Saved captured responses to {save_captures(CAPTURE_DIR, location, captures)}")
+            meals = decode_captured_menus(captures, location.menus)
+            if not any(station['items'] for stations in meals.values() for station in stations):
+                meals = {}
+            span.update(responses=len(captures), meals=len(meals))
+        if meals:
+            logger.info(f"Decoded {len(meals)} meals for {location.name} from {len(captures)} captured responses")
+        else:
+            logger.info(f"No menu JSON captured for {location.name}, clicking through the tabs")
+        return meals
+
+    def _extract_locations(self, driver) -> List[Dict]:
+        """Read every homepage location entry in a single round trip."""
+        if EXTRACT_MODE == 'source':
+            return parse_homepage_locations(parse_html(driver.page_source))
+        return driver.execute_script(EXTRACT_LOCATIONS_JS) or []
 
-    def _parse_menu_item(self, meal_item) -> MenuItem:
-        """Parse a menu item element and return MenuItem object."""
-        title = meal_item.find_element(By.CSS_SELECTOR, '.meal-title').text
+    def _extract_stations(self, driver) -> List[Dict]:
+        """Read the stations and items of the current meal tab in a single round trip."""
+        if EXTRACT_MODE == 'source':
+            return parse_rendered_stations(parse_html(driver.page_source))
+        return driver.execute_script(EXTRACT_STATIONS_JS) or []
 
+    def _apply_raw_meals(self, menus: Dict[str, Dict[str, Dict[str, MenuItem]]], meals: Dict[str, List[Dict]]):
+        """Fill menus from plain {meal: [{'station', 'items'}]} data."""
+        for meal_type, stations in meals.items():
+            for station in stations:
+                station_menu = menus[meal_type].setdefault(sys.intern(station['station']), {})
+                for raw_item in station['items']:
+                    menu_item = self._parse_menu_item(raw_item)
+                    station_menu[menu_item.title] = menu_item
+
+    def _parse_menu_item(self, raw_item: Dict) -> MenuItem:
+        """Parse a raw {'title', 'prefs', 'allergens'} item and return MenuItem object."""
         # Parse dietary information
-        dietary_info = {'is_vegetarian': False, 'is_vegan': False, 'is_halal': False}
-        try:
-            dietary_text = meal_item.find_element(By.CSS_SELECTOR, 'div.meal-prefs strong').text
-            dietary_info = {
-                'is_vegetarian': "Vegetarian" in dietary_text or "Vegan" in dietary_text,
-                'is_vegan': "Vegan" in dietary_text,
-                'is_halal': "Halal" in dietary_text
-            }
-        except NoSuchElementException:
-            pass
+        dietary_text = raw_item['prefs']
+        dietary_info = {
+            'is_vegetarian': "Vegetarian" in dietary_text or "Vegan" in dietary_text,
+            'is_vegan': "Vegan" in dietary_text,
+            'is_halal': "Halal" in dietary_text
+        }
 
         # Parse allergens
-        allergens = []
-        try:
-            allergens_text = meal_item.find_element(By.TAG_NAME, 'em').text
-            if "Contains: " in allergens_text:
-                allergens = allergens_text.split("Contains: ")[1].split(", ")
-        except NoSuchElementException:
-            pass
+        allergens = ()
+        if "Contains: " in raw_item['allergens']:
+            allergens = tuple(
+                sys.intern(allergen)
+                for allergen in raw_item['allergens'].split("Contains: ")[1].split(", ")
+            )
 
         return MenuItem(
-            title=title,
+            title=raw_item['title'],
             allergens=allergens,
             **dietary_info
         )
 
     def format_menu_for_user(self, user: Dict, locations: Dict[str, DiningLocation]) -> List[Dict]:
-        """Format menu data according to user preferences."""
-        formatted_locations = []
-        
-        for location_name, location in locations.items():
-            if not location.open_today:
+        """
+        Format menu data according to user preferences. Users with the same
+        preference signature get the same (shared, don't mutate it) result.
+        """
+        if locations is not self._format_cache_locations:
+            self._format_cache = {}
+            self._format_cache_locations = locations
+            self.menu_index = MenuIndex(locations)
+
+        signature = preference_signature(user)
+        formatted = self._format_cache.get(signature)
+        if formatted is not None:
+            self.format_cache_hits += 1
+            return formatted
+        self.format_cache_misses += 1
+        with tracer.span('format_menu') as span:
+            formatted = self.menu_index.format(parse_preference_signature(signature))
+            span['locations'] = len(formatted)
+        self._format_cache[signature] = formatted
+        return formatted
+
+    def build_template_data(self, formatted_menu: List[Dict]) -> Dict:
+        return {
+            "date": campus_today().strftime("%A, %B %d, %Y"),
+            "subject": random.choice(self.subjects),  # Pick a random subject
+            "locations": formatted_menu,
+            "closed_locations": self.closed_locations
+        }
+
+    def send_bulk_email(self, user_emails: List[str], formatted_menu: List[Dict]) -> List[Dict]:
+        """Send the same formatted menu to up to 50 users in one SES call; returns per-recipient status."""
+        template_data = self.build_template_data(formatted_menu)
+        logger.debug(f"Template data for {len(user_emails)} recipients", extra={'fields': {'template_data': template_data}})
+
+        response = get_ses().send_bulk_templated_email(
+            Source=SENDER,
+            Template=TEMPLATE_NAME,
+            DefaultTemplateData=json.dumps(template_data),
+            Destinations=[
+                {'Destination': {'ToAddresses': [email]}, 'ReplacementTemplateData': '{}'}
+                for email in user_emails
+            ]
+        )
+        return response['Status']
+
+
+class LocalRenderer:
+    """
+    Renders the menu email in-process from email_template.py instead of having SES
+    do it, and sends it with send_raw_email. The template is compiled once and each
+    distinct menu is rendered once per run; its MIME parts are cached by content hash
+    so every further recipient only costs a To: header.
+    """
+
+    def __init__(self, scraper: 'ColumbiaDiningScraper'):
+        from email_template import HTML_PART, SUBJECT_PART, TEXT_PART, compile_template
+        self.scraper = scraper
+        self.subject = compile_template(SUBJECT_PART)
+        self.text = compile_template(TEXT_PART)
+        self.html = compile_template(HTML_PART)
+        self._messages: Dict[str, bytes] = {}
+        self._keys_by_id: Dict[int, tuple] = {}
+        self._lock = threading.Lock()
+        self.renders = 0
+        self.render_seconds = 0.0
+        self.cache_hits = 0
+
+    def message(self, formatted_menu: List[Dict]) -> bytes:
+        """The rendered message (all headers but To) for a formatted menu."""
+        cached = self._keys_by_id.get(id(formatted_menu))
+        if cached is None:
+            encoded = json.dumps(formatted_menu, sort_keys=True, separators=(',', ':')).encode()
+            cached = (hashlib.sha256(encoded).hexdigest(), formatted_menu)
+            self._keys_by_id[id(formatted_menu)] = cached
+        key = cached[0]
+        message = self._messages.get(key)
+        if message is not None:
+            self.cache_hits += 1
+            return message
+
+        start = time.perf_counter()
+        with tracer.span('render_email'):
+            message = self.render(self.scraper.build_template_data(formatted_menu))
+        with self._lock:
+            self.renders += 1
+            self.render_seconds += time.perf_counter() - start
+            return self._messages.setdefault(key, message)
+
+    def render(self, template_data: Dict) -> bytes:
+        """Render template data into a multipart/alternative message without a To: header."""
+        from email.message import EmailMessage
+        from email.policy import SMTP
+        msg = EmailMessage(policy=SMTP)
+        msg['Subject'] = self.subject(template_data)
+        msg['From'] = SENDER
+        msg.set_content(self.text(template_data))
+        msg.add_alternative(self.html(template_data), subtype='html')
+        return msg.as_bytes()
+
+    def send_batch(self, user_emails: List[str], formatted_menu: List[Dict]) -> List[Dict]:
+        """send_bulk_email() equivalent: one raw message per recipient, SES-style status per recipient."""
+        message = self.message(formatted_menu)
+        statuses = []
+        for email in user_emails:
+            try:
+                response = get_ses().send_raw_email(
+                    Source=SENDER,
+                    Destinations=[email],
+                    RawMessage={'Data': f"To: {email}\r\n".encode() + message},
+                )
+                statuses.append({'Status': 'Success', 'MessageId': response['MessageId']})
+            except Exception as e:
+                code = SendController.error_code(e)
+                # Per-recipient status so the controller only retries who actually failed
+                status = 'AccountThrottled' if code in SendController.RETRYABLE_ERRORS else 'Failed'
+                statuses.append({'Status': status, 'Error': f"{code}: {e}"})
+        return statuses
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire() reserves tokens and sleeps off any deficit outside the lock."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1) -> float:
+        """Take `tokens` (going into debt if needed) and return how long the caller waited."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self._last) * self.rate)
+            self._last = now
+            self.tokens -= tokens
+            wait = max(0.0, -self.tokens / self.rate)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class SendController:
+    """
+    Wraps a send_batch(emails, formatted_menu) call with SES pacing and retries.
+    Recipients are paced by a token bucket at SEND_RATE_HEADROOM of the account's
+    MaxSendRate; throttling backs off with full jitter and lowers the rate, and
+    transient per-recipient statuses are retried. A whole-call rejection caused by
+    a bad address is bisected so only that recipient fails. send() never raises.
+    """
+    # Whole-call errors worth retrying as is
+    RETRYABLE_ERRORS = {'Throttling', 'ThrottlingException', 'TooManyRequestsException',
+                        'ServiceUnavailable', 'InternalFailure', 'RequestTimeout'}
+    # Whole-call errors one bad recipient can cause; the batch is split to find it
+    RECIPIENT_ERRORS = {'MessageRejected', 'InvalidParameterValue', 'ValidationError'}
+    # Per-destination bulk statuses worth retrying
+    RETRYABLE_STATUSES = {'AccountThrottled', 'TransientFailure'}
+
+    def __init__(self, send_batch, max_rate: float = None, max_attempts: int = SEND_MAX_ATTEMPTS,
+                 base_delay: float = 0.5, max_delay: float = 20.0):
+        self.send_batch = send_batch
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_rate = max_rate
+        self._bucket = None
+        self._lock = threading.Lock()
+        self.sent = 0
+        self.retries = 0
+        self.throttled = 0
+        self.failures: Dict[str, str] = {}
+        self.waited = 0.0
+        self._started = None
+        self._last_send = None
+
+    @property
+    def bucket(self) -> TokenBucket:
+        with self._lock:
+            if self._bucket is None:
+                if self.max_rate is None:
+                    try:
+                        self.max_rate = float(get_ses().get_send_quota()['MaxSendRate'])
+                    except Exception as e:
+                        # The SES sandbox allows one message per second
+                        logger.warning(f"Couldn't read SES send quota, assuming 1/s: {e}")
+                        self.max_rate = 1.0
+                rate = max(self.max_rate * SEND_RATE_HEADROOM, 0.1)
+                self._bucket = TokenBucket(rate)
+                self._started = time.monotonic()
+                logger.info(f"Pacing sends at {rate:.1f} recipients/s (account max {self.max_rate:g}/s)")
+            return self._bucket
+
+    @staticmethod
+    def error_code(error: Exception) -> str:
+        code = getattr(error, 'response', {}).get('Error', {}).get('Code') or type(error).__name__
+        if 'Maximum sending rate exceeded' in str(error):
+            return 'Throttling'
+        return code
+
+    def send(self, emails: List[str], formatted_menu: List[Dict]) -> List[Dict]:
+        """Send one batch; returns an SES-style status dict per recipient, in order."""
+        statuses = self._send(emails, formatted_menu)
+        self._record(emails, statuses)
+        return statuses
+
+    def _send(self, emails: List[str], formatted_menu: List[Dict]) -> List[Dict]:
+        statuses: Dict[str, Dict] = {}
+        pending = list(emails)
+        attempt = 1
+        while pending:
+            self._wait(self.bucket.acquire(len(pending)))
+            try:
+                results = self.send_batch(pending, formatted_menu)
+            except Exception as e:
+                code = self.error_code(e)
+                if code in self.RETRYABLE_ERRORS and attempt < self.max_attempts:
+                    self._backoff(attempt, code)
+                    attempt += 1
+                    continue
+                if code in self.RECIPIENT_ERRORS and len(pending) > 1:
+                    half = len(pending) // 2
+                    for part in (pending[:half], pending[half:]):
+                        statuses.update(zip(part, self._send(part, formatted_menu)))
+                    break
+                for email in pending:
+                    statuses[email] = {'Status': 'Failed', 'Error': f"{code}: {e}"}
+                break
+
+            self._recover()
+            retry = []
+            for email, status in zip(pending, results):
+                statuses[email] = status
+                if status['Status'] in self.RETRYABLE_STATUSES:
+                    retry.append(email)
+            if not retry or attempt >= self.max_attempts:
+                break
+            self._backoff(attempt, 'AccountThrottled')
+            attempt += 1
+            pending = retry
+
+        return [statuses[email] for email in emails]
+
+    def _backoff(self, attempt: int, code: str):
+        bucket = self.bucket
+        with self._lock:
+            self.retries += 1
+            if code in ('Throttling', 'ThrottlingException', 'AccountThrottled'):
+                self.throttled += 1
+                # Back the pace off too, so the other senders don't hit the same wall
+                bucket.rate = max(bucket.rate * 0.8, self.max_rate * 0.1, 0.1)
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        logger.debug(f"{code}, retrying in {delay:.2f}s (attempt {attempt})")
+        tracer.count('SendRetries', 1)
+        self._wait(delay)
+        time.sleep(delay)
+
+    def _recover(self):
+        # Creep back up towards the configured pace after a successful call
+        bucket = self.bucket
+        ceiling = max(self.max_rate * SEND_RATE_HEADROOM, 0.1)
+        if bucket.rate < ceiling:
+            with self._lock:
+                bucket.rate = min(ceiling, bucket.rate * 1.05)
+
+    def _wait(self, seconds: float):
+        if seconds:
+            with self._lock:
+                self.waited += seconds
+
+    def _record(self, emails: List[str], statuses: List[Dict]):
+        now = time.monotonic()
+        with self._lock:
+            self._last_send = now
+            for email, status in zip(emails, statuses):
+                if status['Status'] == 'Success':
+                    self.sent += 1
+                else:
+                    self.failures[email] = f"{status['Status']}: {status.get('Error', '')}"
+
+    def report(self) -> Dict:
+        elapsed = (self._last_send - self._started) if self._last_send else 0.0
+        return {
+            'max_rate': self.max_rate,
+            'final_rate': round(self._bucket.rate, 2) if self._bucket else None,
+            'achieved_rate': round(self.sent / elapsed, 2) if elapsed > 0 else None,
+            'sent': self.sent,
+            'failed': len(self.failures),
+            'retries': self.retries,
+            'throttled': self.throttled,
+            'waited_seconds': round(self.waited, 2),
+        }
+
+
+class RecipientBatcher:
+    """
+    Groups recipients whose formatted menus are identical into batches of up to
+    batch_size for send_bulk_email. Partial groups are flushed early (largest
+    first) once more than max_buffered recipients are waiting, so memory stays
+    bounded however many distinct menus there are.
+    """
+
+    def __init__(self, batch_size: int = BULK_BATCH_SIZE, max_buffered: int = 5000):
+        self.batch_size = batch_size
+        self.max_buffered = max_buffered
+        self.groups: Dict[str, List[str]] = {}
+        self.menus: Dict[str, List[Dict]] = {}
+        self.buffered = 0
+        # Formatted menus are shared per preference signature, so only serialise each object once
+        # (the menu object is kept alongside its key so its id can't be reused)
+        self._keys_by_id: Dict[int, tuple] = {}
+
+    def add(self, user_email: str, formatted_menu: List[Dict]) -> List[tuple]:
+        """Add a recipient; returns any (emails, formatted_menu) batches that are ready to send."""
+        cached = self._keys_by_id.get(id(formatted_menu))
+        if cached is None:
+            cached = (json.dumps(formatted_menu, sort_keys=True), formatted_menu)
+            self._keys_by_id[id(formatted_menu)] = cached
+        key = cached[0]
+        self.menus.setdefault(key, formatted_menu)
+        group = self.groups.setdefault(key, [])
+        group.append(user_email)
+        self.buffered += 1
+
+        ready = []
+        if len(group) >= self.batch_size:
+            ready.append(self._take(key))
+        while self.buffered > self.max_buffered:
+            ready.append(self._take(max(self.groups, key=lambda k: len(self.groups[k]))))
+        return ready
+
+    def _take(self, key: str) -> tuple:
+        emails = self.groups.pop(key)
+        self.buffered -= len(emails)
+        return emails, self.menus[key]
+
+    def flush(self) -> List[tuple]:
+        return [self._take(key) for key in list(self.groups)]
+
+
+@dataclass
+class PipelineConfig:
+    # Users waiting to be formatted and batches waiting to be sent; producers block when full
+    queue_size: int = PIPELINE_QUEUE_SIZE
+    # Concurrent send_bulk_email calls
+    send_workers: int = SEND_THREADS
+    batch_size: int = BULK_BATCH_SIZE
+    # Recipients held in partial batches before the largest one is sent early
+    max_buffered: int = 5000
+    # After stop(): True sends everything already read, False skips whatever is still queued
+    drain: bool = True
+
+
+class DeliveryPipeline:
+    """
+    Streams users through scan -> format -> send stages joined by bounded
+    asyncio queues. Table pages are read on a background thread, formatting
+    runs on the event loop (it's cached and CPU bound, so one stage) and
+    batches are sent on a thread pool, so reads, formatting and SES latency
+    overlap while memory stays flat however many users there are.
+    """
+    _DONE = object()
+
+    def __init__(self, scraper: 'ColumbiaDiningScraper', config: PipelineConfig = None, send_batch=None,
+                 checkpoint: 'DeliveryCheckpoint' = None):
+        self.scraper = scraper
+        # Skips recipients an earlier attempt already reached and records new deliveries
+        self.checkpoint = checkpoint
+        self.config = config or PipelineConfig()
+        # send_batch(emails, formatted_menu) -> SES status list; swappable for fake backends.
+        # The controller paces and retries it, so a throttled batch doesn't fail the run
+        self.controller = SendController(send_batch or scraper.send_bulk_email)
+        self.batcher = RecipientBatcher(self.config.batch_size, self.config.max_buffered)
+        # email -> 'Success', 'Skipped' or the SES error/status for that recipient
+        self.results: Dict[str, str] = {}
+        self.batch_stats: List[Dict] = []
+        self.user_count = 0
+        self._loop = None
+        # A threading.Event so a stop() that comes before run() (e.g. a Lambda
+        # timer that's already due) isn't lost; the stages only poll it
+        self._stop = threading.Event()
+        self._started = None
+
+    def stop(self):
+        """Stop reading users (safe to call from any thread, before or during run()); see PipelineConfig.drain."""
+        self._stop.set()
+
+    def run(self, pages) -> Dict[str, str]:
+        """Run the pipeline over an iterable of user pages and return per-recipient status."""
+        try:
+            asyncio.run(self._run(pages))
+        finally:
+            if self.checkpoint:
+                self.checkpoint.close()
+        self._print_summary()
+        return self.results
+
+    async def _run(self, pages):
+        self._loop = asyncio.get_running_loop()
+        self._started = time.monotonic()
+        users = asyncio.Queue(maxsize=self.config.queue_size)
+        batches = asyncio.Queue(maxsize=max(1, self.config.queue_size // self.config.batch_size))
+
+        with ThreadPoolExecutor(max_workers=1) as reader, \
+                ThreadPoolExecutor(max_workers=self.config.send_workers) as senders:
+            tasks = [asyncio.create_task(self._send_stage(batches, senders)) for _ in range(self.config.send_workers)]
+            producer = asyncio.create_task(self._scan_stage(pages, users, reader))
+            formatter = asyncio.create_task(self._format_stage(users, batches))
+            try:
+                await asyncio.gather(producer, formatter)
+            except BaseException:
+                # A failed stage leaves the other one blocked on a queue nobody serves
+                producer.cancel()
+                formatter.cancel()
+                await asyncio.gather(producer, formatter, return_exceptions=True)
+                raise
+            finally:
+                # Either way, send the batches already formatted so they get checkpointed
+                for _ in tasks:
+                    await batches.put(self._DONE)
+                await asyncio.gather(*tasks)
+
+    async def _scan_stage(self, pages, users: asyncio.Queue, reader):
+        iterator = iter(pages)
+        try:
+            while not self._stop.is_set():
+                page = await self._loop.run_in_executor(reader, next, iterator, None)
+                if page is None:
+                    break
+                for user in page:
+                    await users.put(user)
+            # Only on a clean finish: a cancelled put here would block on a full queue forever
+            await users.put(self._DONE)
+        finally:
+            if hasattr(iterator, 'close'):
+                await self._loop.run_in_executor(reader, iterator.close)
+
+    async def _format_stage(self, users: asyncio.Queue, batches: asyncio.Queue):
+        while True:
+            user = await users.get()
+            if user is self._DONE:
+                break
+            self.user_count += 1
+            try:
+                email = user['email']
+                if self.checkpoint and self.checkpoint.should_skip(email):
+                    continue
+                formatted_menu = self.scraper.format_menu_for_user(user, self.scraper.locations)
+            except Exception as e:
+                # One bad user item shouldn't stop everyone else's email
+                logger.error(f"Error formatting menu for {user.get('email')}: {e}")
+                self.results[str(user.get('email') or f'<user {self.user_count} without email>')] = f"Error: {e}"
+                continue
+            if formatted_menu:  # Only send email if there are matching menu items
+                for batch in self.batcher.add(email, formatted_menu):
+                    await batches.put(batch)
+            if self.user_count % 100 == 0:
+                # Formatting is usually a cache hit; yield so the other stages keep moving
+                await asyncio.sleep(0)
+        for batch in self.batcher.flush():
+            await batches.put(batch)
+
+    async def _send_stage(self, batches: asyncio.Queue, senders):
+        while True:
+            batch = await batches.get()
+            if batch is self._DONE:
+                return
+            emails, formatted_menu = batch
+            if self._stop.is_set() and not self.config.drain:
+                self.results.update({email: 'Skipped' for email in emails})
                 continue
+            results, elapsed = await self._loop.run_in_executor(senders, self._send, emails, formatted_menu)
+            self.results.update(results)
+            if self.checkpoint:
+                self.checkpoint.record([email for email, status in results.items() if status == 'Success'])
+            self.batch_stats.append({'recipients': len(emails), 'seconds': round(elapsed, 3)})
 
-            location_data = {
-                "name": location_name,
-                "open_times": location.open_times,
-                "meals": []
+    def _send(self, emails: List[str], formatted_menu: List[Dict]):
+        start = time.monotonic()
+        try:
+            with tracer.span('send_batch', recipients=len(emails)):
+                statuses = self.controller.send(emails, formatted_menu)
+            results = {
+                email: status['Status'] if status['Status'] == 'Success' else f"{status['Status']}: {status.get('Error', '')}"
+                for email, status in zip(emails, statuses)
             }
+        except Exception as e:
+            logger.error(f"Error sending batch of {len(emails)} emails: {e}")
+            results = {email: f"Error: {e}" for email in emails}
+        sent = sum(1 for status in results.values() if status == 'Success')
+        tracer.count('EmailsSent', sent)
+        tracer.count('EmailsFailed', len(results) - sent)
+        return results, time.monotonic() - start
 
-            for meal_type, stations in location.menus.items():
-                if not stations:
-                    continue
+    def _print_summary(self):
+        logger.info(f"Found {self.user_count} users")
+        if not self.batch_stats:
+            logger.info("No emails to send")
+            return
+        total = max(time.monotonic() - self._started, 1e-6)
+        sent = sum(1 for status in self.results.values() if status == 'Success')
+        latencies = sorted(batch['seconds'] for batch in self.batch_stats)
+        logger.info(f"Sent {sent}/{len(self.results)} emails in {len(self.batch_stats)} batches "
+                    f"over {total:.2f}s ({len(self.results) / total:.1f} recipients/s)")
+        logger.info(f"Batch latency: avg {sum(latencies) / len(latencies):.3f}s, "
+                    f"p50 {latencies[len(latencies) // 2]:.3f}s, max {latencies[-1]:.3f}s")
+        report = self.controller.report()
+        logger.info(f"Send rate {report['achieved_rate']}/s (limit {report['max_rate']}/s), "
+                    f"{report['retries']} retries, {report['throttled']} throttled, "
+                    f"{report['waited_seconds']}s spent waiting", extra={'fields': report})
+        for email, status in self.results.items():
+            if status != 'Success':
+                logger.warning(f"Failed to send to {email}: {status}")
 
-                meal_data = {
-                    "meal_type": meal_type,
-                    "stations": []
-                }
 
-                for station_name, items in stations.items():
-                    station_data = {
-                        "station_name": station_name,
-                        "items": []
-                    }
+SNAPSHOT_VERSION = 1
 
-                    for item_name, item in items.items():
-                        # Check dietary preferences
-                        if user.get('is_vegetarian') and not item.is_vegetarian:
-                            continue
-                        if user.get('is_vegan') and not item.is_vegan:
-                            continue
-                        if user.get('is_halal') and not item.is_halal:
-                            continue
-
-                        # Check allergens
-                        skip_item = False
-                        for unavailable in user.get('unavailable_foods', []):
-                            if any(allergen.lower() == unavailable.lower() for allergen in item.allergens):
-                                skip_item = True
-                                break
-                        if skip_item:
-                            continue
-
-                        # Format dietary information
-                        dietary = []
-                        if item.is_vegan:
-                            dietary.append("Vegan")
-                        elif item.is_vegetarian:
-                            dietary.append("Vegetarian")
-                        if item.is_halal:
-                            dietary.append("Halal")
 
-                        station_data["items"].append({
-                            "name": item_name,
-                            "dietary": ", ".join(dietary) if dietary else None,
-                            "allergens": ", ".join(item.allergens) if item.allergens else None
-                        })
+class LocalSnapshotStore:
+    """Snapshot store backed by a local directory (also handy for testing)."""
 
-                    if station_data["items"]:
-                        meal_data["stations"].append(station_data)
+    def __init__(self, directory: str):
+        self.directory = directory
 
-                if meal_data["stations"]:
-                    location_data["meals"].append(meal_data)
+    def read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(os.path.join(self.directory, key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
 
-            if location_data["meals"]:
-                formatted_locations.append(location_data)
+    def write(self, key: str, data: bytes):
+        path = os.path.join(self.directory, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so a concurrent reader never sees half a file
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
 
-        return formatted_locations
 
-    def send_email(self, user_email: str, formatted_menu: List[Dict]):
-        """Send formatted menu to user via SES."""
+class S3SnapshotStore:
+    """Snapshot store backed by an S3 (or S3-compatible) bucket."""
+
+    def __init__(self, bucket: str, prefix: str = ''):
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.s3 = aws_client('s3')
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}/{key}" if self.prefix else key
+
+    def read(self, key: str) -> Optional[bytes]:
         try:
-            template_data = {
-                "date": datetime.now().strftime("%A, %B %d, %Y"),
-                "subject": random.choice(self.subjects),  # Pick a random subject
-                "locations": formatted_menu,
-                "closed_locations": self.closed_locations
+            return self.s3.get_object(Bucket=self.bucket, Key=self._key(key))['Body'].read()
+        except self.s3.exceptions.NoSuchKey:
+            return None
+
+    def write(self, key: str, data: bytes):
+        self.s3.put_object(Bucket=self.bucket, Key=self._key(key), Body=data)
+
+
+def open_snapshot_store(spec: str):
+    """Build a snapshot store from 's3://bucket/prefix' or a directory path; None if spec is empty."""
+    if not spec:
+        return None
+    if spec.startswith('s3://'):
+        bucket, _, prefix = spec[len('s3://'):].partition('/')
+        return S3SnapshotStore(bucket, prefix)
+    if spec.startswith('file://'):
+        spec = spec[len('file://'):]
+    return LocalSnapshotStore(spec)
+
+
+class MenuSnapshot:
+    """
+    A stored scrape result. The small manifest (date, timestamp, hash, status)
+    is read eagerly; the compressed menu body is only fetched and decoded the
+    first time .locations is used.
+    """
+
+    def __init__(self, manifest: Dict, store=None, locations: Dict[str, DiningLocation] = None):
+        self.manifest = manifest
+        self.date = manifest['date']
+        self.scraped_at = manifest['scraped_at']
+        self.content_hash = manifest['content_hash']
+        self.closed_locations = manifest['closed_locations']
+        self.location_status = manifest['location_status']
+        self.fingerprints = manifest.get('fingerprints', {})
+        self.scrape_seconds = manifest.get('scrape_seconds', {})
+        self._store = store
+        self._locations = locations
+
+    @property
+    def age_seconds(self) -> float:
+        return time.time() - self.scraped_at
+
+    @property
+    def locations(self) -> Dict[str, DiningLocation]:
+        if self._locations is None:
+            body = self._store.read(self.manifest['body_key'])
+            if body is None:
+                raise RuntimeError(f"Snapshot body {self.manifest['body_key']} is missing")
+            self._locations = _decode_locations(json.loads(gzip.decompress(body)))
+        return self._locations
+
+
+def _encode_locations(locations: Dict[str, DiningLocation]) -> Dict:
+    # Items are compact [title, allergens, vegetarian, vegan, halal] rows
+    return {
+        name: {
+            'url': location.url,
+            'open_today': location.open_today,
+            'open_times': location.open_times,
+            'kind': location.kind,
+            'menus': {
+                meal_type: {
+                    station_name: [
+                        [item.title, list(item.allergens), item.is_vegetarian, item.is_vegan, item.is_halal]
+                        for item in items.values()
+                    ]
+                    for station_name, items in stations.items()
+                }
+                for meal_type, stations in location.menus.items()
+            },
+        }
+        for name, location in locations.items()
+    }
+
+
+def _decode_locations(data: Dict) -> Dict[str, DiningLocation]:
+    locations = {}
+    for name, record in data.items():
+        menus = {}
+        for meal_type, stations in record['menus'].items():
+            meal_menu = menus[sys.intern(meal_type)] = {}
+            for station_name, rows in stations.items():
+                station_menu = meal_menu[sys.intern(station_name)] = {}
+                for title, allergens, is_vegetarian, is_vegan, is_halal in rows:
+                    allergens = tuple(sys.intern(allergen) for allergen in allergens)
+                    station_menu[title] = MenuItem(
+                        title=title,
+                        allergens=allergens,
+                        is_vegetarian=is_vegetarian,
+                        is_vegan=is_vegan,
+                        is_halal=is_halal,
+                    )
+        locations[name] = DiningLocation(
+            name=name,
+            url=record['url'],
+            menus=menus,
+            open_today=record['open_today'],
+            open_times=record['open_times'],
+            kind=record.get('kind', ''),
+        )
+    return locations
+
+
+def _manifest_key(date: str) -> str:
+    return f"{date}/manifest.json"
+
+
+def _content_hash(encoded: Dict, closed_locations: List[str]) -> str:
+    canonical = json.dumps(
+        {'locations': encoded, 'closed_locations': closed_locations},
+        sort_keys=True, separators=(',', ':'),
+    ).encode()
+    return hashlib.sha256(canonical).hexdigest()[:16]
+
+
+def snapshot_content_hash(scraper: 'ColumbiaDiningScraper') -> str:
+    """The content hash save_snapshot() would give the scraper's current result."""
+    return _content_hash(_encode_locations(scraper.locations), scraper.closed_locations)
+
+
+def save_snapshot(store, scraper: 'ColumbiaDiningScraper', date: str = None, prefetched: bool = False) -> MenuSnapshot:
+    """
+    Store the scraper's current result for `date` (today by default) and return it.
+    `prefetched` marks a snapshot scraped ahead of its day, see ColumbiaDiningScraper.prefetch().
+    """
+    date = date or campus_today().isoformat()
+    encoded = _encode_locations(scraper.locations)
+    content_hash = _content_hash(encoded, scraper.closed_locations)
+    body_key = f"{date}/{content_hash}.json.gz"
+    # Content addressed, so an unchanged re-scrape doesn't rewrite the body
+    if store.read(body_key) is None:
+        store.write(body_key, gzip.compress(json.dumps(encoded, separators=(',', ':')).encode(), compresslevel=6))
+
+    manifest = {
+        'version': SNAPSHOT_VERSION,
+        'date': date,
+        'scraped_at': time.time(),
+        'content_hash': content_hash,
+        'body_key': body_key,
+        'closed_locations': list(scraper.closed_locations),
+        'location_status': {
+            name: {
+                'open_today': location.open_today,
+                'open_times': location.open_times,
+                'items': sum(len(items) for stations in location.menus.values() for items in stations.values()),
             }
-            print("Template data")
-            for key in template_data:
-                print(key,template_data[key])
-
-            response = ses.send_templated_email(
-                Source='roy@cudiningnotifications.com',  # Make sure this email is verified in SES
-                Destination={
-                    'ToAddresses': [user_email]
-                },
-                Template='ColumbiaDiningMenuUpdate',
-                TemplateData=json.dumps(template_data)
-            )
-            print(f"Email sent successfully to {user_email}")
-            return response
+            for name, location in scraper.locations.items()
+        },
+        'fingerprints': scraper.fingerprints,
+        'scrape_seconds': scraper.extraction_seconds(),
+        'prefetched': prefetched,
+    }
+    store.write(_manifest_key(date), json.dumps(manifest).encode())
+    logger.info(f"Saved snapshot {body_key}")
+    return MenuSnapshot(manifest, store, scraper.locations)
+
+
+def load_snapshot(store, date: str = None, max_age: float = None) -> Optional[MenuSnapshot]:
+    """Return the stored snapshot for `date` (today by default) if there is a compatible, fresh one."""
+    date = date or campus_today().isoformat()
+    raw = store.read(_manifest_key(date))
+    if raw is None:
+        return None
+    manifest = json.loads(raw)
+    if manifest.get('version') != SNAPSHOT_VERSION:
+        logger.warning(f"Ignoring snapshot for {date} with version {manifest.get('version')}")
+        return None
+    snapshot = MenuSnapshot(manifest, store)
+    if max_age is not None and snapshot.age_seconds > max_age:
+        logger.info(f"Snapshot for {date} is {snapshot.age_seconds:.0f}s old, ignoring it")
+        return None
+    return snapshot
+
+
+class LocalCheckpointStore:
+    """Checkpoint store backed by one append-only JSON-lines file per run in a local directory."""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, run_id: str) -> str:
+        return os.path.join(self.directory, f"{run_id}.jsonl")
+
+    def load(self, run_id: str) -> set:
+        try:
+            with open(self._path(run_id)) as f:
+                # A torn last line from a killed run is just skipped
+                return {json.loads(line)['email'] for line in f if line.endswith('\n')}
+        except FileNotFoundError:
+            return set()
+
+    def write(self, run_id: str, emails: List[str]):
+        os.makedirs(self.directory, exist_ok=True)
+        sent_at = int(time.time())
+        lines = ''.join(json.dumps({'email': email, 'sent_at': sent_at}) + '\n' for email in emails)
+        # One appended write per flush, so concurrent shards don't interleave records
+        with open(self._path(run_id), 'a') as f:
+            f.write(lines)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class DynamoCheckpointStore:
+    """Checkpoint store backed by a DynamoDB table keyed by run_id (hash) and email (range)."""
+
+    def __init__(self, table_name: str):
+        self.table = aws_client('dynamodb').Table(table_name)
+
+    def load(self, run_id: str) -> set:
+        from boto3.dynamodb.conditions import Key
+        delivered = set()
+        kwargs = {'KeyConditionExpression': Key('run_id').eq(run_id), 'ProjectionExpression': 'email'}
+        while True:
+            response = self.table.query(**kwargs)
+            delivered.update(item['email'] for item in response['Items'])
+            if 'LastEvaluatedKey' not in response:
+                return delivered
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def write(self, run_id: str, emails: List[str]):
+        sent_at = int(time.time())
+        # batch_writer groups puts into 25-item BatchWriteItem calls and resends unprocessed items
+        with self.table.batch_writer(overwrite_by_pkeys=['run_id', 'email']) as batch:
+            for email in emails:
+                batch.put_item(Item={'run_id': run_id, 'email': email, 'sent_at': sent_at})
+
+
+def open_checkpoint_store(spec: str):
+    """Build a checkpoint store from 'dynamodb://table' or a directory path; None if spec is empty."""
+    if not spec:
+        return None
+    if spec.startswith('dynamodb://'):
+        return DynamoCheckpointStore(spec[len('dynamodb://'):])
+    if spec.startswith('file://'):
+        spec = spec[len('file://'):]
+    return LocalCheckpointStore(spec)
+
+
+class DeliveryCheckpoint:
+    """
+    Tracks which recipients a run has already been sent to. Successful sends are
+    buffered and written to the store in batches on a background thread, so the
+    send loop never waits on checkpoint writes; close() flushes the rest.
+    """
+
+    def __init__(self, store, run_id: str, resume: bool = False,
+                 flush_size: int = CHECKPOINT_FLUSH_SIZE, flush_seconds: float = CHECKPOINT_FLUSH_SECONDS):
+        self.store = store
+        self.run_id = run_id
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        # Recipients delivered by an earlier attempt at this run (only read when resuming)
+        self.delivered = store.load(run_id) if resume else set()
+        self.written = 0
+        self.skipped = 0
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._writer = ThreadPoolExecutor(max_workers=1)
+        self._pending = []
+        if resume:
+            logger.info(f"Resuming run {run_id}: {len(self.delivered)} recipients already delivered")
+
+    def should_skip(self, email: str) -> bool:
+        if email in self.delivered:
+            self.skipped += 1
+            return True
+        return False
+
+    def record(self, emails: List[str]):
+        """Mark recipients delivered; writes happen in the background once enough have built up."""
+        with self._lock:
+            self._buffer.extend(emails)
+            due = (len(self._buffer) >= self.flush_size
+                   or time.monotonic() - self._last_flush >= self.flush_seconds)
+            if not due:
+                return
+            batch, self._buffer = self._buffer, []
+            self._last_flush = time.monotonic()
+            self._pending.append(self._writer.submit(self._write, batch))
+
+    def _write(self, emails: List[str]):
+        try:
+            with tracer.span('checkpoint_write', recipients=len(emails)):
+                self.store.write(self.run_id, emails)
+            self.written += len(emails)
         except Exception as e:
-            print(f"Error sending email to {user_email}: {e}")
-            raise
+            # Keep them for the next flush rather than losing track of who was emailed
+            logger.error(f"Checkpoint write of {len(emails)} recipients failed: {e}")
+            with self._lock:
+                self._buffer.extend(emails)
+
+    def close(self):
+        with self._lock:
+            batch, self._buffer = self._buffer, []
+        if batch:
+            self._pending.append(self._writer.submit(self._write, batch))
+        for future in self._pending:
+            future.result()
+        self._writer.shutdown()
+        if self._buffer:
+            # Last try for anything a failed write put back
+            batch, self._buffer = self._buffer, []
+            self._write(batch)
+        logger.info(f"Checkpointed {self.written} recipients for run {self.run_id}, "
+                    f"skipped {self.skipped} already delivered")
+
+
+def _scan_segment(table, segment: int = None, total_segments: int = None, page_size: int = None):
+    """Yield pages of users from one scan segment (or the whole table), following LastEvaluatedKey."""
+    if not USER_SCAN_INDEX:
+        yield from _scan_pages(table, segment, total_segments, page_size)
+        return
+    # The same segment of the index and of the table, so each segment still covers its share
+    yield from _scan_pages(table, segment, total_segments, page_size, index=USER_SCAN_INDEX)
+    yield from _scan_pages(table, segment, total_segments, page_size, without_signature=True)
+
+
+def _scan_pages(table, segment: int = None, total_segments: int = None, page_size: int = None,
+                index: str = None, without_signature: bool = False):
+    """One scan of the table or `index`; without_signature keeps only users missing from the index."""
+    kwargs = {
+        'ProjectionExpression': ', '.join(f'#a{i}' for i in range(len(USER_ATTRIBUTES))),
+        'ExpressionAttributeNames': {f'#a{i}': name for i, name in enumerate(USER_ATTRIBUTES)},
+    }
+    if index:
+        kwargs['IndexName'] = index
+    if without_signature:
+        kwargs['FilterExpression'] = 'attribute_not_exists(#signature)'
+        kwargs['ExpressionAttributeNames']['#signature'] = 'preference_signature'
+    if total_segments:
+        kwargs['Segment'] = segment
+        kwargs['TotalSegments'] = total_segments
+    if page_size:
+        kwargs['Limit'] = page_size
+    while True:
+        with tracer.span('scan_page', segment=segment) as span:
+            response = table.scan(**kwargs)
+            span['items'] = len(response['Items'])
+        yield response['Items']
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def iter_user_pages(table, segments: int = 1, page_size: int = None, shard: int = 0, total_shards: int = 1):
+    """
+    Stream pages of users from the table. With more than one segment each one is
+    scanned on its own thread and pages are yielded as soon as any of them arrive.
+    With total_shards > 1 the table is split into segments * total_shards scan
+    segments and only this shard's block of `segments` is read.
+    """
+    segments = max(segments, 1)
+    if segments == 1 and total_shards <= 1:
+        yield from _scan_segment(table, page_size=page_size)
+        return
+    if segments == 1:
+        yield from _scan_segment(table, shard, total_shards, page_size)
+        return
+    total_segments = segments * max(total_shards, 1)
+    first_segment = shard * segments
+
+    pages = queue.Queue(maxsize=segments * 2)
+    stop = threading.Event()
+    done = object()
+
+    def hand_over(item) -> bool:
+        """Put an item on the queue unless the consumer has gone; returns whether it was put."""
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def scan_worker(segment):
+        try:
+            for page in _scan_segment(table, segment, total_segments, page_size):
+                if not hand_over(page):
+                    return
+            hand_over(done)
+        except Exception as e:
+            hand_over(e)
+
+    workers = [
+        threading.Thread(target=scan_worker, args=(segment,), daemon=True)
+        for segment in range(first_segment, first_segment + segments)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        remaining = segments
+        while remaining:
+            page = pages.get()
+            if page is done:
+                remaining -= 1
+            elif isinstance(page, Exception):
+                raise page
+            else:
+                yield page
+    finally:
+        # Unblock any workers still trying to hand over pages if we stopped early
+        stop.set()
+
+
+def iter_users(table, segments: int = 1, page_size: int = None):
+    """Stream users one at a time from iter_user_pages()."""
+    for page in iter_user_pages(table, segments, page_size):
+        yield from page
+
 
 def lambda_handler(event, context):
+    tracer.reset()
     try:
-        socket.gethostbyname('dining.columbia.edu')
-        print("DNS resolution successful")
-    except Exception as e:
-        print(f"DNS resolution failed: {e}")
+        return _run(event, context)
+    finally:
+        tracer.flush_metrics()
+
+
+def prepare_menus(scraper: 'ColumbiaDiningScraper', store, resume: bool = False) -> Optional[MenuSnapshot]:
+    """
+    Reuse today's snapshot if a fresh one exists, otherwise scrape all locations,
+    re-extracting only the ones that changed since the stale snapshot.
+    A resumed run always reuses today's snapshot so everyone gets the same menu.
+    """
+    snapshot = load_snapshot(store) if store else None
+    max_age = SNAPSHOT_MAX_AGE_SECONDS
+    if snapshot and snapshot.manifest.get('prefetched'):
+        max_age = PREFETCH_MAX_AGE_SECONDS
+    if snapshot and (resume or snapshot.age_seconds <= max_age):
+        logger.info(f"Using snapshot {snapshot.content_hash} scraped {snapshot.age_seconds:.0f}s ago")
+        scraper.apply_snapshot(snapshot)
+        return snapshot
+    if store:
+        scraper.load_registry(store)
+    with tracer.span('scrape', engine=SCRAPE_ENGINE):
+        scraper.scrape_locations(previous=snapshot)
+    tracer.count('LocationsReused', len(scraper.reused_locations))
+    if not store:
+        return None
+    scraper.save_registry(store)
+    return save_snapshot(store, scraper)
+
+
+def load_worker_menus(scraper: 'ColumbiaDiningScraper', store, event: Dict) -> MenuSnapshot:
+    """Load the snapshot the coordinator published for this worker's run."""
+    if not store:
+        raise RuntimeError("Worker mode needs SNAPSHOT_STORE to read the coordinator's menus")
+    snapshot = load_snapshot(store, event.get('date'))
+    if snapshot is None:
+        raise RuntimeError(f"No snapshot published for {event.get('date')}")
+    if event.get('content_hash') and snapshot.content_hash != event['content_hash']:
+        # Someone re-scraped since the fan-out; every shard still reads the same latest manifest
+        logger.warning(f"Snapshot changed since fan-out ({event['content_hash']} -> {snapshot.content_hash})")
+    scraper.apply_snapshot(snapshot)
+    return snapshot
+
+
+def fan_out(snapshot: MenuSnapshot, total_shards: int, function_name: str = None, resume: bool = False) -> List[Dict]:
+    """Invoke one asynchronous worker per shard for the published snapshot; returns the worker events."""
+    function_name = function_name or WORKER_FUNCTION_NAME
+    if not function_name:
+        raise RuntimeError("Set WORKER_FUNCTION_NAME to fan out outside Lambda")
+    events = [
+        {'mode': 'worker', 'shard': shard, 'total_shards': total_shards,
+         'date': snapshot.date, 'content_hash': snapshot.content_hash, 'resume': resume}
+        for shard in range(total_shards)
+    ]
+    client = aws_client('lambda')
+    for worker_event in events:
+        with tracer.span('invoke_worker', shard=worker_event['shard']):
+            client.invoke(FunctionName=function_name, InvocationType='Event', Payload=json.dumps(worker_event).encode())
+    logger.info(f"Started {total_shards} workers for snapshot {snapshot.content_hash}")
+    return events
+
+
+def deliver(scraper: 'ColumbiaDiningScraper', context=None, shard: int = 0, total_shards: int = 1,
+            checkpoint: DeliveryCheckpoint = None) -> DeliveryPipeline:
+    """Stream this shard's users from DynamoDB through the format and send stages as pages arrive."""
+    with tracer.span('deliver', shard=shard, total_shards=total_shards) as span:
+        send_batch = LocalRenderer(scraper).send_batch if RENDER_MODE == 'local' else None
+        pipeline = DeliveryPipeline(scraper, send_batch=send_batch, checkpoint=checkpoint)
+        timer = None
+        if context is not None:
+            # Leave time to drain what's already queued before Lambda kills us
+            remaining = context.get_remaining_time_in_millis() / 1000 - SHUTDOWN_MARGIN_SECONDS
+            if remaining <= 0:
+                logger.warning(f"Only {remaining + SHUTDOWN_MARGIN_SECONDS:.0f}s left, not starting delivery")
+                pipeline.stop()
+            else:
+                timer = threading.Timer(remaining, pipeline.stop)
+                timer.daemon = True
+                timer.start()
+        try:
+            pipeline.run(iter_user_pages(get_users_table(), USER_SCAN_SEGMENTS, shard=shard, total_shards=total_shards))
+        finally:
+            if timer:
+                timer.cancel()
+        logger.info(f"Formatted {scraper.format_cache_misses} distinct menus "
+                    f"({scraper.format_cache_hits} cache hits)")
+        span.update(users=pipeline.user_count, recipients=len(pipeline.results))
+    if checkpoint:
+        tracer.count('RecipientsResumedPast', checkpoint.skipped)
+    tracer.count('Users', pipeline.user_count)
+    tracer.count('FormatCacheHits', scraper.format_cache_hits)
+    tracer.count('FormatCacheMisses', scraper.format_cache_misses)
+    return pipeline
+
+
+def _run(event, context):
+    # Modes: 'single' scrapes and sends everything, 'coordinator' scrapes then starts
+    # one worker per shard, 'worker' sends to one shard from the published snapshot,
+    # 'prefetch' only scrapes and stores the coming days' menus
+    event = event or {}
+    total_shards = int(event.get('total_shards', FANOUT_SHARDS))
+    mode = event.get('mode') or ('coordinator' if total_shards > 1 else 'single')
+    resume = bool(event.get('resume', RESUME_DELIVERY))
+
+    if mode != 'worker':
+        try:
+            socket.gethostbyname('dining.columbia.edu')
+            logger.info("DNS resolution successful")
+        except Exception as e:
+            logger.error(f"DNS resolution failed: {e}")
     
-    successful_sends=[]
     try:
         
         # Initialize scraper
         scraper = ColumbiaDiningScraper()
-        
-        # Scrape all locations
-        scraper.scrape_locations()
-        
-        # Get all users from DynamoDB
-        response = users_table.scan()
-        users = response['Items']
-        print(f"Found {len(users)} users")
-        
-        # Process menu for each user and send email
-        for user in users:
-            formatted_menu = scraper.format_menu_for_user(user, scraper.locations)
-            if formatted_menu:  # Only send email if there are matching menu items
-                scraper.send_email(user['email'], formatted_menu)
-                successful_sends.append(user['email'])
+        store = open_snapshot_store(SNAPSHOT_STORE)
+
+        if mode == 'prefetch':
+            if not store:
+                raise RuntimeError("Prefetch mode needs SNAPSHOT_STORE to keep the menus in")
+            snapshots = scraper.prefetch(store, int(event.get('days', PREFETCH_DAYS)))
+            return {
+                'statusCode': 200,
+                'body': json.dumps({'dates': {snapshot.date: snapshot.content_hash for snapshot in snapshots}})
+            }
+        if mode == 'worker':
+            load_worker_menus(scraper, store, event)
+        else:
+            snapshot = prepare_menus(scraper, store, resume)
+            if mode == 'coordinator':
+                if snapshot is None:
+                    raise RuntimeError("Coordinator mode needs SNAPSHOT_STORE to publish menus to workers")
+                events = fan_out(snapshot, total_shards, resume=resume)
+                return {
+                    'statusCode': 200,
+                    'body': json.dumps({'snapshot': snapshot.content_hash, 'workers': len(events)})
+                }
+
+        shard = int(event.get('shard', 0)) if mode == 'worker' else 0
+        # Progress is keyed by run date, so every shard of a day's run shares one checkpoint
+        checkpoint_store = open_checkpoint_store(CHECKPOINT_STORE)
+        checkpoint = None
+        if checkpoint_store:
+            run_id = event.get('date') or campus_today().isoformat()
+            checkpoint = DeliveryCheckpoint(checkpoint_store, run_id, resume=resume)
+        pipeline = deliver(scraper, context, shard, total_shards if mode == 'worker' else 1, checkpoint)
+        sent = sum(1 for status in pipeline.results.values() if status == 'Success')
         
         return {
             'statusCode': 200,
-            'body': json.dumps('Emails sent successfully')
+            'body': json.dumps({
+                'shard': shard,
+                'users': pipeline.user_count,
+                'recipients': len(pipeline.results),
+                'sent': sent,
+                'already_delivered': checkpoint.skipped if checkpoint else 0,
+            })
         }
         
     except Exception as e:
-        print(f"Error in lambda execution: {e}")
-        # Print full traceback for debugging
+        # Log full traceback for debugging
         import traceback
-        print("Full traceback:")
-        print(traceback.format_exc())
+        logger.error(f"Error in lambda execution: {e}", extra={'fields': {'traceback': traceback.format_exc()}})
         return {
             'statusCode': 500,
             'body': json.dumps({
@@ -566,7 +2825,8 @@ def lambda_handler(event, context):
             })
         }
 
-lambda_handler(None, None)
+if __name__ == '__main__':
+    lambda_handler(None, None)
 
 
 
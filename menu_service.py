@@ -0,0 +1,344 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+from zoneinfo import ZoneInfo
+
+import main
+from main import DINING_TIMEZONE, MenuIndex, logger
+
+# Read-only HTTP query service over the latest scrape snapshot, so menus can be
+# queried without scraping again. Filters use the same preference semantics as
+# the daily email (main.MenuIndex), plus location / meal / station / name filters:
+#   SNAPSHOT_STORE=/tmp/snapshots python menu_service.py --port 8080
+#   curl 'http://127.0.0.1:8080/menu?vegan=1&avoid=sesame&open_now=1'
+#   curl 'http://127.0.0.1:8080/locations'
+
+# How often to look for a newer snapshot in the store
+SERVICE_RELOAD_SECONDS = int(os.environ.get('SERVICE_RELOAD_SECONDS', '60'))
+
+TIME_RANGE = re.compile(r'(\d{1,2}):(\d{2})\s*([AP]M)\s*-\s*(\d{1,2}):(\d{2})\s*([AP]M)', re.IGNORECASE)
+TOKEN = re.compile(r'[a-z0-9]+')
+MENU_PARAMS = {'vegetarian', 'vegan', 'halal', 'avoid', 'location', 'meal', 'station', 'q', 'open_now', 'at'}
+
+
+def _minutes(hour: str, minute: str, meridiem: str) -> int:
+    return (int(hour) % 12 + (12 if meridiem.upper() == 'PM' else 0)) * 60 + int(minute)
+
+
+def parse_hours(open_times: str) -> List[tuple]:
+    """(start, end) minutes after midnight for every 'H:MM AM - H:MM PM' range in the text."""
+    return [
+        (_minutes(*match.group(1, 2, 3)), _minutes(*match.group(4, 5, 6)))
+        for match in TIME_RANGE.finditer(open_times or '')
+    ]
+
+
+def parse_meal_hours(open_times: str) -> Dict[str, List[tuple]]:
+    """
+    parse_hours() grouped by the lowercased label before each range, e.g.
+    'Breakfast 9:30 AM - 11:00 AM Lunch & Dinner 11:00 AM - 9:00 PM' ->
+    {'breakfast': [(570, 660)], 'lunch & dinner': [(660, 1260)]}. Unlabelled ranges are under ''.
+    """
+    open_times = open_times or ''
+    hours: Dict[str, List[tuple]] = {}
+    position = 0
+    for match in TIME_RANGE.finditer(open_times):
+        label = open_times[position:match.start()].strip(' \t\n:,;|').lower()
+        hours.setdefault(label, []).append((_minutes(*match.group(1, 2, 3)), _minutes(*match.group(4, 5, 6))))
+        position = match.end()
+    return hours
+
+
+def is_open_at(hours: List[tuple], minute: int) -> bool:
+    """Whether `minute` falls in any range; ranges ending before they start run past midnight."""
+    for start, end in hours:
+        if start <= minute < end if start < end else (minute >= start or minute < end):
+            return True
+    return False
+
+
+class QueryIndex(MenuIndex):
+    """
+    MenuIndex with extra bitsets by location, meal, station and item-name token
+    (all lowercased), so any combination of filters is a handful of int ANDs.
+    Opening-hours filters use each meal's own hours where the location lists them.
+    """
+
+    def __init__(self, snapshot: 'main.MenuSnapshot'):
+        super().__init__(snapshot.locations)
+        self.date = snapshot.date
+        self.content_hash = snapshot.content_hash
+        self.scraped_at = snapshot.scraped_at
+        self.closed_locations = list(snapshot.closed_locations)
+        self.by_location: Dict[str, int] = {}
+        self.by_meal: Dict[str, int] = {}
+        self.by_station: Dict[str, int] = {}
+        self.by_token: Dict[str, int] = {}
+        self.by_location_meal: Dict[tuple, int] = {}
+        for row, (location_name, meal_type, station_name, item) in enumerate(self.rows):
+            bit = 1 << row
+            for index, key in ((self.by_location, location_name), (self.by_meal, meal_type),
+                               (self.by_station, station_name)):
+                key = key.lower()
+                index[key] = index.get(key, 0) | bit
+            key = (location_name, meal_type)
+            self.by_location_meal[key] = self.by_location_meal.get(key, 0) | bit
+            for token in set(TOKEN.findall(item['name'].lower())):
+                self.by_token[token] = self.by_token.get(token, 0) | bit
+        # Locations without parseable hours are listed as open today, so count them as open
+        self.hours = {name: parse_hours(open_times) for name, open_times in self.open_times.items()}
+        # A meal listed with its own hours ('Breakfast 9:30 AM - 11:00 AM') is only open then;
+        # other meals ('Daily ...', unlabelled or unknown labels) follow the location's hours
+        self.meal_hours: Dict[tuple, List[tuple]] = {}
+        for location_name, meal_type in self.by_location_meal:
+            labelled = parse_meal_hours(self.open_times.get(location_name))
+            self.meal_hours[(location_name, meal_type)] = (
+                labelled.get(meal_type.lower()) or self.hours.get(location_name, [])
+            )
+
+    def open_at(self, minute: int) -> List[str]:
+        """Names of the indexed locations open at `minute` after midnight."""
+        return [name for name, hours in self.hours.items() if not hours or is_open_at(hours, minute)]
+
+    def open_rows(self, minute: int) -> int:
+        """Bitset of rows whose meal is being served at `minute` after midnight."""
+        mask = 0
+        for key, rows in self.by_location_meal.items():
+            hours = self.meal_hours[key]
+            if not hours or is_open_at(hours, minute):
+                mask |= rows
+        return mask
+
+    def _any_of(self, index: Dict[str, int], values: List[str]) -> int:
+        mask = 0
+        for value in values:
+            mask |= index.get(value.lower(), 0)
+        return mask
+
+    def select(self, preferences: Dict, locations: List[str] = (), meals: List[str] = (),
+               stations: List[str] = (), terms: List[str] = (), open_at: Optional[int] = None) -> int:
+        """Bitset of rows matching preferences and every given filter (values within one filter are ORed)."""
+        mask = self.visible(preferences)
+        if locations:
+            mask &= self._any_of(self.by_location, locations)
+        if meals:
+            mask &= self._any_of(self.by_meal, meals)
+        if stations:
+            mask &= self._any_of(self.by_station, stations)
+        for term in terms:
+            mask &= self.by_token.get(term, 0)
+        if open_at is not None:
+            mask &= self.open_rows(open_at)
+        return mask
+
+
+def _flag(params: Dict[str, List[str]], name: str) -> bool:
+    return params.get(name, ['0'])[-1].lower() in ('1', 'true', 'yes')
+
+
+def _values(params: Dict[str, List[str]], name: str) -> List[str]:
+    # Repeated (?meal=Lunch&meal=Dinner) and comma separated (?meal=Lunch,Dinner) both work
+    return [value.strip() for raw in params.get(name, []) for value in raw.split(',') if value.strip()]
+
+
+class MenuService:
+    """Holds the current QueryIndex and swaps in a new one when the store has a newer snapshot."""
+
+    def __init__(self, store, reload_seconds: int = SERVICE_RELOAD_SECONDS):
+        self.store = store
+        self.reload_seconds = reload_seconds
+        self.index: Optional[QueryIndex] = None
+        self.timezone = ZoneInfo(DINING_TIMEZONE)
+        self._stop = threading.Event()
+
+    def reload(self) -> bool:
+        """Load today's snapshot if it differs from the indexed one. Returns whether it changed."""
+        snapshot = main.load_snapshot(self.store)
+        if snapshot is None:
+            if self.index is None:
+                logger.warning("No snapshot for today in the store yet")
+            return False
+        if self.index and self.index.content_hash == snapshot.content_hash and self.index.date == snapshot.date:
+            return False
+        start = time.monotonic()
+        index = QueryIndex(snapshot)
+        # Plain attribute swap: requests in flight keep the index they started with
+        self.index = index
+        logger.info(f"Indexed snapshot {snapshot.date}/{snapshot.content_hash}: {len(index.rows)} items "
+                    f"in {(time.monotonic() - start) * 1000:.1f}ms")
+        return True
+
+    def watch(self):
+        """Reload in a background thread every reload_seconds."""
+        def loop():
+            while not self._stop.wait(self.reload_seconds):
+                try:
+                    self.reload()
+                except Exception as e:
+                    logger.error(f"Snapshot reload failed: {e}")
+        threading.Thread(target=loop, daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def minute_now(self) -> int:
+        now = datetime.now(self.timezone)
+        return now.hour * 60 + now.minute
+
+    def query(self, index: QueryIndex, params: Dict[str, List[str]]) -> int:
+        """Parse /menu query parameters into a row bitset; raises ValueError on bad input."""
+        unknown = set(params) - MENU_PARAMS
+        if unknown:
+            raise ValueError(f"Unknown parameter(s): {', '.join(sorted(unknown))}")
+        # Normalised the same way as a user's preferences in the daily email
+        preferences = main.parse_preference_signature(main.preference_signature({
+            'is_vegetarian': _flag(params, 'vegetarian'),
+            'is_vegan': _flag(params, 'vegan'),
+            'is_halal': _flag(params, 'halal'),
+            'unavailable_foods': _values(params, 'avoid'),
+        }))
+        open_at = None
+        if 'at' in params:
+            match = re.fullmatch(r'(\d{1,2}):(\d{2})', params['at'][-1].strip())
+            if not match or int(match.group(1)) > 23 or int(match.group(2)) > 59:
+                raise ValueError("'at' must be HH:MM (24-hour)")
+            open_at = int(match.group(1)) * 60 + int(match.group(2))
+        elif _flag(params, 'open_now'):
+            open_at = self.minute_now()
+        terms = [token for value in _values(params, 'q') for token in TOKEN.findall(value.lower())]
+        return index.select(
+            preferences,
+            locations=_values(params, 'location'),
+            meals=_values(params, 'meal'),
+            stations=_values(params, 'station'),
+            terms=terms,
+            open_at=open_at,
+        )
+
+
+def _etag(content_hash: str, key) -> str:
+    return '"' + hashlib.sha256(f"{content_hash}:{key}".encode()).hexdigest()[:20] + '"'
+
+
+class MenuRequestHandler(BaseHTTPRequestHandler):
+    # Keep-alive, so clients polling many queries reuse one connection. Headers and
+    # body are separate writes, so Nagle would hold the body for the client's delayed ACK
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    service: MenuService = None
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = parse_qs(url.query)
+        index = self.service.index
+        if url.path == '/status':
+            body = {'ready': index is not None}
+            if index:
+                body.update(date=index.date, content_hash=index.content_hash,
+                            scraped_at=index.scraped_at, items=len(index.rows))
+            return self._send_json(200 if index else 503, body)
+        if index is None:
+            return self._send_json(503, {'error': 'No snapshot loaded yet'})
+
+        if url.path == '/menu':
+            try:
+                mask = self.service.query(index, params)
+            except ValueError as e:
+                return self._send_json(400, {'error': str(e)})
+            # The result only depends on the snapshot and the matching rows, so the
+            # ETag can be checked before anything is formatted
+            etag = _etag(index.content_hash, f"{mask:x}")
+            if self._not_modified(etag):
+                return
+            locations = index.format_rows(mask)
+            return self._send_json(200, {
+                'date': index.date,
+                'content_hash': index.content_hash,
+                'count': bin(mask).count('1'),
+                'locations': locations,
+            }, etag)
+
+        if url.path == '/locations':
+            minute = self.service.minute_now()
+            open_now = set(index.open_at(minute))
+            etag = _etag(index.content_hash, sorted(open_now))
+            if self._not_modified(etag):
+                return
+            return self._send_json(200, {
+                'date': index.date,
+                'content_hash': index.content_hash,
+                'open': [
+                    {'name': name, 'open_times': open_times, 'open_now': name in open_now}
+                    for name, open_times in index.open_times.items()
+                ],
+                'closed': index.closed_locations,
+            }, etag)
+
+        self._send_json(404, {'error': f"Unknown path {url.path}; try /menu, /locations or /status"})
+
+    def _not_modified(self, etag: str) -> bool:
+        candidates = self.headers.get('If-None-Match', '')
+        if etag not in [candidate.strip() for candidate in candidates.split(',')] and candidates.strip() != '*':
+            return False
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+        return True
+
+    def _send_json(self, status: int, body: Dict, etag: str = None):
+        payload = json.dumps(body, separators=(',', ':')).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        if etag:
+            self.send_header('ETag', etag)
+            # Clients may cache but must revalidate, since the day's snapshot can be replaced
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+def serve(store, host: str = '127.0.0.1', port: int = 8080, reload_seconds: int = SERVICE_RELOAD_SECONDS):
+    """Load the latest snapshot and return a (not yet started) server for it."""
+    service = MenuService(store, reload_seconds)
+    service.reload()
+    if reload_seconds > 0:
+        service.watch()
+    handler = type('BoundMenuRequestHandler', (MenuRequestHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.menu_service = service
+    logger.info(f"Serving menus on http://{host}:{server.server_port}/")
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--store', default=main.SNAPSHOT_STORE, help='snapshot store (defaults to SNAPSHOT_STORE)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--reload-seconds', type=int, default=SERVICE_RELOAD_SECONDS)
+    args = parser.parse_args()
+    if not args.store:
+        parser.error('set --store or SNAPSHOT_STORE')
+    server = serve(main.open_snapshot_store(args.store), args.host, args.port, args.reload_seconds)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.menu_service.stop()
+        server.server_close()
@@ -0,0 +1,101 @@
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'scripts', 'dynamodb'))
+from pipeline import synthetic_users, git_commit
+
+# Import throughput of scripts/dynamodb/bulk_users.py for different writer counts.
+# By default it writes to an in-memory BatchWriteItem stand-in that sleeps per call
+# and leaves a share of each batch unprocessed, like a throttled table; with
+# --endpoint-url it writes to DynamoDB Local (the --table must already exist).
+#   python scripts/bench/bulk_load.py --users 50000 --writers 1 4 8 16
+#   python scripts/bench/bulk_load.py --endpoint-url http://localhost:8000 --users 5000
+
+
+class FakeDynamo:
+    """In-memory stand-in for the DynamoDB resource's batch_write_item()."""
+
+    def __init__(self, latency: float = 0.01, unprocessed: float = 0.05, seed: int = 0):
+        self.latency = latency
+        self.unprocessed = unprocessed
+        self.items = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def batch_write_item(self, RequestItems):
+        time.sleep(self.latency)
+        unprocessed = {}
+        with self._lock:
+            for table_name, requests in RequestItems.items():
+                if len({request['PutRequest']['Item']['email'] for request in requests}) != len(requests):
+                    raise ValueError('Provided list of item keys contains duplicates')
+                for request in requests:
+                    if self._rng.random() < self.unprocessed:
+                        unprocessed.setdefault(table_name, []).append(request)
+                    else:
+                        item = request['PutRequest']['Item']
+                        self.items[item['email']] = item
+        return {'UnprocessedItems': unprocessed}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--writers', type=int, nargs='+', default=[1, 4, 8, 16])
+    parser.add_argument('--latency', type=float, default=0.01, help='seconds per fake BatchWriteItem call')
+    parser.add_argument('--unprocessed', type=float, default=0.05, help='share of fake items left unprocessed')
+    parser.add_argument('--endpoint-url', help='write to DynamoDB Local instead of the fake')
+    parser.add_argument('--table', default='users')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    if args.endpoint_url:
+        os.environ['DYNAMODB_ENDPOINT_URL'] = args.endpoint_url
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import bulk_users
+
+    results = {}
+    # Same users as the pipeline bench, round-tripped through both file formats
+    users = synthetic_users(args.users)
+    directory = tempfile.mkdtemp(prefix='cu-dining-users-')
+    for fmt in ('csv', 'jsonl'):
+        path = os.path.join(directory, f'users.{fmt}')
+        bulk_users.write_users(path, users)
+        start = time.perf_counter()
+        count = sum(1 for _ in bulk_users.read_users(path))
+        elapsed = time.perf_counter() - start
+        results[f'read_{fmt}'] = {'users': count, 'seconds': round(elapsed, 4),
+                                  'users_per_second': round(count / max(elapsed, 1e-9))}
+    path = os.path.join(directory, 'users.jsonl')
+
+    runs = []
+    for writers in args.writers:
+        fake = None if args.endpoint_url else FakeDynamo(args.latency, args.unprocessed)
+        writer = bulk_users.BulkWriter(args.table, writers, dynamodb=fake)
+        report = writer.write(bulk_users.read_users(path))
+        if fake is not None:
+            report['stored'] = len(fake.items)
+        runs.append({'writers': writers, **report})
+        print(f"{writers} writer(s): {report['users_per_second']} users/s, "
+              f"{report['calls']} calls, {report['retried']} retried")
+    results['import'] = runs
+
+    output = {'commit': git_commit(), 'timestamp': time.time(), 'config': vars(args), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+        print(f"Wrote {args.output}")
+    else:
+        print(json.dumps(output, indent=2))
+
+
+if __name__ == '__main__':
+    main()
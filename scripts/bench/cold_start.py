@@ -0,0 +1,65 @@
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, ROOT)
+
+# Measures what a cold Lambda container pays before doing useful work:
+#   python scripts/bench/cold_start.py                # import time + AWS client init
+#   python scripts/bench/cold_start.py --invoke       # also time a cold and a warm lambda_handler run
+# --invoke runs the real handler, so point it at local stand-ins first, e.g.
+# DINING_BASE_URL=http://127.0.0.1:8000/ DYNAMODB_ENDPOINT_URL=... SES_ENDPOINT_URL=...
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import main; print(time.perf_counter() - t)"
+
+
+def import_times(repeat: int):
+    """Time `import main` in fresh interpreters, like a cold container would."""
+    times = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, '-c', IMPORT_SNIPPET], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout
+        times.append(float(output.strip().splitlines()[-1]))
+    return times
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--invoke', action='store_true', help='run lambda_handler twice (cold, then warm)')
+    args = parser.parse_args()
+
+    times = import_times(args.repeat)
+    print(f"import main: median {statistics.median(times) * 1000:.1f} ms, max {max(times) * 1000:.1f} ms "
+          f"over {args.repeat} fresh interpreters")
+
+    import main as app
+    cold, _ = timed(app.get_ses)
+    warm, _ = timed(app.get_ses)
+    print(f"SES client: first {cold * 1000:.1f} ms, cached {warm * 1000:.3f} ms")
+    cold, _ = timed(app.get_users_table)
+    warm, _ = timed(app.get_users_table)
+    print(f"DynamoDB table: first {cold * 1000:.1f} ms, cached {warm * 1000:.3f} ms")
+
+    if args.invoke:
+        first, response = timed(lambda: app.lambda_handler(None, None))
+        print(f"First invocation: {first:.2f}s (status {response['statusCode']})")
+        second, response = timed(lambda: app.lambda_handler(None, None))
+        print(f"Warm invocation: {second:.2f}s (status {response['statusCode']})")
+        if app._driver_pool:
+            app._driver_pool.quit()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'scripts', 'fixtures'))
+from serve_fixtures import serve
+from pipeline import FakeSes, FakeUsersTable, synthetic_users, git_commit
+
+# Runs the sharded fan-out locally: scrapes the recorded fixture pages once into a
+# local snapshot store (the coordinator's job), then runs the worker mode of the
+# handler for every shard in a process pool, so scaling across cores can be measured.
+#   python scripts/bench/fanout.py --users 100000 --shards 1 2 4 8
+
+_worker_args = None
+
+
+def _init_worker(args):
+    global _worker_args
+    _worker_args = args
+
+
+def run_shard(event):
+    """Worker process: the handler's worker mode against in-memory DynamoDB and SES."""
+    import main as app
+
+    args = _worker_args
+    ses = FakeSes(args.ses_latency)
+    app._aws_clients['ses'] = ses
+    app._aws_clients['users_table'] = FakeUsersTable(synthetic_users(args.users), args.scan_latency)
+    start = time.perf_counter()
+    response = app.lambda_handler(event, None)
+    elapsed = time.perf_counter() - start
+    if response['statusCode'] != 200:
+        raise RuntimeError(response['body'])
+    return {**json.loads(response['body']), 'seconds': round(elapsed, 4), 'ses_calls': ses.calls}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=20000)
+    parser.add_argument('--shards', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--ses-latency', type=float, default=0.01, help='seconds per fake SES call')
+    parser.add_argument('--scan-latency', type=float, default=0.0, help='seconds per fake scan page')
+    parser.add_argument('--pages', default=os.path.join(ROOT, 'scripts', 'fixtures', 'pages'))
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    server = serve(args.pages, 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    snapshots = tempfile.mkdtemp(prefix='cu-dining-snapshots-')
+    os.environ['DINING_BASE_URL'] = f'http://127.0.0.1:{server.server_port}/'
+    # The fixture pages are plain HTML; SCRAPE_ENGINE defaults to the browser
+    os.environ.setdefault('SCRAPE_ENGINE', 'http')
+    os.environ['SNAPSHOT_STORE'] = snapshots
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import main as app
+
+    # Coordinator half: scrape once and publish the snapshot the workers read
+    scraper = app.ColumbiaDiningScraper()
+    scraper._scrape_locations_selenium = lambda only=None: print(f"Skipping browser for {len(only or [])} location(s)")
+    snapshot = app.prepare_menus(scraper, app.open_snapshot_store(snapshots))
+    server.shutdown()
+    print(f"Published snapshot {snapshot.content_hash} to {snapshots}")
+
+    runs = []
+    for total_shards in args.shards:
+        events = [
+            {'mode': 'worker', 'shard': shard, 'total_shards': total_shards,
+             'date': snapshot.date, 'content_hash': snapshot.content_hash}
+            for shard in range(total_shards)
+        ]
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=total_shards, initializer=_init_worker, initargs=(args,)) as pool:
+            shards = list(pool.map(run_shard, events))
+        elapsed = time.perf_counter() - start
+        recipients = sum(shard['recipients'] for shard in shards)
+        runs.append({
+            'shards': total_shards,
+            'seconds': round(elapsed, 4),
+            'users': sum(shard['users'] for shard in shards),
+            'recipients': recipients,
+            'recipients_per_second': round(recipients / max(elapsed, 1e-9)),
+            'slowest_shard': max(shard['seconds'] for shard in shards),
+            'per_shard': shards,
+        })
+        print(f"{total_shards} shard(s): {elapsed:.3f}s, {recipients} recipients")
+
+    output = {
+        'commit': git_commit(),
+        'timestamp': time.time(),
+        'config': vars(args),
+        'cpus': os.cpu_count(),
+        'runs': runs,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+        print(f"Wrote {args.output}")
+    else:
+        print(json.dumps(output, indent=2))
+
+
+if __name__ == '__main__':
+    main()
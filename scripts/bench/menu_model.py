@@ -0,0 +1,100 @@
+import argparse
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from main import ColumbiaDiningScraper, MenuIndex, parse_preference_signature, preference_signature
+
+# Reports memory per scraped day and per-item filter cost for the menu model:
+#   python scripts/bench/menu_model.py --stations 8 --items 15
+# Compare the numbers across commits to catch regressions.
+
+ALLERGENS = ['Milk', 'Eggs', 'Fish', 'Shellfish', 'Tree Nuts', 'Peanuts', 'Wheat', 'Soy', 'Sesame', 'Gluten']
+PREFS = ['', 'Vegetarian', 'Vegan', 'Halal', 'Vegan, Halal']
+
+
+def synthetic_day(scraper: ColumbiaDiningScraper, stations: int, items: int):
+    """Fill every location with menu tabs as if it had been scraped, using the real parse path."""
+    rng = random.Random(0)
+    for location in scraper.locations.values():
+        location.open_today = True
+        location.open_times = '11:00 AM - 8:00 PM'
+        meals = {
+            meal_type: [
+                {
+                    'station': f'Station {s}',
+                    'items': [
+                        {
+                            'title': f'{location.name} {meal_type} dish {s}-{i}',
+                            'prefs': rng.choice(PREFS),
+                            'allergens': 'Contains: ' + ', '.join(rng.sample(ALLERGENS, rng.randint(1, 4))),
+                        }
+                        for i in range(items)
+                    ],
+                }
+                for s in range(stations)
+            ]
+            for meal_type in location.menus
+        }
+        scraper._apply_raw_meals(location.menus, meals)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stations', type=int, default=8)
+    parser.add_argument('--items', type=int, default=15)
+    parser.add_argument('--users', type=int, default=2000)
+    args = parser.parse_args()
+
+    scraper = ColumbiaDiningScraper()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    synthetic_day(scraper, args.stations, args.items)
+    after = tracemalloc.take_snapshot()
+    day_bytes = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    tracemalloc.stop()
+
+    item_count = sum(
+        len(items)
+        for location in scraper.locations.values()
+        for stations in location.menus.values()
+        for items in stations.values()
+    )
+    print(f"Items per day: {item_count}")
+    print(f"Memory per day: {day_bytes / 1024:.1f} KiB ({day_bytes / max(item_count, 1):.0f} bytes/item)")
+
+    start = time.perf_counter()
+    index = MenuIndex(scraper.locations)
+    print(f"Index build: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    rng = random.Random(1)
+    users = [
+        {
+            'is_vegetarian': rng.random() < 0.2,
+            'is_vegan': rng.random() < 0.1,
+            'is_halal': rng.random() < 0.1,
+            'unavailable_foods': rng.sample([a.lower() for a in ALLERGENS], rng.randint(0, 3)),
+        }
+        for _ in range(args.users)
+    ]
+    preferences = [parse_preference_signature(preference_signature(user)) for user in users]
+
+    start = time.perf_counter()
+    for prefs in preferences:
+        index.visible(prefs)
+    elapsed = time.perf_counter() - start
+    print(f"Filter: {elapsed / len(users) * 1e6:.1f} us/user, "
+          f"{elapsed / (len(users) * item_count) * 1e9:.2f} ns/item")
+
+    start = time.perf_counter()
+    for prefs in preferences:
+        index.format(prefs)
+    elapsed = time.perf_counter() - start
+    print(f"Filter + format: {elapsed / len(users) * 1e6:.1f} us/user")
+
+
+if __name__ == '__main__':
+    main()
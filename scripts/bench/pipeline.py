@@ -0,0 +1,219 @@
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+import zlib
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'scripts', 'fixtures'))
+from serve_fixtures import serve
+
+# Offline end-to-end benchmark: replays the recorded pages in scripts/fixtures/pages
+# and swaps DynamoDB and SES for in-memory stand-ins, then times every stage.
+#   python scripts/bench/pipeline.py --users 10000 --output bench.json
+# Compare the JSON output across commits.
+
+ALLERGENS = ['peanuts', 'tree nuts', 'shellfish', 'fish', 'eggs', 'milk', 'soy', 'wheat', 'sesame', 'gluten']
+
+
+class FakeUsersTable:
+    """In-memory stand-in for the users table's scan(), including Limit, segments and projections."""
+
+    def __init__(self, users, latency: float = 0.0):
+        self.users = users
+        self.latency = latency
+        self.calls = 0
+
+    def scan(self, **kwargs):
+        self.calls += 1
+        time.sleep(self.latency)
+        users = self.users
+        if 'TotalSegments' in kwargs:
+            users = [
+                user for user in users
+                if zlib.crc32(user['email'].encode()) % kwargs['TotalSegments'] == kwargs['Segment']
+            ]
+        start = kwargs.get('ExclusiveStartKey', {}).get('position', 0)
+        limit = kwargs.get('Limit', 1000)
+        page = users[start:start + limit]
+        attributes = set(kwargs.get('ExpressionAttributeNames', {}).values())
+        if attributes:
+            page = [{k: v for k, v in user.items() if k in attributes} for user in page]
+        response = {'Items': page}
+        if start + limit < len(users):
+            response['LastEvaluatedKey'] = {'position': start + limit}
+        return response
+
+
+class FakeSes:
+    """In-memory SES stand-in that sleeps `latency` seconds per call and records payload sizes."""
+
+    def __init__(self, latency: float = 0.05):
+        self.latency = latency
+        self.calls = 0
+        self.payload_bytes = 0
+        self._lock = threading.Lock()
+
+    def _record(self, payload: dict):
+        time.sleep(self.latency)
+        with self._lock:
+            self.calls += 1
+            self.payload_bytes += len(json.dumps(payload, default=str))
+
+    def send_bulk_templated_email(self, **kwargs):
+        self._record(kwargs)
+        return {'Status': [{'Status': 'Success', 'MessageId': 'fake'} for _ in kwargs['Destinations']]}
+
+    def send_raw_email(self, **kwargs):
+        self._record({'RawMessage': kwargs['RawMessage']['Data'].decode('utf-8', 'replace')})
+        return {'MessageId': 'fake'}
+
+    def get_send_quota(self):
+        return {'Max24HourSend': 1e9, 'MaxSendRate': 1e6, 'SentLast24Hours': 0}
+
+
+def synthetic_users(count: int, seed: int = 0):
+    """Users with a realistic skew: most share a few preference combinations, a long tail doesn't."""
+    rng = random.Random(seed)
+    users = []
+    for i in range(count):
+        foods = []
+        if rng.random() < 0.4:
+            foods = rng.sample(ALLERGENS[:4], rng.randint(1, 2))
+        if rng.random() < 0.05:
+            foods += rng.sample(ALLERGENS, rng.randint(1, 4))
+        users.append({
+            'email': f'user{i}@example.com',
+            'is_vegetarian': rng.random() < 0.2,
+            'is_vegan': rng.random() < 0.08,
+            'is_halal': rng.random() < 0.1,
+            'unavailable_foods': foods,
+        })
+    return users
+
+
+class Stages:
+    def __init__(self):
+        self.results = {}
+
+    def time(self, name, fn, **extra):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        self.results[name] = {'seconds': round(elapsed, 4), **extra}
+        print(f"{name}: {elapsed:.3f}s")
+        return result
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--segments', type=int, default=1)
+    parser.add_argument('--ses-latency', type=float, default=0.05, help='seconds per fake SES call')
+    parser.add_argument('--scan-latency', type=float, default=0.01, help='seconds per fake scan page')
+    parser.add_argument('--send-workers', type=int, help='concurrent SES calls (default SEND_THREADS)')
+    parser.add_argument('--checkpoint', help='checkpoint deliver_streaming into this directory')
+    parser.add_argument('--pages', default=os.path.join(ROOT, 'scripts', 'fixtures', 'pages'))
+    parser.add_argument('--browser', action='store_true', help='allow the Selenium fallback (needs Chrome)')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    server = serve(args.pages, 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['DINING_BASE_URL'] = f'http://127.0.0.1:{server.server_port}/'
+    # The fixture pages are plain HTML; SCRAPE_ENGINE defaults to the browser
+    os.environ.setdefault('SCRAPE_ENGINE', 'http')
+    import main as app
+
+    users = synthetic_users(args.users)
+    ses = FakeSes(args.ses_latency)
+    table = FakeUsersTable(users, args.scan_latency)
+    app._aws_clients['ses'] = ses
+    app._aws_clients['users_table'] = table
+
+    stages = Stages()
+    scraper = app.ColumbiaDiningScraper()
+    if not args.browser:
+        scraper._scrape_locations_selenium = lambda only=None: print(f"Skipping browser for {len(only or [])} location(s)")
+    stages.time('scrape_locations', scraper.scrape_locations)
+    stages.results['scrape_locations']['per_location'] = dict(scraper.scrape_seconds)
+    # Browser runs only: per-URL load time and bytes, to compare BROWSER_PROFILE settings
+    stages.results['scrape_locations']['page_loads'] = scraper.page_loads
+
+    scanned = stages.time('scan_users', lambda: list(app.iter_users(table, args.segments)))
+    stages.results['scan_users'].update(users=len(scanned), scan_calls=table.calls)
+
+    formatted = stages.time('format_menu_for_user', lambda: [
+        (user['email'], scraper.format_menu_for_user(user, scraper.locations)) for user in scanned
+    ])
+    stages.results['format_menu_for_user'].update(
+        users_per_second=round(len(scanned) / max(stages.results['format_menu_for_user']['seconds'], 1e-9)),
+        distinct_menus=scraper.format_cache_misses,
+    )
+
+    config = app.PipelineConfig(send_workers=args.send_workers or app.SEND_THREADS)
+
+    def send():
+        # The whole DeliveryPipeline, but menus are already cached by the format stage,
+        # so this is mostly pacing and sending the batches
+        pipeline = app.DeliveryPipeline(scraper, config)
+        return pipeline.run([scanned]), pipeline.batch_stats, pipeline.controller.report()
+
+    (results, batches, controller) = stages.time('send_batches', send)
+    latencies = sorted(batch['seconds'] for batch in batches) or [0]
+    stages.results['send_batches'].update(
+        recipients=len(results),
+        ses_calls=ses.calls,
+        payload_bytes=ses.payload_bytes,
+        recipients_per_second=round(len(results) / max(stages.results['send_batches']['seconds'], 1e-9)),
+        batch_p50=latencies[len(latencies) // 2],
+        batch_max=latencies[-1],
+        controller=controller,
+    )
+
+    # Whole streaming pipeline from a cold format cache: scan, format and send overlap
+    scraper._format_cache.clear()
+    calls_before = ses.calls
+    checkpoint = None
+    if args.checkpoint:
+        checkpoint = app.DeliveryCheckpoint(app.LocalCheckpointStore(args.checkpoint), f'bench-{time.time():.0f}')
+    streamed = stages.time('deliver_streaming', lambda: app.DeliveryPipeline(scraper, config, checkpoint=checkpoint).run(
+        app.iter_user_pages(table, args.segments)))
+    stages.results['deliver_streaming'].update(
+        recipients=len(streamed),
+        ses_calls=ses.calls - calls_before,
+        recipients_per_second=round(len(streamed) / max(stages.results['deliver_streaming']['seconds'], 1e-9)),
+        checkpointed=checkpoint.written if checkpoint else None,
+    )
+
+    output = {
+        'commit': git_commit(),
+        'timestamp': time.time(),
+        'config': vars(args),
+        'stages': stages.results,
+    }
+    server.shutdown()
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+        print(f"Wrote {args.output}")
+    else:
+        print(json.dumps(output, indent=2))
+
+
+if __name__ == '__main__':
+    main()
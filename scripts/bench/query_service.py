@@ -0,0 +1,168 @@
+import argparse
+import http.client
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'scripts', 'fixtures'))
+from serve_fixtures import serve as serve_fixtures
+from pipeline import git_commit
+
+# Load test for menu_service.py. Without --url it scrapes the recorded fixture pages
+# into a temporary snapshot store and starts the service in-process; with --url it
+# hits an already running instance. Each client keeps one connection open and sends
+# a mix of queries, revalidating with If-None-Match a --revalidate share of the time.
+#   python scripts/bench/query_service.py --clients 8 --seconds 10
+#   python scripts/bench/query_service.py --url http://127.0.0.1:8080
+
+QUERIES = [
+    '/menu',
+    '/menu?vegetarian=1',
+    '/menu?vegan=1&avoid=sesame',
+    '/menu?halal=1&avoid=peanuts,tree%20nuts',
+    '/menu?avoid=wheat,milk,eggs&meal=Lunch,Dinner',
+    '/menu?location=John%20Jay%20Dining%20Hall&meal=Breakfast',
+    '/menu?q=chicken',
+    '/menu?vegan=1&open_now=1',
+    '/menu?vegetarian=1&at=12:30',
+    '/locations',
+]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0.0
+
+
+def start_local_service(pages):
+    """Scrape the fixtures into a temporary store and serve it; returns the service URL."""
+    fixtures = serve_fixtures(pages, 0)
+    threading.Thread(target=fixtures.serve_forever, daemon=True).start()
+    snapshots = tempfile.mkdtemp(prefix='cu-dining-snapshots-')
+    os.environ['DINING_BASE_URL'] = f'http://127.0.0.1:{fixtures.server_port}/'
+    # The fixture pages are plain HTML; SCRAPE_ENGINE defaults to the browser
+    os.environ.setdefault('SCRAPE_ENGINE', 'http')
+    os.environ['SNAPSHOT_STORE'] = snapshots
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import main as app
+    import menu_service
+
+    scraper = app.ColumbiaDiningScraper()
+    scraper._scrape_locations_selenium = lambda only=None: print(f"Skipping browser for {len(only or [])} location(s)")
+    app.prepare_menus(scraper, app.open_snapshot_store(snapshots))
+    fixtures.shutdown()
+
+    server = menu_service.serve(app.open_snapshot_store(snapshots), port=0, reload_seconds=0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}', server
+
+
+def measure_in_process(server, repeat):
+    """Time the index query + formatting alone, without HTTP, for every query."""
+    from urllib.parse import parse_qs
+    service = server.menu_service
+    index = service.index
+    results = {}
+    for path in QUERIES:
+        url = urlsplit(path)
+        if url.path != '/menu':
+            continue
+        params = parse_qs(url.query)
+        start = time.perf_counter()
+        for _ in range(repeat):
+            index.format_rows(service.query(index, params))
+        results[path] = round((time.perf_counter() - start) / repeat * 1e6, 1)
+    return results
+
+
+def client(url, deadline, revalidate, seed, stats):
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port, timeout=10)
+    rng = random.Random(seed)
+    etags = {}
+    latencies = []
+    statuses = {}
+    while time.perf_counter() < deadline:
+        path = rng.choice(QUERIES)
+        headers = {}
+        if path in etags and rng.random() < revalidate:
+            headers['If-None-Match'] = etags[path]
+        start = time.perf_counter()
+        connection.request('GET', path, headers=headers)
+        response = connection.getresponse()
+        response.read()
+        latencies.append(time.perf_counter() - start)
+        statuses[response.status] = statuses.get(response.status, 0) + 1
+        if response.getheader('ETag'):
+            etags[path] = response.getheader('ETag')
+    connection.close()
+    stats.append((latencies, statuses))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--url', help='query an already running service instead of starting one')
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--revalidate', type=float, default=0.5,
+                        help='share of repeat queries sent with If-None-Match')
+    parser.add_argument('--pages', default=os.path.join(ROOT, 'scripts', 'fixtures', 'pages'))
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    results = {}
+    server = None
+    url = args.url
+    if not url:
+        url, server = start_local_service(args.pages)
+        results['in_process_us'] = measure_in_process(server, 1000)
+
+    stats = []
+    deadline = time.perf_counter() + args.seconds
+    threads = [
+        threading.Thread(target=client, args=(url, deadline, args.revalidate, seed, stats))
+        for seed in range(args.clients)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if server:
+        server.shutdown()
+
+    latencies = [latency for client_latencies, _ in stats for latency in client_latencies]
+    statuses = {}
+    for _, client_statuses in stats:
+        for status, count in client_statuses.items():
+            statuses[str(status)] = statuses.get(str(status), 0) + count
+    results['http'] = {
+        'requests': len(latencies),
+        'seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / max(elapsed, 1e-9)),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'statuses': statuses,
+    }
+    print(f"{len(latencies)} requests in {elapsed:.2f}s, p50 {results['http']['p50_ms']}ms, statuses {statuses}")
+
+    output = {'commit': git_commit(), 'timestamp': time.time(), 'config': vars(args), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+        print(f"Wrote {args.output}")
+    else:
+        print(json.dumps(output, indent=2))
+
+
+if __name__ == '__main__':
+    main()
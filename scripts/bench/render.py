@@ -0,0 +1,105 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'scripts', 'fixtures'))
+from serve_fixtures import serve
+from pipeline import FakeSes, synthetic_users, git_commit
+
+# Compares SES-rendered templated bulk email with the local renderer + raw email:
+# render throughput (cold and cached) and bytes sent to SES per recipient.
+# --preview writes one rendered message as an .eml file to open in a mail client.
+#   python scripts/bench/render.py --users 10000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--pages', default=os.path.join(ROOT, 'scripts', 'fixtures', 'pages'))
+    parser.add_argument('--preview', help='also write the first rendered message to this .eml file')
+    parser.add_argument('--output', help='write results as JSON to this file')
+    args = parser.parse_args()
+
+    server = serve(args.pages, 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    os.environ['DINING_BASE_URL'] = f'http://127.0.0.1:{server.server_port}/'
+    # The fixture pages are plain HTML; SCRAPE_ENGINE defaults to the browser
+    os.environ.setdefault('SCRAPE_ENGINE', 'http')
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    import main as app
+    import email_template
+
+    scraper = app.ColumbiaDiningScraper()
+    scraper._scrape_locations_selenium = lambda only=None: None
+    scraper.scrape_locations()
+    server.shutdown()
+    users = synthetic_users(args.users)
+    menus = [(user['email'], scraper.format_menu_for_user(user, scraper.locations)) for user in users]
+    menus = [(email, menu) for email, menu in menus if menu]
+    distinct = list({id(menu): menu for _, menu in menus}.values())
+    results = {}
+
+    start = time.perf_counter()
+    for part in (email_template.SUBJECT_PART, email_template.TEXT_PART, email_template.HTML_PART):
+        email_template.compile_template(part)
+    results['compile_ms'] = round((time.perf_counter() - start) * 1000, 3)
+
+    renderer = app.LocalRenderer(scraper)
+    start = time.perf_counter()
+    sizes = [len(renderer.message(menu)) for menu in distinct]
+    elapsed = time.perf_counter() - start
+    results['render_cold'] = {
+        'menus': len(distinct),
+        'seconds': round(elapsed, 4),
+        'renders_per_second': round(len(distinct) / max(elapsed, 1e-9)),
+        'avg_message_bytes': round(sum(sizes) / len(sizes)),
+    }
+    if args.preview:
+        with open(args.preview, 'wb') as f:
+            f.write(f"To: {menus[0][0]}\r\n".encode() + renderer.message(menus[0][1]))
+        print(f"Wrote preview to {args.preview}")
+
+    start = time.perf_counter()
+    for _, menu in menus:
+        renderer.message(menu)
+    elapsed = time.perf_counter() - start
+    results['render_cached'] = {
+        'recipients': len(menus),
+        'seconds': round(elapsed, 4),
+        'lookups_per_second': round(len(menus) / max(elapsed, 1e-9)),
+    }
+
+    # Bytes handed to SES for the same recipients on each path
+    for mode, send_batch in (('templated', None), ('local', renderer.send_batch)):
+        ses = FakeSes(0.0)
+        app._aws_clients['ses'] = ses
+        pipeline = app.DeliveryPipeline(scraper, send_batch=send_batch)
+        pipeline.controller.max_rate = 1e9
+        start = time.perf_counter()
+        sent = pipeline.run([users])
+        elapsed = time.perf_counter() - start
+        results[f'send_{mode}'] = {
+            'recipients': len(sent),
+            'seconds': round(elapsed, 4),
+            'ses_calls': ses.calls,
+            'payload_bytes': ses.payload_bytes,
+            'bytes_per_recipient': round(ses.payload_bytes / max(len(sent), 1)),
+        }
+        print(f"{mode}: {ses.calls} SES calls, {ses.payload_bytes / max(len(sent), 1):.0f} bytes/recipient")
+
+    output = {'commit': git_commit(), 'timestamp': time.time(), 'config': vars(args), 'results': results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(output, f, indent=2)
+        print(f"Wrote {args.output}")
+    else:
+        print(json.dumps(output, indent=2))
+
+
+if __name__ == '__main__':
+    main()
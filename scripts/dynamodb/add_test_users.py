@@ -1,5 +1,10 @@
 
 import boto3
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+from main import preference_signature
 
 # Initialize DynamoDB resource
 dynamodb = boto3.resource('dynamodb', region_name='us-east-1')  # replace with your region
@@ -15,8 +20,9 @@ test_users = [
     }
 ]
 
-# Insert data
+# Insert data (bulk_users.py does the same for whole files)
 for user in test_users:
+    user['preference_signature'] = preference_signature(user)
     try:
         table.put_item(Item=user)
         print(f"Inserted user {user['email']} successfully.")
@@ -0,0 +1,234 @@
+import argparse
+import csv
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+import main
+from main import preference_signature
+
+# Bulk import / export for the users table. Every imported user gets a normalised
+# preference_signature attribute (see main.preference_signature) that the
+# preference_signature-index GSI is keyed on. With USER_SCAN_INDEX=preference_signature-index
+# the send job scans that index, so users sharing preferences arrive together. It's only
+# an ordering hint: the send job recomputes the signature from the raw fields, since other
+# writers (the dashboard) don't keep it up to date, and reads users without one from the table.
+#   python scripts/dynamodb/bulk_users.py import users.csv --writers 8
+#   python scripts/dynamodb/bulk_users.py export users.jsonl
+#   python scripts/dynamodb/bulk_users.py backfill       # add signatures to existing users
+#   python scripts/dynamodb/bulk_users.py create-index
+# CSV columns: email,is_vegetarian,is_vegan,is_halal,unavailable_foods (foods separated by ';').
+# JSONL: one user object per line. DYNAMODB_ENDPOINT_URL points it at DynamoDB Local.
+
+TABLE_NAME = 'users'
+INDEX_NAME = 'preference_signature-index'
+BATCH_SIZE = 25  # BatchWriteItem limit
+FIELDS = ('email', 'is_vegetarian', 'is_vegan', 'is_halal', 'unavailable_foods')
+
+
+def _bool(value) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 'yes', 'y')
+    return bool(value)
+
+
+def normalise_user(record: dict) -> dict:
+    """A users table item from a CSV row or JSON object, with its preference signature."""
+    email = str(record.get('email') or '').strip()
+    if not email:
+        raise ValueError(f"User without an email: {record}")
+    foods = record.get('unavailable_foods') or []
+    if isinstance(foods, str):
+        foods = foods.split(';')
+    user = {
+        'email': email,
+        'is_vegetarian': _bool(record.get('is_vegetarian')),
+        'is_vegan': _bool(record.get('is_vegan')),
+        'is_halal': _bool(record.get('is_halal')),
+        'unavailable_foods': [str(food).strip() for food in foods if str(food).strip()],
+    }
+    user['preference_signature'] = preference_signature(user)
+    return user
+
+
+def _format(path: str, fmt: str = None) -> str:
+    if fmt:
+        return fmt
+    return 'csv' if path.endswith('.csv') else 'jsonl'
+
+
+def read_users(path: str, fmt: str = None):
+    """Stream users from a CSV or JSONL file ('-' for stdin)."""
+    f = sys.stdin if path == '-' else open(path, newline='')
+    try:
+        if _format(path, fmt) == 'csv':
+            for row in csv.DictReader(f):
+                yield normalise_user(row)
+        else:
+            for line in f:
+                if line.strip():
+                    yield normalise_user(json.loads(line))
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+
+def write_users(path: str, users, fmt: str = None) -> int:
+    """Write users to a CSV or JSONL file ('-' for stdout); returns how many."""
+    f = sys.stdout if path == '-' else open(path, 'w', newline='')
+    count = 0
+    try:
+        if _format(path, fmt) == 'csv':
+            writer = csv.DictWriter(f, fieldnames=FIELDS + ('preference_signature',), extrasaction='ignore')
+            writer.writeheader()
+            for user in users:
+                writer.writerow({**user, 'unavailable_foods': ';'.join(user.get('unavailable_foods') or [])})
+                count += 1
+        else:
+            for user in users:
+                f.write(json.dumps(user, default=str) + '\n')
+                count += 1
+    finally:
+        if f is not sys.stdout:
+            f.close()
+    return count
+
+
+class BulkWriter:
+    """
+    Writes users with `writers` threads sending 25-item BatchWriteItem calls.
+    UnprocessedItems are resent with full-jitter exponential backoff, which
+    Table.batch_writer() doesn't do (it resends them straight away).
+    """
+
+    def __init__(self, table_name: str = TABLE_NAME, writers: int = 8, max_attempts: int = 8,
+                 base_delay: float = 0.05, dynamodb=None):
+        self.table_name = table_name
+        self.writers = writers
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.dynamodb = dynamodb or main.aws_client('dynamodb')
+        self.written = 0
+        self.calls = 0
+        self.retried = 0
+        self._lock = threading.Lock()
+
+    def write(self, users) -> dict:
+        """Write every user from an iterable, keeping at most 2 batches per writer in flight."""
+        start = time.perf_counter()
+        slots = threading.Semaphore(self.writers * 2)
+        futures = []
+        with ThreadPoolExecutor(max_workers=self.writers) as pool:
+            batch = {}
+            for user in users:
+                # BatchWriteItem rejects duplicate keys in one call; the last row wins
+                batch[user['email']] = user
+                if len(batch) == BATCH_SIZE:
+                    slots.acquire()
+                    futures.append(pool.submit(self._write_batch, list(batch.values()), slots))
+                    batch = {}
+            if batch:
+                slots.acquire()
+                futures.append(pool.submit(self._write_batch, list(batch.values()), slots))
+            for future in futures:
+                future.result()
+        return self.report(time.perf_counter() - start)
+
+    def _write_batch(self, items, slots):
+        try:
+            requests = [{'PutRequest': {'Item': item}} for item in items]
+            for attempt in range(self.max_attempts):
+                response = self.dynamodb.batch_write_item(RequestItems={self.table_name: requests})
+                unprocessed = response.get('UnprocessedItems', {}).get(self.table_name, [])
+                with self._lock:
+                    self.calls += 1
+                    self.written += len(requests) - len(unprocessed)
+                    self.retried += len(unprocessed)
+                if not unprocessed:
+                    return
+                requests = unprocessed
+                time.sleep(random.uniform(0, self.base_delay * 2 ** attempt))
+            raise RuntimeError(f"{len(requests)} users still unprocessed after {self.max_attempts} attempts")
+        finally:
+            slots.release()
+
+    def report(self, seconds: float) -> dict:
+        return {
+            'written': self.written,
+            'calls': self.calls,
+            'retried': self.retried,
+            'seconds': round(seconds, 3),
+            'users_per_second': round(self.written / max(seconds, 1e-9)),
+        }
+
+
+def scan_all(table):
+    """Every user in the table with all of their attributes."""
+    kwargs = {}
+    while True:
+        response = table.scan(**kwargs)
+        yield from response['Items']
+        if 'LastEvaluatedKey' not in response:
+            return
+        kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def backfill(table, writer: BulkWriter) -> dict:
+    """Rewrite the users whose stored preference signature is missing or out of date."""
+    def stale():
+        for user in scan_all(table):
+            signature = preference_signature(user)
+            if user.get('preference_signature') != signature:
+                yield {**user, 'preference_signature': signature}
+    return writer.write(stale())
+
+
+def create_index(table, read_capacity: int = None, write_capacity: int = None):
+    """
+    Add the preference_signature GSI for USER_SCAN_INDEX. It projects the raw preference
+    fields the send job reads; users without a stored signature aren't in it at all.
+    """
+    index = {
+        'IndexName': INDEX_NAME,
+        'KeySchema': [{'AttributeName': 'preference_signature', 'KeyType': 'HASH'}],
+        'Projection': {'ProjectionType': 'INCLUDE', 'NonKeyAttributes': list(FIELDS[1:])},
+    }
+    if read_capacity and write_capacity:
+        # Provisioned tables need the index's own capacity; on-demand tables must not set it
+        index['ProvisionedThroughput'] = {'ReadCapacityUnits': read_capacity, 'WriteCapacityUnits': write_capacity}
+    return table.meta.client.update_table(
+        TableName=table.name,
+        AttributeDefinitions=[{'AttributeName': 'preference_signature', 'AttributeType': 'S'}],
+        GlobalSecondaryIndexUpdates=[{'Create': index}],
+    )
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('command', choices=['import', 'export', 'backfill', 'create-index'])
+    parser.add_argument('path', nargs='?', default='-', help="CSV or JSONL file, '-' for stdin/stdout")
+    parser.add_argument('--format', choices=['csv', 'jsonl'], help='defaults to the file extension')
+    parser.add_argument('--table', default=TABLE_NAME)
+    parser.add_argument('--writers', type=int, default=8)
+    parser.add_argument('--read-capacity', type=int)
+    parser.add_argument('--write-capacity', type=int)
+    args = parser.parse_args()
+
+    table = main.aws_client('dynamodb').Table(args.table)
+    writer = BulkWriter(args.table, args.writers)
+    if args.command == 'import':
+        print(json.dumps(writer.write(read_users(args.path, args.format))), file=sys.stderr)
+    elif args.command == 'export':
+        count = write_users(args.path, scan_all(table), args.format)
+        print(f"Exported {count} users", file=sys.stderr)
+    elif args.command == 'backfill':
+        print(json.dumps(backfill(table, writer)), file=sys.stderr)
+    else:
+        create_index(table, args.read_capacity, args.write_capacity)
+        print(f"Creating {INDEX_NAME} on {args.table}; run backfill to index users added by other writers",
+              file=sys.stderr)
@@ -0,0 +1,43 @@
+import argparse
+import glob
+import json
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+sys.path.insert(0, ROOT)
+
+# Decodes network responses captured with CAPTURE_NETWORK=1 CAPTURE_DIR=... offline,
+# so decoder changes can be checked without a browser:
+#   python scripts/fixtures/decode_captures.py                # every file in captures/
+#   python scripts/fixtures/decode_captures.py captures/jjs-place-0.json --json
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('paths', nargs='*',
+                        default=sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'captures', '*.json'))))
+    parser.add_argument('--json', action='store_true', help='print the decoded meals instead of a summary')
+    args = parser.parse_args()
+
+    import main as app
+
+    failed = False
+    for path in args.paths:
+        with open(path) as f:
+            capture = json.load(f)
+        meals = app.decode_captured_menus(capture['responses'], capture['meal_types'])
+        if args.json:
+            print(json.dumps({capture['location']: meals}, indent=2))
+            continue
+        items = sum(len(station['items']) for stations in meals.values() for station in stations)
+        print(f"{os.path.basename(path)}: {capture['location']} - {len(capture['responses'])} responses, "
+              f"{len(meals)} meals, {items} items")
+        for meal_type, stations in meals.items():
+            print(f"  {meal_type}: {', '.join(station['station'] for station in stations)}")
+        failed = failed or not items
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+import argparse
+import os
+from datetime import date, datetime
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+from zoneinfo import ZoneInfo
+
+# Serves hand-written pages modelled on the dining site's markup (not saved copies
+# of the live site) so the scraper can run offline:
+#   python scripts/fixtures/serve_fixtures.py --port 8000
+#   DINING_BASE_URL=http://127.0.0.1:8000/ python main.py
+# "/" maps to index.html and "/content/<slug>" to content/<slug>.html. A ?date= that
+# is N days after today serves days/N/<page> instead when that file exists, like the
+# site's day picker; other dates get today's page, like a site ignoring the parameter.
+# Days are counted on campus (DINING_TIMEZONE), like the site and the scraper.
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    def translate_path(self, path):
+        path, _, query = path.split('#', 1)[0].partition('?')
+        if path == '/':
+            path = '/index.html'
+        elif not os.path.splitext(path)[1]:
+            path += '.html'
+        dated = self._dated_path(path, parse_qs(query).get('date', [''])[-1])
+        return super().translate_path(dated or path)
+
+    @staticmethod
+    def _today():
+        return datetime.now(ZoneInfo(os.environ.get('DINING_TIMEZONE', 'America/New_York'))).date()
+
+    def _dated_path(self, path, requested):
+        try:
+            offset = (date.fromisoformat(requested) - self._today()).days
+        except ValueError:
+            return None
+        dated = f'/days/{offset}{path}'
+        return dated if os.path.isfile(super().translate_path(dated)) else None
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} {format % args}")
+
+
+def serve(directory: str, port: int):
+    handler = partial(FixtureHandler, directory=directory)
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    print(f"Serving {directory} on http://127.0.0.1:{server.server_port}/")
+    return server
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--dir', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pages'))
+    args = parser.parse_args()
+    serve(args.dir, args.port).serve_forever()
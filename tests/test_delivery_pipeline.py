@@ -0,0 +1,197 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+import main
+
+MENU = [{'name': 'John Jay Dining Hall', 'open_times': '', 'meals': []}]
+
+
+class FakeScraper:
+    """Just what DeliveryPipeline reads from the scraper: every user gets the same menu."""
+    locations = {}
+
+    def format_menu_for_user(self, user, locations):
+        if user.get('broken'):
+            raise ValueError('bad preferences')
+        return MENU
+
+
+class FakeCheckpoint:
+    def __init__(self):
+        self.recorded = []
+        self.closed = False
+
+    def should_skip(self, email):
+        return False
+
+    def record(self, emails):
+        self.recorded.extend(emails)
+
+    def close(self):
+        self.closed = True
+
+
+def user_pages(count, page_size=10, read=None, fail_after=None):
+    """Pages of users; `read` counts pages handed out, `fail_after` raises after that many pages."""
+    for start in range(0, count, page_size):
+        if fail_after is not None and start // page_size == fail_after:
+            raise RuntimeError('scan failed')
+        if read is not None:
+            read.append(start)
+        yield [{'email': f'user{i}@example.com'} for i in range(start, min(start + page_size, count))]
+
+
+def make_pipeline(send_batch, **config):
+    config = main.PipelineConfig(**{'queue_size': 20, 'send_workers': 2, 'batch_size': 5, **config})
+    pipeline = main.DeliveryPipeline(FakeScraper(), config, send_batch=send_batch, checkpoint=FakeCheckpoint())
+    pipeline.controller.max_rate = 1e9
+    return pipeline
+
+
+def run_in_thread(pipeline, pages):
+    """Start pipeline.run(pages) on a daemon thread, so a hang fails the test instead of the run."""
+    outcome = {}
+
+    def target():
+        try:
+            outcome['results'] = pipeline.run(pages)
+        except BaseException as e:
+            outcome['error'] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread, outcome
+
+
+def finish(thread, outcome, timeout=10):
+    thread.join(timeout)
+    assert not thread.is_alive(), 'pipeline hung'
+    return outcome
+
+
+def succeed(emails, formatted_menu):
+    return [{'Status': 'Success'} for _ in emails]
+
+
+def test_delivers_every_user():
+    pipeline = make_pipeline(succeed)
+    results = pipeline.run(user_pages(500))
+    assert len(results) == 500
+    assert set(results.values()) == {'Success'}
+    assert len(pipeline.checkpoint.recorded) == 500
+    assert pipeline.checkpoint.closed
+
+
+def test_full_queue_stops_reading_until_sends_catch_up():
+    release = threading.Event()
+    read = []
+
+    def blocked(emails, formatted_menu):
+        release.wait(10)
+        return succeed(emails, formatted_menu)
+
+    pipeline = make_pipeline(blocked, send_workers=1)
+    thread, outcome = run_in_thread(pipeline, user_pages(1000, read=read))
+    time.sleep(0.5)
+    # 20 queued users, 4 queued batches, one batch in flight and a partial one: far from 100 pages
+    assert len(read) < 15
+    release.set()
+    outcome = finish(thread, outcome)
+    assert len(outcome['results']) == 1000
+    assert len(read) == 100
+
+
+@pytest.mark.parametrize('drain', [True, False])
+def test_stop(drain):
+    calls = []
+
+    def stop_on_first_call(emails, formatted_menu):
+        if not calls:
+            pipeline.stop()
+            time.sleep(0.2)
+        calls.append(len(emails))
+        return succeed(emails, formatted_menu)
+
+    pipeline = make_pipeline(stop_on_first_call, drain=drain)
+    thread, outcome = run_in_thread(pipeline, user_pages(5000))
+    results = finish(thread, outcome)['results']
+    statuses = list(results.values())
+
+    assert pipeline.user_count < 5000
+    # Every user that was read gets a status either way
+    assert len(results) == pipeline.user_count
+    if drain:
+        assert set(statuses) == {'Success'}
+    else:
+        assert 'Skipped' in statuses
+        assert statuses.count('Success') == sum(calls)
+    assert sorted(pipeline.checkpoint.recorded) == sorted(e for e, s in results.items() if s == 'Success')
+
+
+def test_stop_before_run_reads_nothing():
+    read = []
+    pipeline = make_pipeline(succeed)
+    pipeline.stop()
+    assert pipeline.run(user_pages(2000, read=read)) == {}
+    assert read == [] and pipeline.user_count == 0
+
+
+def test_deliver_with_no_time_left_does_not_scan(monkeypatch):
+    read = []
+    monkeypatch.setattr(main, 'get_users_table', lambda: None)
+    monkeypatch.setattr(main, 'iter_user_pages', lambda table, segments, shard, total_shards: user_pages(2000, read=read))
+
+    class Context:
+        def get_remaining_time_in_millis(self):
+            return (main.SHUTDOWN_MARGIN_SECONDS - 5) * 1000
+
+    scraper = FakeScraper()
+    scraper.format_cache_hits = scraper.format_cache_misses = 0
+    scraper.send_bulk_email = succeed
+    pipeline = main.deliver(scraper, Context())
+    assert read == [] and pipeline.results == {}
+
+
+def test_bad_user_is_recorded_not_fatal():
+    pages = list(user_pages(500))
+    pages[3][4] = {'broken': True}
+    pages[7][1] = {'email': 'broken@example.com', 'broken': True}
+    pipeline = make_pipeline(succeed, queue_size=10)
+    results = finish(*run_in_thread(pipeline, pages))['results']
+
+    assert results['broken@example.com'].startswith('Error: ')
+    assert any(email.startswith('<user') for email in results)
+    assert sum(1 for status in results.values() if status == 'Success') == 498
+
+
+def test_scan_failure_with_full_queue_raises_instead_of_hanging():
+    def slow(emails, formatted_menu):
+        time.sleep(0.02)
+        return succeed(emails, formatted_menu)
+
+    pipeline = make_pipeline(slow, send_workers=1, queue_size=10)
+    outcome = finish(*run_in_thread(pipeline, user_pages(500, fail_after=10)))
+
+    assert isinstance(outcome.get('error'), RuntimeError)
+    assert pipeline.checkpoint.closed
+    # Users formatted before the failure were still sent and checkpointed
+    assert pipeline.checkpoint.recorded
+
+
+def test_format_failure_with_full_queue_raises_instead_of_hanging(monkeypatch):
+    pipeline = make_pipeline(succeed, queue_size=10)
+
+    async def crashing_format_stage(users, batches):
+        # Let the producer fill the queue and block on put() first
+        while not users.full():
+            await asyncio.sleep(0.01)
+        raise RuntimeError('format stage crashed')
+
+    monkeypatch.setattr(pipeline, '_format_stage', crashing_format_stage)
+    outcome = finish(*run_in_thread(pipeline, user_pages(500)))
+
+    assert isinstance(outcome.get('error'), RuntimeError)
+    assert pipeline.checkpoint.closed
@@ -0,0 +1,45 @@
+import email
+import json
+import os
+from email import policy
+
+import pytest
+
+import main
+from email_template import HTML_PART, SUBJECT_PART, TEXT_PART, compile_template
+
+# menu_email.* were rendered from menu_email.json by handlebars.js 4.7.8, the engine
+# SES templates use, so they're what SES sends for TEMPLATE. The data covers a
+# location with no meals, items without dietary info or allergens, and '&', '<'
+# and quotes in names, which Handlebars escapes in every part, text included.
+GOLDEN = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden')
+PARTS = {'subject': (SUBJECT_PART, 'subject.txt'), 'text': (TEXT_PART, 'text.txt'), 'html': (HTML_PART, 'html')}
+
+
+def golden(name):
+    with open(os.path.join(GOLDEN, f'menu_email.{name}'), newline='') as f:
+        return f.read()
+
+
+@pytest.fixture(scope='module')
+def data():
+    with open(os.path.join(GOLDEN, 'menu_email.json')) as f:
+        return json.load(f)
+
+
+@pytest.mark.parametrize('part', PARTS)
+def test_template_renders_like_handlebars(part, data):
+    source, name = PARTS[part]
+    assert compile_template(source)(data) == golden(name)
+
+
+def test_local_renderer_message_matches_ses(data):
+    message = email.message_from_bytes(main.LocalRenderer(None).render(data), policy=policy.default)
+
+    def content(subtype):
+        # The SMTP policy sends CRLF and ends every part with a newline
+        return message.get_body((subtype,)).get_content().replace('\r\n', '\n')
+
+    assert message['Subject'] == golden('subject.txt')
+    assert content('plain') == golden('text.txt')
+    assert content('html') == golden('html') + '\n'
@@ -0,0 +1,40 @@
+import os
+import re
+import shutil
+import threading
+
+import main
+from serve_fixtures import serve
+
+PAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts', 'fixtures', 'pages')
+
+
+def scrape_over_http(pages, monkeypatch):
+    """scrape_locations() on the 'http' engine; returns what was handed to the browser."""
+    server = serve(str(pages), 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(main.ColumbiaDiningScraper, 'BASE_URL', f'http://127.0.0.1:{server.server_port}/')
+    monkeypatch.setattr(main, 'SCRAPE_ENGINE', 'http')
+    handed_over = []
+    monkeypatch.setattr(main.ColumbiaDiningScraper, '_scrape_locations_selenium',
+                        lambda self, only=None: handed_over.append(only))
+    try:
+        main.ColumbiaDiningScraper().scrape_locations()
+    finally:
+        server.shutdown()
+    return handed_over
+
+
+def test_only_unreadable_locations_go_to_the_browser(monkeypatch):
+    [pending] = scrape_over_http(PAGES, monkeypatch)
+    assert [location.name for location in pending] == ["JJ's Place"]
+
+
+def test_homepage_without_open_hours_falls_back_to_the_browser(tmp_path, monkeypatch):
+    # As if the opening hours were only filled in client side
+    pages = tmp_path / 'pages'
+    shutil.copytree(PAGES, pages)
+    index = pages / 'index.html'
+    index.write_text(re.sub(r'(<div class="open-time">).*?(</div>)', r'\1\2', index.read_text()))
+
+    assert scrape_over_http(pages, monkeypatch) == [None]
@@ -0,0 +1,196 @@
+import json
+import os
+import shutil
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+import main
+from serve_fixtures import serve
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts', 'fixtures')
+
+
+def load_version(name):
+    with open(os.path.join(FIXTURES, 'versions', name)) as f:
+        return json.load(f)
+
+
+def previous_run(scraper, locations):
+    """The parts of a MenuSnapshot that scrape_locations() compares against."""
+    return SimpleNamespace(fingerprints=scraper.fingerprints, locations=locations, scrape_seconds={})
+
+
+def test_http_rescrape_re_extracts_a_location_whose_later_meal_changed(tmp_path, monkeypatch):
+    pages = tmp_path / 'pages'
+    shutil.copytree(os.path.join(FIXTURES, 'pages'), pages)
+    server = serve(str(pages), 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(main.ColumbiaDiningScraper, 'BASE_URL', f'http://127.0.0.1:{server.server_port}/')
+    monkeypatch.setattr(main, 'SCRAPE_ENGINE', 'http')
+    monkeypatch.setattr(main.ColumbiaDiningScraper, '_scrape_locations_selenium', lambda self, only=None: None)
+    try:
+        first = main.ColumbiaDiningScraper()
+        first.scrape_locations()
+        # Version 2 differs only in the second meal, "Lunch & Dinner"
+        shutil.copy(os.path.join(FIXTURES, 'versions', 'john-jay-dining-hall-v2.html'),
+                    pages / 'content' / 'john-jay-dining-hall.html')
+        second = main.ColumbiaDiningScraper()
+        second.scrape_locations(previous=previous_run(first, first.locations))
+    finally:
+        server.shutdown()
+
+    assert 'John Jay Dining Hall' not in second.reused_locations
+    assert 'Ferris Booth Commons' in second.reused_locations
+    grill = second.locations['John Jay Dining Hall'].menus['Lunch & Dinner']['Grill']
+    assert 'Jerk Chicken Thighs' in grill and 'Halal Chicken Breast' not in grill
+
+
+def menu_api_payload(tabs):
+    """The tab fixture as the JSON the page's app fetches (the shape of pages/api/menus)."""
+    return {'data': {'menus': [
+        {'meal_period': {'name': meal}, 'station_list': [
+            {'station_title': station['station'], 'menu_items': [
+                {'label': item['title'],
+                 'preferences': [{'name': pref} for pref in item['prefs'].split(', ') if pref],
+                 'contains': [a for a in item['allergens'].replace('Contains:', '').split(', ') if a.strip()]}
+                for item in station['items']
+            ]} for station in stations
+        ]} for meal, stations in tabs.items()
+    ]}}
+
+
+class FakeDriver:
+    """Renders a {meal: stations} fixture the way the location page's tab bar does."""
+
+    def __init__(self, tabs, api=None):
+        self.tabs = tabs
+        self.active = next(iter(tabs))
+        self.found = None
+        self.clicks = 0
+        # Response body the page "fetched" on load, read back through the performance log
+        self.api = api
+        self.log = []
+
+    def get(self, url):
+        if self.api is not None:
+            self.log = [{'message': json.dumps({'message': {
+                'method': 'Network.responseReceived',
+                'params': {'requestId': '1', 'type': 'XHR', 'response': {'url': url + '/api', 'mimeType': 'application/json'}},
+            }})}]
+
+    def get_log(self, kind):
+        log, self.log = self.log, []
+        return log
+
+    def execute_cdp_cmd(self, command, params):
+        return {'body': json.dumps(self.api), 'base64Encoded': False}
+
+    def find_element(self, by, value):
+        # //button[text()='Dinner' and contains(@class, 'ng-binding')]
+        self.found = value.split("text()='", 1)[1].split("'", 1)[0]
+        return self
+
+    def is_displayed(self):
+        return True
+
+    def is_enabled(self):
+        return True
+
+    def execute_script(self, script, *args):
+        if script == main.MEAL_TAB_NAMES_JS:
+            return list(self.tabs)
+        if script == main.CLICK_MEAL_TAB_JS:
+            self.clicks += 1
+            was_active, self.active = self.active == self.found, self.found
+            return was_active
+        if script == main.MEAL_TAB_SWAPPED_JS:
+            return True
+        if script == main.EXTRACT_STATIONS_JS:
+            return self.tabs[self.active]
+        raise AssertionError(f'unexpected script: {script[:40]}')
+
+
+def scrape_with(scraper, version, api=None):
+    """Scrape a fixture version; `api` picks which meals the page's JSON covers (None: no JSON)."""
+    tabs = load_version(version)
+    payload = None if api is None else menu_api_payload({meal: tabs[meal] for meal in api})
+    location = main.DiningLocation(name="JJ's Place", url='http://example.invalid/jjs',
+                                   menus={meal: {} for meal in tabs}, open_today=True)
+    driver = FakeDriver(tabs, payload)
+    return location, scraper._scrape_location_page(location, driver), driver
+
+
+def rescrape(first, location, first_menus):
+    second = main.ColumbiaDiningScraper()
+    second.previous = previous_run(first, {location.name: main.DiningLocation(
+        name=location.name, url=location.url, menus=first_menus, open_today=True)})
+    return second
+
+
+def test_browser_rescrape_re_extracts_a_location_whose_non_default_tab_changed(monkeypatch):
+    pytest.importorskip('selenium')
+    monkeypatch.setattr(main, 'CAPTURE_NETWORK', False)
+    monkeypatch.setattr(main, 'EXTRACT_MODE', 'script')
+
+    first = main.ColumbiaDiningScraper()
+    location, first_menus, _ = scrape_with(first, 'jjs-place-tabs-v1.json')
+    assert 'Mozzarella Sticks' in first_menus['Dinner']['Grill']
+
+    # Version 2 differs only in Dinner, which isn't the tab the page opens on
+    second = rescrape(first, location, first_menus)
+    _, second_menus, _ = scrape_with(second, 'jjs-place-tabs-v2.json')
+
+    assert location.name not in second.reused_locations
+    assert 'Buffalo Cauliflower' in second_menus['Dinner']['Grill']
+    assert 'Mozzarella Sticks' not in second_menus['Dinner']['Grill']
+    assert second.fingerprints['locations'][location.name] != first.fingerprints['locations'][location.name]
+
+
+ALL_MEALS = ('Breakfast', 'Lunch', 'Dinner')
+
+
+def test_browser_rescrape_of_an_unchanged_page_clicks_no_tabs(monkeypatch):
+    pytest.importorskip('selenium')
+    monkeypatch.setattr(main, 'CAPTURE_NETWORK', False)
+
+    first = main.ColumbiaDiningScraper()
+    location, first_menus, driver = scrape_with(first, 'jjs-place-tabs-v1.json', api=ALL_MEALS)
+    # Without CAPTURE_NETWORK the menus still come from clicking; the JSON is only a fingerprint
+    assert driver.clicks == 3
+
+    second = rescrape(first, location, first_menus)
+    _, second_menus, driver = scrape_with(second, 'jjs-place-tabs-v1.json', api=ALL_MEALS)
+    assert driver.clicks == 0
+    assert second_menus is first_menus
+    assert second.clicks_skipped == [location.name]
+    assert second.fingerprints['locations'][location.name] == first.fingerprints['locations'][location.name]
+
+
+def test_browser_rescrape_clicks_through_when_a_non_default_tab_changed(monkeypatch):
+    pytest.importorskip('selenium')
+    monkeypatch.setattr(main, 'CAPTURE_NETWORK', False)
+
+    first = main.ColumbiaDiningScraper()
+    location, first_menus, _ = scrape_with(first, 'jjs-place-tabs-v1.json', api=ALL_MEALS)
+    second = rescrape(first, location, first_menus)
+    _, second_menus, driver = scrape_with(second, 'jjs-place-tabs-v2.json', api=ALL_MEALS)
+
+    assert driver.clicks == 3
+    assert location.name not in second.reused_locations
+    assert 'Buffalo Cauliflower' in second_menus['Dinner']['Grill']
+
+
+def test_json_missing_a_tab_is_not_trusted_as_a_fingerprint(monkeypatch):
+    pytest.importorskip('selenium')
+    monkeypatch.setattr(main, 'CAPTURE_NETWORK', False)
+
+    # The page only fetched Breakfast and Lunch up front; Dinner loads when its tab is opened
+    first = main.ColumbiaDiningScraper()
+    location, first_menus, _ = scrape_with(first, 'jjs-place-tabs-v1.json', api=ALL_MEALS[:2])
+    second = rescrape(first, location, first_menus)
+    _, second_menus, driver = scrape_with(second, 'jjs-place-tabs-v2.json', api=ALL_MEALS[:2])
+
+    assert driver.clicks == 3
+    assert 'Buffalo Cauliflower' in second_menus['Dinner']['Grill']
@@ -0,0 +1,36 @@
+import copy
+import pickle
+
+import main
+
+
+def location(**items):
+    return main.DiningLocation(
+        name='John Jay Dining Hall', url='', open_today=True, open_times='9:30 AM - 9:00 PM',
+        menus={'Lunch': {'Grill': items}},
+    )
+
+
+def test_allergens_lower_is_derived():
+    item = main.MenuItem('Pad Thai', ('Peanuts', 'Soy'))
+    assert item.allergens_lower == ('peanuts', 'soy')
+    assert not hasattr(item, '__dict__')
+
+
+def test_items_built_without_allergens_lower_are_filtered():
+    index = main.MenuIndex({'John Jay Dining Hall': location(
+        pad_thai=main.MenuItem('Pad Thai', ('Peanuts',)),
+        rice=main.MenuItem('Steamed Rice', (), is_vegetarian=True, is_vegan=True),
+    )})
+    formatted = index.format({'is_vegetarian': False, 'is_vegan': False, 'is_halal': False,
+                              'unavailable_foods': ['peanuts']})
+    assert [item['name'] for item in formatted[0]['meals'][0]['stations'][0]['items']] == ['rice']
+
+
+def test_items_pickle_and_copy():
+    item = main.MenuItem('Pad Thai', ('Peanuts', 'Soy'), is_vegan=True)
+    for copied in (pickle.loads(pickle.dumps(item)), copy.deepcopy(item), copy.copy(item)):
+        assert copied == item
+        assert copied.allergens_lower == ('peanuts', 'soy')
+    loc = location(pad_thai=item)
+    assert pickle.loads(pickle.dumps(loc)) == loc
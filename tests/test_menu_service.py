@@ -0,0 +1,61 @@
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import main
+import menu_service
+
+EVERYONE = {'is_vegetarian': False, 'is_vegan': False, 'is_halal': False, 'unavailable_foods': []}
+
+
+def location(name, open_times, **meals):
+    return main.DiningLocation(
+        name=name, url='', open_today=True, open_times=open_times,
+        menus={meal: {'Main Line': {title: main.MenuItem(title, ())}} for meal, title in meals.items()},
+    )
+
+
+def index():
+    locations = [
+        location('John Jay Dining Hall', 'Breakfast 9:30 AM - 11:00 AMLunch & Dinner 11:00 AM - 9:00 PM',
+                 **{'Breakfast': 'Pancakes', 'Lunch & Dinner': 'Roast Chicken'}),
+        location("JJ's Place", 'Daily 12:00 PM - 10:00 AM', **{'Lunch': 'Burger', 'Dinner': 'Tenders'}),
+    ]
+    return menu_service.QueryIndex(SimpleNamespace(
+        locations={loc.name: loc for loc in locations},
+        date='2026-10-18', content_hash='abc', scraped_at='', closed_locations=[],
+    ))
+
+
+def served_at(index, hhmm):
+    hour, minute = map(int, hhmm.split(':'))
+    mask = index.select(EVERYONE, open_at=hour * 60 + minute)
+    return sorted(item['name'] for row, (_, _, _, item) in enumerate(index.rows) if mask >> row & 1)
+
+
+def test_parse_meal_hours_groups_ranges_by_label():
+    assert menu_service.parse_meal_hours('Breakfast 9:30 AM - 11:00 AM\nLunch & Dinner 11:00 AM - 9:00 PM') == {
+        'breakfast': [(570, 660)], 'lunch & dinner': [(660, 1260)],
+    }
+    assert menu_service.parse_meal_hours('8:00 AM - 8:00 PM') == {'': [(480, 1200)]}
+
+
+def test_open_filter_uses_each_meals_hours():
+    query = index()
+    assert served_at(query, '09:45') == ['Burger', 'Pancakes', 'Tenders']
+    assert served_at(query, '10:30') == ['Pancakes']
+    assert served_at(query, '11:00') == ['Roast Chicken']
+    assert served_at(query, '12:00') == ['Burger', 'Roast Chicken', 'Tenders']
+
+
+def test_reload_loads_the_campus_days_snapshot(monkeypatch):
+    class AfterMidnightUTC(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2026, 10, 19, 2, 30, tzinfo=timezone.utc).astimezone(tz)
+
+    requested = []
+    monkeypatch.setattr(main, 'datetime', AfterMidnightUTC)
+    monkeypatch.setattr(main, 'DINING_TIMEZONE', 'America/New_York')
+    monkeypatch.setattr(main.LocalSnapshotStore, 'read', lambda self, key: requested.append(key))
+    menu_service.MenuService(main.LocalSnapshotStore('/nonexistent')).reload()
+    assert requested == ['2026-10-18/manifest.json']
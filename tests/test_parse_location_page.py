@@ -0,0 +1,45 @@
+import os
+
+import main
+
+PAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts', 'fixtures', 'pages')
+
+RENDERED = """
+<div class="cu-dining-menu-tabs">{tabs}</div>
+<div class="cu-dining-menu">
+  <div class="station">
+    <h3 class="station-title">Main Line</h3>
+    <div class="meal-items">
+      <div class="meal-item"><h5 class="meal-title">Scrambled Eggs</h5><em>Contains: Eggs</em></div>
+    </div>
+  </div>
+</div>
+"""
+
+
+def rendered_page(*tabs, active=0):
+    buttons = ''.join(
+        f'<button class="ng-binding{" active" if i == active else ""}">{tab}</button>' for i, tab in enumerate(tabs)
+    )
+    return main.parse_html(RENDERED.format(tabs=buttons))
+
+
+def test_single_rendered_tab_is_the_whole_menu():
+    meals = main.parse_location_page(rendered_page('Breakfast'), {'Breakfast': {}})
+    assert [item['title'] for item in meals['Breakfast'][0]['items']] == ['Scrambled Eggs']
+
+
+def test_other_wanted_tabs_send_the_location_to_the_browser():
+    page = rendered_page('Breakfast', 'Lunch', 'Dinner')
+    assert main.parse_location_page(page, {'Breakfast': {}, 'Lunch': {}, 'Dinner': {}}) == {}
+
+
+def test_tabs_we_dont_track_are_ignored():
+    meals = main.parse_location_page(rendered_page('Breakfast', 'Late Night'), {'Breakfast': {}})
+    assert list(meals) == ['Breakfast']
+
+
+def test_fixture_page_with_one_tab():
+    with open(os.path.join(PAGES, 'content', 'ferris-booth-commons-0.html')) as f:
+        meals = main.parse_location_page(main.parse_html(f.read()), {'Lunch': {}})
+    assert [station['station'] for station in meals['Lunch']] == ['Entree', 'Salad Bar']
@@ -0,0 +1,12 @@
+import main
+
+
+def test_stored_signature_is_ignored():
+    user = {'is_vegan': True, 'unavailable_foods': ['Peanuts'], 'preference_signature': 'veg=0|vegan=0|halal=0|avoid=[]'}
+    assert main.preference_signature(user) == 'veg=0|vegan=1|halal=0|avoid=["peanuts"]'
+
+
+def test_signature_ignores_food_order_and_case():
+    first = main.preference_signature({'unavailable_foods': ['Shellfish', ' peanut ']})
+    second = main.preference_signature({'unavailable_foods': ['peanut', 'shellfish', 'PEANUT']})
+    assert first == second == 'veg=0|vegan=0|halal=0|avoid=["peanut","shellfish"]'
@@ -0,0 +1,69 @@
+import os
+import threading
+from datetime import datetime, timezone
+
+import pytest
+
+import main
+from serve_fixtures import serve
+
+PAGES = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts', 'fixtures', 'pages')
+
+
+@pytest.fixture
+def fixture_site(monkeypatch):
+    """Serve the fixture pages (tomorrow's John Jay menu differs, later days repeat today's)."""
+    server = serve(PAGES, 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(main.ColumbiaDiningScraper, 'BASE_URL', f'http://127.0.0.1:{server.server_port}/')
+    monkeypatch.setattr(main, 'SCRAPE_ENGINE', 'http')
+    # Only JJ's Place needs the browser here; leave it empty
+    monkeypatch.setattr(main.ColumbiaDiningScraper, '_scrape_locations_selenium', lambda self, only=None: None)
+    yield server
+    server.shutdown()
+
+
+def items(snapshot, location):
+    return sorted(
+        title for stations in snapshot.locations[location].menus.values()
+        for station in stations.values() for title in station
+    )
+
+
+def test_prefetch_stores_distinct_days_and_stops_at_a_repeat(fixture_site, tmp_path):
+    store = main.LocalSnapshotStore(str(tmp_path))
+    snapshots = main.ColumbiaDiningScraper().prefetch(store, 4)
+
+    # Day 2 has no dated pages, so the site "ignores" the date and repeats today's menus
+    assert len(snapshots) == 2
+    today, tomorrow = snapshots
+    assert today.content_hash != tomorrow.content_hash
+    assert 'Buttermilk Pancakes' in items(tomorrow, 'John Jay Dining Hall')
+    assert 'Buttermilk Pancakes' not in items(today, 'John Jay Dining Hall')
+    assert not today.manifest['prefetched'] and tomorrow.manifest['prefetched']
+    assert main.load_snapshot(store, tomorrow.date).content_hash == tomorrow.content_hash
+    assert sorted(os.listdir(tmp_path)) == sorted([today.date, tomorrow.date, main.REGISTRY_KEY])
+
+
+def test_daily_run_uses_the_prefetched_snapshot(fixture_site, tmp_path, monkeypatch):
+    store = main.LocalSnapshotStore(str(tmp_path))
+    today = main.ColumbiaDiningScraper().prefetch(store, 1)[0]
+
+    scraper = main.ColumbiaDiningScraper()
+    monkeypatch.setattr(scraper, 'scrape_locations', lambda previous=None: pytest.fail('scraped again'))
+    assert main.prepare_menus(scraper, store).content_hash == today.content_hash
+
+
+def test_snapshots_are_keyed_by_the_campus_date(tmp_path, monkeypatch):
+    class EveningOnCampus(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            # 20:30 in New York, already the next day in UTC
+            return datetime(2026, 10, 19, 0, 30, tzinfo=timezone.utc).astimezone(tz)
+
+    monkeypatch.setattr(main, 'datetime', EveningOnCampus)
+    monkeypatch.setattr(main, 'DINING_TIMEZONE', 'America/New_York')
+    store = main.LocalSnapshotStore(str(tmp_path))
+    snapshot = main.save_snapshot(store, main.ColumbiaDiningScraper())
+    assert snapshot.date == '2026-10-18'
+    assert main.load_snapshot(store).content_hash == snapshot.content_hash
@@ -0,0 +1,135 @@
+import time
+
+import pytest
+
+import main
+
+MENU = [{'name': 'John Jay Dining Hall', 'open_times': '', 'meals': []}]
+
+
+class SESError(Exception):
+    """What a botocore ClientError looks like to SendController.error_code()."""
+
+    def __init__(self, code, message=''):
+        super().__init__(f"An error occurred ({code}): {message}")
+        self.response = {'Error': {'Code': code, 'Message': message}}
+
+
+class FakeSES:
+    """
+    send_bulk_email stand-in. `script` is a list of per-call outcomes: an exception
+    to raise, or a function of the recipients returning their statuses; once it runs
+    out every recipient succeeds.
+    """
+
+    def __init__(self, *script, rejects=()):
+        self.script = list(script)
+        self.rejects = set(rejects)
+        self.calls = []
+
+    def send_batch(self, emails, formatted_menu):
+        self.calls.append(list(emails))
+        if self.rejects & set(emails):
+            raise SESError('MessageRejected', 'Email address is not verified.')
+        outcome = self.script.pop(0) if self.script else None
+        if isinstance(outcome, Exception):
+            raise outcome
+        if outcome:
+            return outcome(emails)
+        return [{'Status': 'Success'} for _ in emails]
+
+
+def controller(ses, **kwargs):
+    # A pace nothing here comes close to, and backoff short enough not to slow the tests
+    return main.SendController(ses.send_batch, **{'max_rate': 1e6, 'base_delay': 0.001, 'max_delay': 0.01, **kwargs})
+
+
+def recipients(count):
+    return [f'user{i}@example.com' for i in range(count)]
+
+
+def test_throttled_call_is_retried_and_slows_the_pace():
+    ses = FakeSES(SESError('Throttling', 'Maximum sending rate exceeded.'))
+    sender = controller(ses)
+    statuses = sender.send(recipients(3), MENU)
+
+    assert [status['Status'] for status in statuses] == ['Success'] * 3
+    assert len(ses.calls) == 2
+    report = sender.report()
+    assert (report['sent'], report['failed'], report['retries'], report['throttled']) == (3, 0, 1, 1)
+    assert report['final_rate'] < 1e6 * main.SEND_RATE_HEADROOM
+
+
+def test_bad_address_in_a_full_batch_only_fails_that_recipient():
+    emails = recipients(main.BULK_BATCH_SIZE)
+    ses = FakeSES(rejects={emails[37]})
+    sender = controller(ses)
+    statuses = dict(zip(emails, sender.send(emails, MENU)))
+
+    assert statuses.pop(emails[37])['Error'].startswith('MessageRejected')
+    assert {status['Status'] for status in statuses.values()} == {'Success'}
+    # Bisected down to the bad address, not one call per recipient
+    assert len(ses.calls) < 15
+    assert sender.report()['failed'] == 1 and sender.report()['sent'] == 49
+    assert list(sender.failures) == [emails[37]]
+
+
+def test_only_recipients_with_transient_statuses_are_resent():
+    def one_transient(emails):
+        return [{'Status': 'TransientFailure' if i == 1 else 'Success'} for i, _ in enumerate(emails)]
+
+    ses = FakeSES(one_transient)
+    sender = controller(ses)
+    emails = recipients(4)
+    statuses = sender.send(emails, MENU)
+
+    assert [status['Status'] for status in statuses] == ['Success'] * 4
+    assert ses.calls == [emails, [emails[1]]]
+    assert sender.report()['retries'] == 1
+
+
+@pytest.mark.parametrize('outcome, status', [
+    (SESError('Throttling'), 'Failed'),
+    (lambda emails: [{'Status': 'AccountThrottled'} for _ in emails], 'AccountThrottled'),
+])
+def test_running_out_of_attempts_fails_the_batch_without_raising(outcome, status):
+    ses = FakeSES(*[outcome] * 10)
+    sender = controller(ses, max_attempts=3)
+    statuses = sender.send(recipients(5), MENU)
+
+    assert [s['Status'] for s in statuses] == [status] * 5
+    assert len(ses.calls) == 3
+    report = sender.report()
+    assert (report['sent'], report['failed'], report['retries'], report['throttled']) == (0, 5, 2, 2)
+
+
+def test_unexpected_errors_fail_the_batch_without_raising():
+    ses = FakeSES(ValueError('boom'))
+    statuses = controller(ses).send(recipients(2), MENU)
+    assert [status['Error'] for status in statuses] == ['ValueError: boom'] * 2
+    assert len(ses.calls) == 1
+
+
+def test_report_totals_across_batches():
+    emails = recipients(20)
+    ses = FakeSES(SESError('ServiceUnavailable'), rejects={emails[3]})
+    sender = controller(ses)
+    sender.send(emails[:10], MENU)
+    sender.send(emails[10:], MENU)
+
+    report = sender.report()
+    assert report['sent'] == 19
+    assert report['failed'] == 1
+    # ServiceUnavailable is retried but isn't throttling, so the pace stays put
+    assert (report['retries'], report['throttled']) == (1, 0)
+    assert report['max_rate'] == 1e6
+    assert report['achieved_rate'] > 0
+
+
+def test_token_bucket_paces_after_the_burst():
+    bucket = main.TokenBucket(rate=200)
+    assert bucket.acquire(200) == 0
+    start = time.monotonic()
+    waited = bucket.acquire(20)
+    assert 0.05 < waited <= 0.11
+    assert time.monotonic() - start >= waited
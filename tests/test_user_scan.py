@@ -0,0 +1,107 @@
+import threading
+import time
+
+import pytest
+
+import main
+
+INDEX = 'preference_signature-index'
+
+
+class FakeUsersTable:
+    """Table.scan() over users, with a sparse preference_signature GSI and one-item pages."""
+
+    def __init__(self, users):
+        self.users = users
+        self.calls = []
+
+    def scan(self, **kwargs):
+        self.calls.append(kwargs)
+        if kwargs.get('IndexName') == INDEX:
+            items = sorted((u for u in self.users if 'preference_signature' in u),
+                           key=lambda u: u['preference_signature'])
+        else:
+            items = list(self.users)
+            if 'FilterExpression' in kwargs:
+                assert kwargs['FilterExpression'] == 'attribute_not_exists(#signature)'
+                assert kwargs['ExpressionAttributeNames']['#signature'] == 'preference_signature'
+                items = [u for u in items if 'preference_signature' not in u]
+        start = kwargs.get('ExclusiveStartKey', 0)
+        response = {'Items': [{k: v for k, v in u.items() if k in main.USER_ATTRIBUTES}
+                              for u in items[start:start + 1]]}
+        if start + 1 < len(items):
+            response['LastEvaluatedKey'] = start + 1
+        return response
+
+
+USERS = [
+    {'email': 'a@x.edu', 'is_vegan': True, 'preference_signature': 'veg=0|vegan=1|halal=0|avoid=[]'},
+    {'email': 'b@x.edu', 'preference_signature': 'veg=0|vegan=0|halal=0|avoid=[]'},
+    {'email': 'c@x.edu', 'is_vegan': True, 'preference_signature': 'veg=0|vegan=1|halal=0|avoid=[]'},
+    # Added by a writer that doesn't store signatures, so not in the index
+    {'email': 'd@x.edu', 'is_halal': True},
+]
+
+
+def emails(pages):
+    return [user['email'] for page in pages for user in page]
+
+
+def test_table_scan_by_default(monkeypatch):
+    monkeypatch.setattr(main, 'USER_SCAN_INDEX', '')
+    table = FakeUsersTable(USERS)
+    assert emails(main.iter_user_pages(table)) == ['a@x.edu', 'b@x.edu', 'c@x.edu', 'd@x.edu']
+    assert all('IndexName' not in call for call in table.calls)
+
+
+def test_index_scan_groups_users_and_still_reads_unindexed_ones(monkeypatch):
+    monkeypatch.setattr(main, 'USER_SCAN_INDEX', INDEX)
+    table = FakeUsersTable(USERS)
+    users = [user for page in main.iter_user_pages(table) for user in page]
+    assert [user['email'] for user in users] == ['b@x.edu', 'a@x.edu', 'c@x.edu', 'd@x.edu']
+    # Signatures are never read back, only recomputed
+    assert all('preference_signature' not in user for user in users)
+    assert main.preference_signature(users[-1]) == 'veg=0|vegan=0|halal=1|avoid=[]'
+
+
+class SegmentedUsersTable:
+    """
+    Parallel-scan stand-in with one-user pages: segment 0 has three, segment 1 starts
+    late with one and then ends, or fails if `error` is set.
+    """
+
+    def __init__(self, error=None):
+        self.error = error
+
+    def scan(self, **kwargs):
+        segment, start = kwargs['Segment'], kwargs.get('ExclusiveStartKey', 0)
+        pages = 3 if segment == 0 else 1
+        if segment == 1 and start == 0:
+            time.sleep(0.2)
+        if start == pages:
+            raise self.error
+        response = {'Items': [{'email': f"user{segment}-{start}@x.edu"}]}
+        if start + 1 < pages or (segment == 1 and self.error):
+            response['LastEvaluatedKey'] = start + 1
+        return response
+
+
+def scan_threads():
+    return {thread for thread in threading.enumerate() if 'scan_worker' in thread.name}
+
+
+@pytest.mark.parametrize('error', [None, RuntimeError('scan failed')])
+def test_scan_workers_exit_when_the_consumer_stops_early(monkeypatch, error):
+    monkeypatch.setattr(main, 'USER_SCAN_INDEX', '')
+    before = scan_threads()
+    pages = main.iter_user_pages(SegmentedUsersTable(error), segments=2)
+    next(pages)
+    # Segment 0 has filled the queue (size 4) up to its end marker; segment 1 then puts
+    # its page and is left holding its own end marker (or error) when the consumer stops
+    time.sleep(0.5)
+    pages.close()
+
+    deadline = time.monotonic() + 5
+    while scan_threads() - before and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not scan_threads() - before, 'scan worker left blocked on the queue'